@@ -0,0 +1,307 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+# fixed-seed benchmarks of the hot paths, each scenario in its own process so peak RSS is its own
+#
+#   python bench.py run [--output results.json] [--only name,...] [--repeat 3]
+#   python bench.py compare baseline.json results.json [--tolerance 0.15] [--rss-tolerance 0.25]
+#
+# results are JSON: per scenario the best of --repeat timings, a rate per counted unit
+# (battles/sec, matchups/sec, iterations/sec) and peak RSS; compare exits 1 on any regression
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for folder in ('simulator', 'stats', 'ne'):
+    sys.path.insert(0, os.path.join(root, folder))
+
+SEED = 1234
+
+
+def _timed(run, repeat: int):
+    # best of repeat runs of run(), which returns the units it processed
+    best, counts = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        counts = run()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, counts
+
+
+def _quiet(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def _battles(team1_pets, team2_pets, battles: int):
+    def scenario(repeat):
+        from core import Team
+        from simulator import BattleSimulator
+        team1 = Team().add_pets(*team1_pets).template()
+        team2 = Team().add_pets(*team2_pets).template()
+
+        def run():
+            simulator = BattleSimulator(seed=SEED)
+            for _ in range(battles):
+                simulator.simulate_battle(team1, team2)
+            return {'battles': battles}
+        return _timed(run, repeat)
+    return scenario
+
+
+def k_battles_1000(repeat):
+    from core import Team
+    from simulator import BattleSimulator
+    team1 = Team().add_pets("cricket", "ant", "horse")
+    team2 = Team().add_pets("mosquito", "pig", "fish")
+
+    def run():
+        BattleSimulator(seed=SEED).k_battles(team1, team2, num_simulations=1000, matchup=(1, 2))
+        return {'battles': 1000, 'matchups': 1}
+    return _timed(run, repeat)
+
+
+def _tournament(team_length: int, num_battles: int, engine: str = "object"):
+    def scenario(repeat):
+        from team_combinations import generate_all_team_sequences, run_tournament
+        teams = generate_all_team_sequences(team_length)
+
+        def run():
+            with tempfile.TemporaryDirectory() as tmp:
+                _quiet(run_tournament, teams, num_battles=num_battles, output_file=os.path.join(tmp, "tr.csv"),
+                       engine=engine, seed=SEED)
+            return {'battles': len(teams) ** 2 * num_battles, 'matchups': len(teams) ** 2}
+        return _timed(run, repeat)
+    return scenario
+
+
+def _grid_729(tmp: str) -> str:
+    # the 3-pet grid, batch engine, setup only
+    from team_combinations import generate_all_team_sequences, run_tournament
+    grid_dir = os.path.join(tmp, "grid")
+    _quiet(run_tournament, generate_all_team_sequences(3), num_battles=10, engine="batch", seed=SEED,
+           grid_dir=grid_dir, write_csv=False)
+    return grid_dir
+
+
+def _synthetic_payoff(n: int) -> np.ndarray:
+    rng = np.random.default_rng(SEED)
+    upper = np.triu(rng.uniform(-1, 1, (n, n)).astype(np.float32), 1)
+    return upper - upper.T
+
+
+def nash_lp_729(repeat):
+    from nash_equilibrium_fast import FastNashSolver
+    with tempfile.TemporaryDirectory() as tmp:
+        solver = _quiet(FastNashSolver, _grid_729(tmp))
+
+    def run():
+        _quiet(solver.solve_nash_equilibrium)
+        return {'teams': solver.n_teams}
+    return _timed(run, repeat)
+
+
+def nash_rm_6561(repeat):
+    # synthetic 6,561-team game, 200 iterations of regret matching+
+    from iterative_solvers import regret_matching_plus
+    payoff = _synthetic_payoff(6561)
+
+    def run():
+        regret_matching_plus(payoff, iterations=200, tolerance=0, report_every=0)
+        return {'iterations': 200}
+    return _timed(run, repeat)
+
+
+def bradley_terry_729(repeat):
+    from stats_engine import load_results
+    from bradley_terry import rankings
+    with tempfile.TemporaryDirectory() as tmp:
+        grid_dir = _grid_729(tmp)
+        data = load_results(grid_dir)
+
+        def run():
+            _quiet(rankings, data)
+            return {'teams': data.n}
+        return _timed(run, repeat)
+
+
+def bradley_terry_59k_sampled(repeat):
+    # 59,049 teams, 50 sampled opponents each, Newton
+    from bradley_terry import fit_bradley_terry, pairs_from_rows
+    rng = np.random.default_rng(SEED)
+    n, opponents, battles = 59049, 50, 20
+    strength = rng.normal(0, 1, n)
+    ids1 = np.repeat(np.arange(n), opponents)
+    ids2 = rng.integers(0, n, n * opponents)
+    wins = rng.binomial(battles, 1 / (1 + np.exp(strength[ids2] - strength[ids1])))
+
+    def run():
+        pairs = pairs_from_rows(ids1, ids2, wins, battles - wins, np.zeros_like(wins), n)
+        fit_bradley_terry(*pairs, n_teams=n, method='newton')
+        return {'matchups': len(ids1)}
+    return _timed(run, repeat)
+
+
+def stats_totals_729(repeat):
+    from stats_engine import load_results, team_totals
+    with tempfile.TemporaryDirectory() as tmp:
+        data = load_results(_grid_729(tmp))
+
+        def run():
+            team_totals(data)
+            return {'matchups': data.n ** 2}
+        return _timed(run, repeat)
+
+
+SCENARIOS = {
+    # single battles, one per ability archetype
+    'battle_faint': _battles(("ant", "cricket", "ant"), ("pig", "pig", "pig"), 2000),
+    'battle_friend_summoned': _battles(("cricket", "horse", "cricket"), ("fish", "fish", "fish"), 2000),
+    'battle_start_of_battle': _battles(("mosquito", "mosquito", "mosquito"), ("pig", "pig", "pig", "pig", "pig"), 2000),
+    'battle_vanilla': _battles(("fish", "pig", "otter"), ("beaver", "mouse", "pig"), 2000),
+    'k_battles_1000': k_battles_1000,
+    'tournament_1pet': _tournament(1, 100),
+    'tournament_2pet': _tournament(2, 10),
+    'tournament_2pet_batch': _tournament(2, 100, engine="batch"),
+    'nash_lp_729': nash_lp_729,
+    'nash_rm_6561': nash_rm_6561,
+    'bradley_terry_729': bradley_terry_729,
+    'bradley_terry_59k_sampled': bradley_terry_59k_sampled,
+    'stats_totals_729': stats_totals_729,
+}
+
+
+def peak_rss_mb() -> float:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_scenario(name: str, repeat: int) -> dict:
+    seconds, counts = SCENARIOS[name](repeat)
+    result = {'seconds': seconds}
+    for unit, count in counts.items():
+        result[f'{unit}_per_sec'] = count / seconds
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def run_all(names, repeat: int) -> dict:
+    results = {}
+    for name in names:
+        print(f"{name} ...", end=' ', flush=True)
+        # fresh interpreter per scenario
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), 'scenario', name, '--repeat', str(repeat)],
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            print("failed")
+            print(out.stderr, file=sys.stderr)
+            results[name] = {'error': out.stderr.strip().splitlines()[-1] if out.stderr.strip() else 'failed'}
+            continue
+        results[name] = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{results[name]['seconds']:.3f}s, {results[name]['peak_rss_mb']:.0f} MB")
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float, rss_tolerance: float) -> list:
+    # (scenario, metric, baseline, current, change, regressed) rows, rates must not drop and
+    # seconds and RSS must not grow by more than their tolerance
+    rows = []
+    for name, base in baseline['results'].items():
+        now = current['results'].get(name)
+        if now is None or 'error' in base:
+            continue
+        if 'error' in now:
+            rows.append((name, 'error', None, None, None, True))
+            continue
+        for metric, before in base.items():
+            if metric not in now or not before:
+                continue
+            after = now[metric]
+            change = after / before - 1
+            if metric.endswith('_per_sec'):
+                regressed = change < -tolerance
+            elif metric == 'peak_rss_mb':
+                regressed = change > rss_tolerance
+            else:
+                regressed = change > tolerance
+            rows.append((name, metric, before, after, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulator, tournament and analysis benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmarks and write JSON results')
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--only', default=None, help='comma separated scenario names')
+    run_parser.add_argument('--repeat', type=int, default=3, help='timings per scenario, the best one counts')
+
+    compare_parser = commands.add_parser('compare', help='flag regressions against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float, default=0.15, help='allowed slowdown (0.15 = 15%%)')
+    compare_parser.add_argument('--rss-tolerance', type=float, default=0.25, help='allowed peak RSS growth')
+
+    commands.add_parser('list', help='list scenarios')
+
+    scenario_parser = commands.add_parser('scenario', help=argparse.SUPPRESS)
+    scenario_parser.add_argument('name', choices=list(SCENARIOS))
+    scenario_parser.add_argument('--repeat', type=int, default=1)
+
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        print("\n".join(SCENARIOS))
+    elif args.command == 'scenario':
+        print(json.dumps(run_scenario(args.name, args.repeat)))
+    elif args.command == 'run':
+        names = args.only.split(',') if args.only else list(SCENARIOS)
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(unknown)}")
+        results = run_all(names, args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"saved {args.output}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.tolerance, args.rss_tolerance)
+        for name, metric, before, after, change, regressed in rows:
+            if metric == 'error':
+                print(f"{name:28} failed in the current run  REGRESSION")
+                continue
+            flag = '  REGRESSION' if regressed else ''
+            print(f"{name:28} {metric:20} {before:12.3f} -> {after:12.3f} ({change:+.1%}){flag}")
+        regressions = sum(row[5] for row in rows)
+        print(f"{regressions} regression{'s' if regressions != 1 else ''}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# cycles in the dominance graph: i -> j when team i's net payoff against j is above the threshold
+# the net payoff (P - P^T) / 2 is P itself for an antisymmetric matrix, and makes the graph an
+# oriented one (never both i -> j and j -> i), which is what makes the counts below exact
+#
+# counts come from matrix products: (A^k)[i, i] counts closed walks of length k through i, and
+# without loops or 2-cycles a closed walk of length 3, 4 or 5 can't revisit a vertex, so those
+# are the simple k-cycles through i, and trace(A^k) / k is the number of k-cycles
+# 3-cycles are also enumerated, row by row over packed bitsets
+
+MAX_CYCLE_LENGTH = 5
+# rows of A^(k-1) per product block
+BLOCK = 2048
+
+
+def net_payoff(payoff: np.ndarray) -> np.ndarray:
+    return (np.asarray(payoff, dtype=np.float32) - np.asarray(payoff, dtype=np.float32).T) / 2
+
+
+def dominance_graph(payoff: np.ndarray, threshold: float = 0.15) -> np.ndarray:
+    if threshold < 0:
+        raise ValueError("threshold must be non-negative, a negative one would make every pair a 2-cycle")
+    adjacency = net_payoff(payoff) > threshold
+    np.fill_diagonal(adjacency, False)
+    return adjacency
+
+
+def cycle_participation(adjacency: np.ndarray, max_length: int = 3) -> Dict[int, np.ndarray]:
+    # k -> number of simple k-cycles through each team, for k = 3..max_length
+    if not 3 <= max_length <= MAX_CYCLE_LENGTH:
+        raise ValueError(f"max_length must be between 3 and {MAX_CYCLE_LENGTH}")
+    n = len(adjacency)
+    power = adjacency
+    counts = {}
+    for k in range(3, max_length + 1):
+        # power = A^(k-2) -> A^(k-1), diag(A^k) is the row sum of A^(k-1) * A^T
+        # entries of A^(k-1) are at most n^(k-2), float32 products are exact below 2^24 and twice as fast
+        dtype = np.float32 if n ** (k - 2) < 2 ** 24 else np.float64
+        a = adjacency.astype(dtype)
+        a_t = np.ascontiguousarray(a.T)
+        power = power.astype(dtype, copy=False)
+        next_power = np.empty((n, n), dtype=dtype)
+        through = np.empty(n)
+        for r0 in range(0, n, BLOCK):
+            r = slice(r0, min(n, r0 + BLOCK))
+            next_power[r] = power[r] @ a
+            through[r] = (next_power[r] * a_t[r]).sum(axis=1, dtype=np.float64)
+        counts[k] = np.rint(through).astype(np.int64)
+        power = next_power
+    return counts
+
+
+def three_cycles(adjacency: np.ndarray, payoff: Optional[np.ndarray] = None, top: Optional[int] = None) -> pd.DataFrame:
+    # every 3-cycle once, as i -> j -> k -> i with i the smallest id
+    # with top, only the top cycles by average net payoff are kept (ties by ids), in bounded memory
+    n = len(adjacency)
+    net = net_payoff(payoff) if payoff is not None else adjacency.astype(np.float32)
+    packed = np.packbits(adjacency, axis=1)
+    packed_in = np.packbits(np.ascontiguousarray(adjacency.T), axis=1)
+    later = np.packbits(~np.tri(n, dtype=bool), axis=1)  # later[i]: ids > i
+
+    parts = []
+    kept = 0
+    for i in range(n):
+        successors = np.nonzero(adjacency[i, i + 1:])[0] + i + 1
+        if not len(successors):
+            continue
+        # k beats i, k > i, and j beats k
+        candidates = packed[successors] & (packed_in[i] & later[i])
+        rows, columns = np.nonzero(candidates)
+        if not len(rows):
+            continue
+        bits = np.unpackbits(candidates[rows, columns][:, None], axis=1)
+        hit_rows, hit_bits = np.nonzero(bits)
+        j = successors[rows[hit_rows]]
+        k = columns[hit_rows] * 8 + hit_bits
+        parts.append(np.stack([np.full(len(j), i), j, k], axis=1))
+        kept += len(j)
+        if top is not None and kept > max(4 * top, 1 << 16):
+            parts = [_best(np.concatenate(parts), net, top, keep_order=True)]
+            kept = len(parts[0])
+
+    triples = np.concatenate(parts) if parts else np.zeros((0, 3), dtype=np.int64)
+    triples = _best(triples, net, top) if top is not None else _best(triples, net, len(triples))
+    i, j, k = triples.T
+    return pd.DataFrame({
+        'Team1_ID': i, 'Team2_ID': j, 'Team3_ID': k,
+        'Payoff_12': net[i, j], 'Payoff_23': net[j, k], 'Payoff_31': net[k, i],
+        'Avg_Dominance': (net[i, j] + net[j, k] + net[k, i]) / 3,
+    })
+
+
+def _best(triples: np.ndarray, net: np.ndarray, top: int, keep_order: bool = False) -> np.ndarray:
+    # the top triples by average net payoff, sorted
+    # triples come in id order, and a stable sort keeps it among ties, so the result is deterministic
+    # keep_order returns the survivors in id order instead, for the next merge
+    i, j, k = triples.T
+    dominance = (net[i, j].astype(np.float64) + net[j, k] + net[k, i]) / 3
+    order = np.argsort(-dominance, kind='stable')[:top]
+    return triples[np.sort(order) if keep_order else order]
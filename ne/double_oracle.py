@@ -0,0 +1,231 @@
+import argparse
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'simulator'))
+from simulator import BattleSimulator
+from team_codes import codes_of_length, composition, registry_species, team_from_code
+from result_store import ResultStore, cell_key, settings_digest, stream_id, team_digest
+from nash_equilibrium_fast import lp_equilibrium
+
+# double oracle: Nash over a whole team space without the full grid
+# keep a small restricted game, solve it with the LP, then look for the team that does best
+# against its equilibrium mix; if nothing beats the mix by more than the tolerance, the mix
+# is an equilibrium of the full game, otherwise that team joins the restricted game
+#
+# matchups are simulated on demand with BattleSimulator.k_battles and cached, and with a
+# result store they are shared with tournaments run with --result-store (same cell keys,
+# same content-keyed streams, so the numbers are identical)
+
+
+@dataclass
+class DoubleOracleResult:
+    codes: List[int]                # the restricted game's teams
+    strategy: np.ndarray            # equilibrium mix over codes
+    value: float
+    exploitability: float           # best response payoff against the mix - value
+    best_response: int
+    iterations: int
+    converged: bool
+    matchups_simulated: int
+    seconds: float
+    history: List[Dict] = field(default_factory=list)
+
+
+class MatchupOracle:
+    # payoff (wins - losses) / battles of one team code against another, simulated at most once
+    # the game is treated as symmetric, as dedup tournaments do: (b, a) is the flipped (a, b)
+    def __init__(self, num_battles: int = 100, seed: Optional[int] = None, cache_size: Optional[int] = None,
+                 ci_width: Optional[float] = None, result_store: Optional[str] = None):
+        if seed is None:
+            seed = random.SystemRandom().randrange(2**32)
+        self.seed = seed
+        self.num_battles = num_battles
+        self.ci_width = ci_width
+        cache = None
+        if cache_size:
+            from transposition import TranspositionCache
+            cache = TranspositionCache(cache_size)
+        self.simulator = BattleSimulator(seed=seed, transposition_cache=cache)
+        self.payoffs: Dict[Tuple[int, int], float] = {}
+        self.templates = {}
+        self.digests = {}
+        self.simulated = 0
+        self.store = ResultStore(result_store) if result_store else None
+        # same settings a full-grid run_tournament(result_store=...) with the object or batch engine
+        # writes, so its cells are reused here and the other way round
+        self.settings = settings_digest(num_battles=num_battles, sampling="sampled", seed=seed, ci_width=ci_width)
+
+    def _template(self, code: int):
+        if code not in self.templates:
+            template = team_from_code(code).template()
+            self.templates[code] = template
+            self.digests[code] = team_digest(template)
+        return self.templates[code]
+
+    def payoff(self, a: int, b: int) -> float:
+        if a == b:
+            return 0.0
+        key = (a, b) if a < b else (b, a)
+        if key not in self.payoffs:
+            self.payoffs[key] = self._lookup(*key)
+        return self.payoffs[key] if a < b else -self.payoffs[key]
+
+    def _lookup(self, a: int, b: int) -> float:
+        team1, team2 = self._template(a), self._template(b)
+        digest1, digest2 = self.digests[a], self.digests[b]
+        if self.store is not None:
+            for key, sign in ((cell_key(digest1, digest2, self.settings), 1),
+                              (cell_key(digest2, digest1, self.settings), -1)):
+                found = self.store.get_many([key])
+                if key in found:
+                    w1, w2, d = found[key][:3]
+                    return sign * (w1 - w2) / max(w1 + w2 + d, 1)
+
+        result = self.simulator.k_battles(team1, team2, num_simulations=self.num_battles, ci_width=self.ci_width,
+                                          matchup=(stream_id(digest1), stream_id(digest2)))
+        self.simulated += 1
+        w1, w2, d = result['team1_wins'], result['team2_wins'], result['draws']
+        if self.store is not None:
+            entry = (w1, w2, d) if self.ci_width is None else (w1, w2, d, result['total_simulations'],
+                                                               result['ci_half_width'])
+            self.store.put_many([(cell_key(digest1, digest2, self.settings), entry)])
+        return (w1 - w2) / result['total_simulations']
+
+    def matrix(self, rows: Sequence[int], columns: Sequence[int]) -> np.ndarray:
+        return np.array([[self.payoff(a, b) for b in columns] for a in rows], dtype=np.float64)
+
+    def commit(self):
+        if self.store is not None:
+            self.store.commit()
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+
+def best_response(oracle: MatchupOracle, codes: Sequence[int], strategy: np.ndarray, candidates: Sequence[int],
+                  margin: float = 0.0) -> Tuple[int, float]:
+    # the candidate with the highest expected payoff against the mix
+    # opponents are visited heaviest first, and a candidate is dropped as soon as even winning
+    # every remaining battle can't beat the best so far by margin, so most candidates only
+    # play the top of the support
+    support = [(codes[k], strategy[k]) for k in np.argsort(-strategy) if strategy[k] > 1e-9]
+    remaining = np.cumsum([weight for _, weight in support][::-1])[::-1]
+    best, best_value = None, -np.inf
+    for candidate in candidates:
+        value = 0.0
+        for k, (opponent, weight) in enumerate(support):
+            if value + remaining[k] <= best_value + margin:
+                break
+            value += weight * oracle.payoff(candidate, opponent)
+        else:
+            if value > best_value:
+                best, best_value = candidate, value
+    return best, best_value
+
+
+def double_oracle(candidates: Sequence[int], oracle: MatchupOracle, initial: Optional[Sequence[int]] = None,
+                  tolerance: float = 0.01, max_iterations: int = 200, sample: Optional[int] = None,
+                  rng: Optional[random.Random] = None) -> DoubleOracleResult:
+    # sample: best responses come from this many random candidates (plus the restricted game),
+    # for spaces too big to scan every iteration; the final gap is then only an estimate
+    start = time.time()
+    rng = rng or random.Random(oracle.seed)
+    codes = list(dict.fromkeys(initial)) if initial else [rng.choice(candidates)]
+    history = []
+    converged = False
+    iteration = 0
+    strategy, value, gap, response = np.ones(1), 0.0, np.inf, codes[0]
+    for iteration in range(1, max_iterations + 1):
+        payoff = oracle.matrix(codes, codes)
+        oracle.commit()
+        result = lp_equilibrium(payoff)
+        if not result.success:
+            raise RuntimeError(f"LP solver failed on the restricted game: {result.message}")
+        strategy, value = np.maximum(result.x[:-1], 0), result.x[-1]
+        strategy /= strategy.sum()
+
+        pool = candidates if sample is None else codes + rng.sample(candidates, min(sample, len(candidates)))
+        response, response_value = best_response(oracle, codes, strategy, pool)
+        gap = response_value - value
+        history.append({'Iteration': iteration, 'Restricted_Teams': len(codes), 'Game_Value': value,
+                        'Best_Response_Code': response, 'Best_Response_Payoff': response_value,
+                        'Exploitability': gap, 'Matchups_Simulated': oracle.simulated,
+                        'Seconds': time.time() - start})
+        print(f"iteration {iteration}: {len(codes)} teams, value {value:.4f}, exploitability {gap:.4f}, "
+              f"{oracle.simulated:,} matchups simulated ({time.time() - start:.1f}s)")
+        if gap <= tolerance or response in codes:
+            converged = gap <= tolerance
+            break
+        codes.append(response)
+
+    return DoubleOracleResult(codes, strategy, float(value), float(gap), response, iteration, converged,
+                              oracle.simulated, time.time() - start, history)
+
+
+def save_results(result: DoubleOracleResult, output_base: str):
+    species = registry_species()
+    support = pd.DataFrame({
+        'Team_Code': result.codes,
+        'Composition': [composition(code, species) for code in result.codes],
+        'Probability': result.strategy,
+    }).sort_values('Probability', ascending=False)
+    support = support[support['Probability'] > 1e-6]
+    support.to_csv(f'{output_base}_support.csv', index=False)
+    print(f"saved support teams to {output_base}_support.csv")
+
+    pd.DataFrame(result.history).to_csv(f'{output_base}_history.csv', index=False)
+    print(f"saved iteration history to {output_base}_history.csv")
+
+    summary = {
+        'Nash_Equilibrium_Value': [result.value],
+        'Exploitability': [result.exploitability],
+        'Best_Response_Team': [composition(result.best_response, species)],
+        'Support_Size': [len(support)],
+        'Restricted_Teams': [len(result.codes)],
+        'Matchups_Simulated': [result.matchups_simulated],
+        'Converged': [result.converged],
+    }
+    pd.DataFrame(summary).to_csv(f'{output_base}_summary.csv', index=False)
+    print(f"saved summary statistics to {output_base}_summary.csv")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Double-oracle Nash equilibrium over all teams of a given size')
+    parser.add_argument('--team-length', type=int, default=3, help='pets per team')
+    parser.add_argument('--battles', type=int, default=100, help='battles per simulated matchup')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--tolerance', type=float, default=0.01, help='stop once no team beats the mix by more')
+    parser.add_argument('--max-iterations', type=int, default=200)
+    parser.add_argument('--sample', type=int, default=None,
+                        help='best responses from this many random candidates per iteration instead of all teams')
+    parser.add_argument('--cache-size', type=int, default=None, help='transposition cache entries')
+    parser.add_argument('--ci-width', type=float, default=None, help='adaptive stopping per matchup')
+    parser.add_argument('--result-store', default=None, help='sqlite result store shared with tournaments')
+    args = parser.parse_args()
+
+    candidates = codes_of_length(args.team_length, len(registry_species()))
+    print(f"{len(candidates):,} teams of {args.team_length} pets")
+    oracle = MatchupOracle(args.battles, args.seed, args.cache_size, args.ci_width, args.result_store)
+    try:
+        result = double_oracle(candidates, oracle, tolerance=args.tolerance, max_iterations=args.max_iterations,
+                               sample=args.sample)
+    finally:
+        oracle.close()
+    print(f"{'converged' if result.converged else 'stopped'} after {result.iterations} iterations, "
+          f"{result.matchups_simulated:,} of {len(candidates) * (len(candidates) - 1) // 2:,} matchups simulated")
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    save_results(result, os.path.join(script_dir, 'nash_results_double_oracle'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+import numpy as np
+
+# first-order solvers for the zero-sum game max_x min_y x^T P y
+# P[i, j] is team i's payoff against team j, as in FastNashSolver.payoff_matrix
+# each iteration only needs P @ y and P^T @ x (fictitious play: one row and one column),
+# so nothing n x n is ever built besides P itself, which can be a read-only memmap
+#
+#   rm+    regret matching+, alternating updates, linearly weighted average
+#   omwu   optimistic multiplicative weights, last iterate or average, whichever is closer
+#   fp     fictitious play, best responses to the empirical averages
+#
+# the exploitability gap max_i (P y)_i - min_j (x^T P)_j is 0 exactly at an equilibrium
+# and is computed every iteration from products the update already made
+
+# iterations a warm start is worth in the running averages
+WARM_WEIGHT = 100
+
+
+@dataclass
+class IterativeResult:
+    strategy: np.ndarray        # row player's mixed strategy, the one analyze_results reports
+    opponent: np.ndarray        # column player's strategy (the same team mix in a symmetric game)
+    value: float
+    exploitability: float
+    iterations: int
+    converged: bool
+    seconds: float
+    history: List[float] = field(default_factory=list)
+
+
+def _times(payoff: np.ndarray, y: np.ndarray) -> np.ndarray:
+    # P @ y, matrix stays in its own dtype (no float64 copy of a float32 matrix)
+    return np.asarray(payoff @ y.astype(payoff.dtype, copy=False), dtype=np.float64)
+
+
+def _times_transpose(payoff: np.ndarray, x: np.ndarray) -> np.ndarray:
+    # P^T @ x
+    return np.asarray(x.astype(payoff.dtype, copy=False) @ payoff, dtype=np.float64)
+
+
+def exploitability(payoff: np.ndarray, x: np.ndarray, y: np.ndarray):
+    # (gap, value) of the strategy pair
+    py = _times(payoff, y)
+    ptx = _times_transpose(payoff, x)
+    return float(py.max() - ptx.min()), float(x @ py)
+
+
+def _start(n: int, warm_start: Optional[np.ndarray]) -> np.ndarray:
+    if warm_start is None:
+        return np.full(n, 1.0 / n)
+    start = np.maximum(np.asarray(warm_start, dtype=np.float64), 0)
+    if len(start) != n or start.sum() <= 0:
+        raise ValueError(f"warm start needs {n} non-negative weights with a positive sum")
+    return start / start.sum()
+
+
+def _normalize(weights: np.ndarray) -> np.ndarray:
+    total = weights.sum()
+    return weights / total if total > 0 else np.full(len(weights), 1.0 / len(weights))
+
+
+class _Progress:
+    # gap history, a line every report_every iterations, and the caller's callback
+    def __init__(self, name: str, report_every: int, callback: Optional[Callable]):
+        self.name = name
+        self.report_every = report_every
+        self.callback = callback
+        self.history: List[float] = []
+        self.start = time.time()
+
+    def __call__(self, iteration: int, gap: float):
+        self.history.append(gap)
+        if self.report_every and iteration % self.report_every == 0:
+            print(f"{self.name} iteration {iteration}: exploitability {gap:.6f} ({time.time() - self.start:.1f}s)")
+        if self.callback is not None:
+            self.callback(iteration, gap)
+
+
+def regret_matching_plus(payoff: np.ndarray, iterations: int = 10000, tolerance: float = 1e-4,
+                         warm_start: Optional[np.ndarray] = None, opponent_start: Optional[np.ndarray] = None,
+                         warm_weight: int = WARM_WEIGHT, report_every: int = 100,
+                         callback: Optional[Callable] = None) -> IterativeResult:
+    n_rows, n_cols = payoff.shape
+    warm = warm_start is not None or opponent_start is not None
+    x = _start(n_rows, warm_start)
+    y = _start(n_cols, opponent_start if opponent_start is not None else warm_start)
+    py = _times(payoff, y)
+
+    # a warm start stands in for warm_weight earlier iterations: the averages begin there,
+    # and the regrets are scaled so the first strategies stay there
+    offset = warm_weight if warm else 0
+    regret_x, regret_y = x * np.sqrt(offset + 1), y * np.sqrt(offset + 1)
+    x_avg, y_avg = x.copy(), y.copy()
+    py_avg, ptx_avg = py.copy(), _times_transpose(payoff, x)
+    weight = offset * (offset + 1) / 2
+    progress = _Progress('rm+', report_every, callback)
+    gap, converged, iteration = np.inf, False, 0
+    for iteration in range(1, iterations + 1):
+        # alternating: x answers y, then y answers the new x
+        regret_x = np.maximum(regret_x + py - x @ py, 0)
+        x = _normalize(regret_x)
+        ptx = _times_transpose(payoff, x)
+        regret_y = np.maximum(regret_y - ptx + y @ ptx, 0)
+        y = _normalize(regret_y)
+        py = _times(payoff, y)
+
+        # iterate t weighted by t, the products of the averages are the averages of the products
+        weight += offset + iteration
+        share = (offset + iteration) / weight
+        x_avg += share * (x - x_avg)
+        y_avg += share * (y - y_avg)
+        ptx_avg += share * (ptx - ptx_avg)
+        py_avg += share * (py - py_avg)
+
+        gap = float(py_avg.max() - ptx_avg.min())
+        progress(iteration, gap)
+        if gap < tolerance:
+            converged = True
+            break
+
+    return IterativeResult(x_avg, y_avg, float(x_avg @ py_avg), gap, iteration, converged,
+                           time.time() - progress.start, progress.history)
+
+
+def optimistic_mwu(payoff: np.ndarray, iterations: int = 10000, tolerance: float = 1e-4, step_size: float = 0.5,
+                   warm_start: Optional[np.ndarray] = None, opponent_start: Optional[np.ndarray] = None,
+                   report_every: int = 100, callback: Optional[Callable] = None) -> IterativeResult:
+    n_rows, n_cols = payoff.shape
+    x = _start(n_rows, warm_start)
+    y = _start(n_cols, opponent_start if opponent_start is not None else warm_start)
+    # log weights, floored so a warm start with zeros can still move
+    log_x = np.log(np.maximum(x, 1e-12))
+    log_y = np.log(np.maximum(y, 1e-12))
+    py, ptx = _times(payoff, y), _times_transpose(payoff, x)
+    last_py, last_ptx = py, ptx
+
+    x_avg, y_avg = np.zeros(n_rows), np.zeros(n_cols)
+    py_avg, ptx_avg = np.zeros(n_rows), np.zeros(n_cols)
+    progress = _Progress('omwu', report_every, callback)
+    gap = last_gap = average_gap = np.inf
+    converged, iteration = False, 0
+    for iteration in range(1, iterations + 1):
+        # step along the predicted payoff, 2 * this one - the previous one
+        log_x += step_size * (2 * py - last_py)
+        log_y -= step_size * (2 * ptx - last_ptx)
+        log_x -= log_x.max()
+        log_y -= log_y.max()
+        x = _normalize(np.exp(log_x))
+        y = _normalize(np.exp(log_y))
+
+        last_py, last_ptx = py, ptx
+        py, ptx = _times(payoff, y), _times_transpose(payoff, x)
+
+        # the last iterate converges, but slowly once weights pile up on the support boundary,
+        # the uniform average is the usual no-regret guarantee, report whichever is closer
+        share = 1.0 / iteration
+        x_avg += share * (x - x_avg)
+        y_avg += share * (y - y_avg)
+        ptx_avg += share * (ptx - ptx_avg)
+        py_avg += share * (py - py_avg)
+        last_gap = float(py.max() - ptx.min())
+        average_gap = float(py_avg.max() - ptx_avg.min())
+
+        gap = min(last_gap, average_gap)
+        progress(iteration, gap)
+        if gap < tolerance:
+            converged = True
+            break
+
+    if average_gap < last_gap:
+        x, y, py = x_avg, y_avg, py_avg
+    return IterativeResult(x, y, float(x @ py), gap, iteration, converged, time.time() - progress.start,
+                           progress.history)
+
+
+def fictitious_play(payoff: np.ndarray, iterations: int = 100000, tolerance: float = 1e-3,
+                    warm_start: Optional[np.ndarray] = None, opponent_start: Optional[np.ndarray] = None,
+                    warm_weight: int = WARM_WEIGHT, report_every: int = 1000,
+                    callback: Optional[Callable] = None) -> IterativeResult:
+    n_rows, n_cols = payoff.shape
+    warm = warm_start is not None or opponent_start is not None
+    x = _start(n_rows, warm_start)
+    y = _start(n_cols, opponent_start if opponent_start is not None else warm_start)
+    py, ptx = _times(payoff, y), _times_transpose(payoff, x)
+
+    progress = _Progress('fp', report_every, callback)
+    gap, converged, iteration = np.inf, False, 0
+    # the start counts as one play, a warm start as warm_weight plays
+    offset = warm_weight if warm else 1
+    for iteration in range(1, iterations + 1):
+        row, column = int(np.argmax(py)), int(np.argmin(ptx))
+        share = 1.0 / (iteration + offset)
+        x *= 1 - share
+        x[row] += share
+        y *= 1 - share
+        y[column] += share
+        # a best response is a pure strategy, so the products update with one row and one column
+        ptx += share * (np.asarray(payoff[row], dtype=np.float64) - ptx)
+        py += share * (np.asarray(payoff[:, column], dtype=np.float64) - py)
+
+        gap = float(py.max() - ptx.min())
+        progress(iteration, gap)
+        if gap < tolerance:
+            converged = True
+            break
+
+    return IterativeResult(x, y, float(x @ py), gap, iteration, converged, time.time() - progress.start,
+                           progress.history)
+
+
+SOLVERS = {
+    'rm+': regret_matching_plus,
+    'omwu': optimistic_mwu,
+    'fp': fictitious_play,
+}
+
+
+def solve(payoff: np.ndarray, method: str = 'rm+', **kwargs) -> IterativeResult:
+    if method not in SOLVERS:
+        raise ValueError(f"Unknown solver '{method}'. Available: {', '.join(SOLVERS)}")
+    return SOLVERS[method](payoff, **kwargs)
@@ -2,36 +2,119 @@
 import numpy as np
 import pandas as pd
 from scipy.optimize import linprog
-from typing import Tuple, List, Dict
+from typing import Tuple
 import warnings
+import hashlib
+import json
 import os
+import sys
 import time
 warnings.filterwarnings('ignore')
 
+# team codes decode with the simulator's species table
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'simulator'))
+from team_codes import composition, load_species, species_path
+from grid_store import load_grid
+from iterative_solvers import SOLVERS, solve
+from cycles import cycle_participation, dominance_graph, three_cycles
+
+
+# rows of the CSV read at a time
+CSV_CHUNK = 100000
+# bump when the payoff convention changes, older cached matrices are rebuilt
+PAYOFF_VERSION = 2
+
+
+def mirror_mean(payoff: np.ndarray, played: np.ndarray) -> np.ndarray:
+    # antisymmetric payoff matrix: each cell is the mean of its played row, p(i, j), and its
+    # negated played mirror row, -p(j, i), 0 where neither was played; the CSV loader applies
+    # the same convention row by row, so both loaders give the same matrix
+    payoff = np.where(played, payoff, 0).astype(np.float32)
+    counts = played.astype(np.float32) + played.T
+    return (payoff - payoff.T) / np.maximum(counts, 1)
+
+
+def payoff_cache_path(csv_path: str) -> str:
+    # <csv>.payoff.npy (matrix) and <csv>.payoff.json (source hash and team table)
+    return f"{csv_path}.payoff"
+
+
+def source_hash(csv_path: str) -> str:
+    # the CSV and its species table, names are decoded with it
+    h = hashlib.blake2b(digest_size=16)
+    for path in (csv_path, species_path(csv_path)):
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 23), b''):
+                h.update(block)
+    return h.hexdigest()
+
+
+def lp_equilibrium(payoff_matrix: np.ndarray):
+    # maximin strategy of the row player as an LP: max v s.t. x^T P >= v, sum(x) = 1, x >= 0
+    # result.x is (strategy..., value)
+    n_teams = payoff_matrix.shape[0]
+
+    # variables
+    c = np.zeros(n_teams + 1, dtype=np.float32)
+    c[-1] = -1
+
+    # constraints
+    A_ub = np.column_stack([-payoff_matrix.T, np.ones(payoff_matrix.shape[1], dtype=np.float32)])
+    b_ub = np.zeros(payoff_matrix.shape[1], dtype=np.float32)
+
+    # zero sum game
+    A_eq = np.zeros((1, n_teams + 1), dtype=np.float32)
+    A_eq[0, :-1] = 1
+    b_eq = np.array([1], dtype=np.float32)
+
+    # bounds
+    bounds = [(0, None) for _ in range(n_teams)] + [(None, None)]
+
+    return linprog(
+        c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
+        bounds=bounds, method='highs', options={'disp': False, 'presolve': True}
+    )
+
 
 class FastNashSolver:
 
-    def __init__(self, csv_path: str):
+    def __init__(self, csv_path: str, use_cache: bool = True):
         print(f"loading data from {csv_path}")
         start_time = time.time()
+        # exploitability per iteration of the last iterative solve
+        self.convergence = []
+
+        # result arrays written with run_tournament(grid_dir=...), no CSV parsing
+        if os.path.isdir(csv_path):
+            self._load_grid(csv_path)
+        elif use_cache and self._load_cache(csv_path):
+            print(f"loaded cached payoff matrix {payoff_cache_path(csv_path)}.npy")
+        else:
+            self._load_csv(csv_path)
+            if use_cache:
+                self._save_cache(csv_path)
 
-        # get teams
-        first_chunk = pd.read_csv(csv_path, nrows=1000)
-        self.n_teams = max(first_chunk['Team1_ID'].max(), first_chunk['Team2_ID'].max()) + 1
-        print(f"found {self.n_teams} teams")
+        print(f"payoff matrix: {self.payoff_matrix.shape}")
+        print(f"data loading completed in {time.time() - start_time:.1f}s")
 
-        # create team lookup
-        self.team_names = {}
-        for _, row in first_chunk.iterrows():
-            self.team_names[row['Team1_ID']] = row['Team1_Composition']
-            self.team_names[row['Team2_ID']] = row['Team2_Composition']
+    def _load_csv(self, csv_path: str):
+        start_time = time.time()
+        header = pd.read_csv(csv_path, nrows=0).columns
+        with_codes = 'Team1_Code' in header
+        name_columns = ['Team1_Code', 'Team2_Code'] if with_codes else ['Team1_Composition', 'Team2_Composition']
+        columns = ['Team1_ID', 'Team2_ID', 'Team1_Wins', 'Team2_Wins', 'Total_Battles'] + name_columns
 
-        # build payoff matrix
+        # build payoff matrix, grown as larger team ids show up
+        # sums of p(i, j) and -p(j, i) per cell and how many of the two were played, see mirror_mean
         print("building payoff matrix")
-        self.payoff_matrix = np.zeros((self.n_teams, self.n_teams), dtype=np.float32)
+        self.payoff_matrix = np.zeros((0, 0), dtype=np.float32)
+        counts = np.zeros((0, 0), dtype=np.uint8)
+        # first name (or code) seen per team id
+        names = {}
 
-        chunk_size = 100000
-        for i, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunk_size)):
+        for i, chunk in enumerate(pd.read_csv(csv_path, usecols=columns, chunksize=CSV_CHUNK)):
             # vectorized processing
             t1_arr = chunk['Team1_ID'].values
             t2_arr = chunk['Team2_ID'].values
@@ -39,114 +122,121 @@ class FastNashSolver:
             wins1_arr = chunk['Team1_Wins'].values
             wins2_arr = chunk['Team2_Wins'].values
 
+            n = max(int(t1_arr.max()), int(t2_arr.max())) + 1
+            if n > len(self.payoff_matrix):
+                grown = np.zeros((n, n), dtype=np.float32)
+                grown[:len(self.payoff_matrix), :len(self.payoff_matrix)] = self.payoff_matrix
+                self.payoff_matrix = grown
+                grown = np.zeros((n, n), dtype=np.uint8)
+                grown[:len(counts), :len(counts)] = counts
+                counts = grown
+
             # filter valid battles
             valid_mask = total_arr > 0
             t1_valid = t1_arr[valid_mask]
             t2_valid = t2_arr[valid_mask]
-            payoff_valid = (wins1_arr[valid_mask] - wins2_arr[valid_mask]) / total_arr[valid_mask]
+            payoff_valid = ((wins1_arr[valid_mask] - wins2_arr[valid_mask]) / total_arr[valid_mask]).astype(np.float32)
 
-            # update matrix
-            self.payoff_matrix[t1_valid, t2_valid] = payoff_valid
-            self.payoff_matrix[t2_valid, t1_valid] = -payoff_valid
+            # update matrix, a row and its mirror may sit in the same chunk or in different ones
+            cells = (np.concatenate([t1_valid, t2_valid]), np.concatenate([t2_valid, t1_valid]))
+            np.add.at(self.payoff_matrix, cells, np.concatenate([payoff_valid, -payoff_valid]))
+            np.add.at(counts, cells, 1)
 
-            # update team names
-            for _, row in chunk.iterrows():
-                t1 = row['Team1_ID']
-                t2 = row['Team2_ID']
-                if t1 not in self.team_names:
-                    self.team_names[t1] = row['Team1_Composition']
-                if t2 not in self.team_names:
-                    self.team_names[t2] = row['Team2_Composition']
+            # update team names, first occurrence of each id in the chunk
+            for ids, values in ((t1_arr, chunk[name_columns[0]].values), (t2_arr, chunk[name_columns[1]].values)):
+                unique_ids, first = np.unique(ids, return_index=True)
+                for t, value in zip(unique_ids.tolist(), values[first].tolist()):
+                    names.setdefault(t, value)
 
             elapsed = time.time() - start_time
             print(f"processed chunk {i+1} ({elapsed:.1f}s)")
 
-        print(f"payoff matrix: {self.payoff_matrix.shape}")
-        print(f"data loading completed in {time.time() - start_time:.1f}s")
+        self.payoff_matrix /= np.maximum(counts, 1)
+        self.n_teams = len(self.payoff_matrix)
+        print(f"found {self.n_teams} teams")
+        if with_codes:
+            species = load_species(csv_path)
+            self.team_names = {t: composition(int(code), species) for t, code in names.items()}
+        else:
+            self.team_names = names
+
+    def _load_cache(self, csv_path: str) -> bool:
+        # payoff matrix and team table from an earlier run on the same file
+        path = payoff_cache_path(csv_path)
+        if not (os.path.exists(f"{path}.npy") and os.path.exists(f"{path}.json")):
+            return False
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        if meta.get('source_hash') != source_hash(csv_path) or meta.get('payoff_version') != PAYOFF_VERSION:
+            print(f"{path} is stale, rebuilding")
+            return False
+        self.payoff_matrix = np.load(f"{path}.npy")
+        self.n_teams = len(self.payoff_matrix)
+        self.team_names = {int(t): name for t, name in zip(meta['team_ids'], meta['team_names'])}
+        print(f"found {self.n_teams} teams")
+        return True
+
+    def _save_cache(self, csv_path: str):
+        path = payoff_cache_path(csv_path)
+        try:
+            np.save(f"{path}.npy", self.payoff_matrix)
+            ids = sorted(self.team_names)
+            with open(f"{path}.json", 'w') as f:
+                json.dump({'source_hash': source_hash(csv_path), 'payoff_version': PAYOFF_VERSION,
+                           'n_teams': self.n_teams, 'team_ids': ids, 'team_names': [self.team_names[t] for t in ids]}, f)
+        except OSError as e:
+            print(f"could not cache payoff matrix: {e}")
+
+    def _load_grid(self, grid_dir: str):
+        grid = load_grid(grid_dir)
+        self.n_teams = grid.n
+        print(f"found {self.n_teams} teams")
+        self.team_names = dict(enumerate(grid.compositions))
+
+        battles = grid.battles().astype(np.float64)
+        payoff = (grid.wins.astype(np.float64) - grid.losses) / np.maximum(battles, 1)
+        self.payoff_matrix = np.ascontiguousarray(mirror_mean(payoff, battles > 0))
 
-    def find_simple_cycles(self) -> List[Dict]:
+    def find_simple_cycles(self, threshold: float = 0.15, max_length: int = 3,
+                           top: int = None) -> pd.DataFrame:
+        # every 3-cycle of the dominance graph (i beats j by more than threshold), see cycles.py
+        # plus how many k-cycles each team is part of for k up to max_length (at most 5)
         print("searching for cycles")
+        start_time = time.time()
 
-        cycles = []
-        threshold = 0.15
-
-        # sample teams
-        sample_size = min(200, self.n_teams)
-        sample_teams = np.random.choice(self.n_teams, sample_size, replace=False)
-
-        for i in sample_teams:
-            # teams that i beats
-            beats_i = np.where(self.payoff_matrix[i] > threshold)[0]
-
-            for j in beats_i:
-                # teams that j beats
-                beats_j = np.where(self.payoff_matrix[j] > threshold)[0]
-
-                for k in beats_j:
-                    # check if k beats i
-                    if self.payoff_matrix[k, i] > threshold:
-                        cycles.append({
-                            'team_ids': [i, j, k],
-                            'teams': [self.team_names[i], self.team_names[j], self.team_names[k]],
-                            'payoffs': [
-                                self.payoff_matrix[i, j],
-                                self.payoff_matrix[j, k],
-                                self.payoff_matrix[k, i]
-                            ],
-                            'avg_dominance': (self.payoff_matrix[i, j] +
-                                            self.payoff_matrix[j, k] +
-                                            self.payoff_matrix[k, i]) / 3
-                        })
-
-        # remove duplicates
-        unique_cycles = []
-        seen = set()
-        for cycle in cycles:
-            cycle_set = frozenset(cycle['team_ids'])
-            if cycle_set not in seen:
-                seen.add(cycle_set)
-                unique_cycles.append(cycle)
-
-        print(f"found {len(unique_cycles)} cycles")
+        adjacency = dominance_graph(self.payoff_matrix, threshold)
+        participation = cycle_participation(adjacency, max_length)
+        names = np.array([self.team_names.get(t, '') for t in range(self.n_teams)], dtype=object)
+        self.cycle_participation = pd.DataFrame(
+            {'Team_ID': np.arange(self.n_teams), 'Composition': names,
+             **{f'Cycles_{k}': counts for k, counts in participation.items()}})
+        for k, counts in participation.items():
+            print(f"{k}-cycles: {counts.sum() // k:,}")
+
+        cycles = three_cycles(adjacency, self.payoff_matrix, top)
+        for column in ('Team1', 'Team2', 'Team3'):
+            cycles.insert(cycles.columns.get_loc(f'{column}_ID') + 1, f'{column}_Composition',
+                          names[cycles[f'{column}_ID'].values])
+        print(f"found {len(cycles)} cycles ({time.time() - start_time:.2f}s)")
 
         # print top cycles
-        if unique_cycles:
-            sorted_cycles = sorted(unique_cycles, key=lambda x: x['avg_dominance'], reverse=True)
-            for i, cycle in enumerate(sorted_cycles[:5]):
-                print(f"cycle {i+1}: {cycle['avg_dominance']:.3f}")
-                for j in range(3):
-                    print(f"  {cycle['teams'][j]} beats {cycle['teams'][(j+1)%3]} ({cycle['payoffs'][j]:+.3f})")
+        for i, cycle in enumerate(cycles.head(5).itertuples(index=False)):
+            print(f"cycle {i+1}: {cycle.Avg_Dominance:.3f}")
+            teams = [cycle.Team1_Composition, cycle.Team2_Composition, cycle.Team3_Composition]
+            payoffs = [cycle.Payoff_12, cycle.Payoff_23, cycle.Payoff_31]
+            for j in range(3):
+                print(f"  {teams[j]} beats {teams[(j+1)%3]} ({payoffs[j]:+.3f})")
 
-        return unique_cycles
+        return cycles
 
     def solve_nash_equilibrium(self) -> Tuple[np.ndarray, float]:
         print("solving nash equilibrium")
         print(f"problem size: {self.n_teams} teams")
         start_time = time.time()
 
-        # variables
-        c = np.zeros(self.n_teams + 1, dtype=np.float32)
-        c[-1] = -1
-
-        # constraints
-        print("building constraint matrices")
-        A_ub = np.column_stack([-self.payoff_matrix.T, np.ones(self.n_teams, dtype=np.float32)])
-        b_ub = np.zeros(self.n_teams, dtype=np.float32)
-
-        # zero sum game
-        A_eq = np.zeros((1, self.n_teams + 1), dtype=np.float32)
-        A_eq[0, :-1] = 1
-        b_eq = np.array([1], dtype=np.float32)
-
-        # bounds
-        bounds = [(0, None) for _ in range(self.n_teams)] + [(None, None)]
-
         print("running LP solver (this may take a while)")
         solve_start = time.time()
-        result = linprog(
-            c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq,
-            bounds=bounds, method='highs', options={'disp': False, 'presolve': True}
-        )
+        result = lp_equilibrium(self.payoff_matrix)
         solve_time = time.time() - solve_start
 
         if not result.success:
@@ -164,6 +254,30 @@ class FastNashSolver:
 
         return strategy, value
 
+    def solve_iterative(self, method: str = 'rm+', warm_start: np.ndarray = None,
+                        **kwargs) -> Tuple[np.ndarray, float]:
+        # first-order alternative to the LP, matrix-vector products only (see iterative_solvers.py)
+        print(f"solving nash equilibrium with {method}")
+        print(f"problem size: {self.n_teams} teams")
+        result = solve(self.payoff_matrix, method=method, warm_start=warm_start, **kwargs)
+        self.convergence = result.history
+
+        support_size = np.sum(result.strategy > 1e-6)
+        print(f"{method} {'converged' if result.converged else 'stopped'} after {result.iterations} iterations "
+              f"in {result.seconds:.1f}s")
+        print(f"exploitability gap: {result.exploitability:.6f}")
+        print(f"game value: {result.value:.6f}")
+        print(f"support size: {support_size} teams ({100*support_size/self.n_teams:.1f}%)")
+        return result.strategy, result.value
+
+    def load_strategy(self, strategy_csv: str) -> np.ndarray:
+        # probabilities from a previous nash_results_full_strategy.csv, for warm starts
+        df = pd.read_csv(strategy_csv, usecols=['Team_ID', 'Probability'])
+        strategy = np.zeros(self.n_teams)
+        known = df['Team_ID'].values < self.n_teams
+        strategy[df['Team_ID'].values[known]] = df['Probability'].values[known]
+        return strategy
+
     def analyze_results(self, strategy: np.ndarray, value: float):
         print("analyzing results")
 
@@ -267,18 +381,44 @@ class FastNashSolver:
         summary_df.to_csv(f'{output_base}_summary.csv', index=False)
         print(f"saved summary statistics to {output_base}_summary.csv")
 
+        # exploitability per iteration, iterative solvers only
+        if self.convergence:
+            convergence_df = pd.DataFrame({
+                'Iteration': np.arange(1, len(self.convergence) + 1),
+                'Exploitability': self.convergence
+            })
+            convergence_df.to_csv(f'{output_base}_convergence.csv', index=False)
+            print(f"saved convergence history to {output_base}_convergence.csv")
+
 def main():
-    import sys
+    import argparse
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    csv_path = os.path.join(script_dir, 'tr_100clean.csv')
-
-    if len(sys.argv) > 1:
-        csv_path = sys.argv[1]
-
-    solver = FastNashSolver(csv_path)
-    cycles = solver.find_simple_cycles()
-    strategy, value = solver.solve_nash_equilibrium()
+    parser = argparse.ArgumentParser(description='Nash equilibrium of a tournament payoff matrix')
+    parser.add_argument('results', nargs='?', default=os.path.join(script_dir, 'tr_100clean.csv'),
+                        help='tournament CSV or result grid directory')
+    parser.add_argument('--solver', choices=['lp'] + list(SOLVERS), default='lp',
+                        help='lp (exact, HiGHS) or a first-order solver for matrices too large for the LP')
+    parser.add_argument('--iterations', type=int, default=None, help='iteration cap for first-order solvers')
+    parser.add_argument('--tolerance', type=float, default=None, help='stop once the exploitability gap is below this')
+    parser.add_argument('--warm-start', default=None, help='nash_results_full_strategy.csv of an earlier run')
+    parser.add_argument('--cycle-threshold', type=float, default=0.15,
+                        help='payoff margin for the dominance graph the cycle search runs on')
+    parser.add_argument('--cycle-length', type=int, default=3,
+                        help='count cycles up to this length (3 to 5) per team, 3-cycles are always listed')
+    parser.add_argument('--no-cache', action='store_true',
+                        help="don't read or write the <csv>.payoff.npy cache, always parse the CSV")
+    args = parser.parse_args()
+
+    solver = FastNashSolver(args.results, use_cache=not args.no_cache)
+    cycles = solver.find_simple_cycles(args.cycle_threshold, args.cycle_length)
+    if args.solver == 'lp':
+        strategy, value = solver.solve_nash_equilibrium()
+    else:
+        options = {name: value for name, value in (('iterations', args.iterations), ('tolerance', args.tolerance))
+                   if value is not None}
+        warm_start = solver.load_strategy(args.warm_start) if args.warm_start else None
+        strategy, value = solver.solve_iterative(args.solver, warm_start=warm_start, **options)
 
     if strategy is not None:
         solver.analyze_results(strategy, value)
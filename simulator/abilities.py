@@ -1,20 +1,18 @@
 
-import random
-
-from core import GameState, Pet, Team
+from core import GameState, Pet, Team, RandomChoice
 
 # implementations of the pets abilities
 
 def _trigger_friend_summoned(state: GameState, own_team: Team, summoned_pet: Pet):
     from core import TriggerType
-    for pet in own_team.get_alive_pets():
-        if pet is not summoned_pet and pet.trigger_type == TriggerType.FRIEND_SUMMONED and pet.ability:
+    for pet in list(own_team.subscribers(TriggerType.FRIEND_SUMMONED)):
+        if pet is not summoned_pet:
             pet.ability(state, pet, own_team, summoned_pet=summoned_pet)
 
 def ant_ability(state: GameState, self_pet: Pet, own_team: Team):
     alive_friends = [p for p in own_team.get_alive_pets() if p is not self_pet]
     if alive_friends:
-        target = random.choice(alive_friends)
+        target = state.randomness.choose_random(RandomChoice("ant buff target", alive_friends))
         target.attack += 1
         target.health += 1
 
@@ -32,7 +30,7 @@ def mosquito_ability(state: GameState, self_pet: Pet, own_team: Team):
     alive_enemies = enemy_team.get_alive_pets()
     if not alive_enemies:
         return
-    target = random.choice(alive_enemies)
+    target = state.randomness.choose_random(RandomChoice("mosquito target", alive_enemies))
     target.take_damage(1)
 
 def horse_ability(state: GameState, self_pet: Pet, own_team: Team, summoned_pet: Pet = None):
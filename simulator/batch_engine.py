@@ -0,0 +1,245 @@
+import numpy as np
+from typing import Dict, Optional, Sequence, Tuple, Union
+from core import Team, TeamTemplate, TriggerType
+from abilities import ant_ability, cricket_ability, horse_ability, mosquito_ability
+from rng import NO_MATCHUP, randbelow_array, stream_keys
+
+# vectorized engine: N battles held as (N, 2, slots) arrays, advanced in lockstep
+# mirrors BattleSimulator rule for rule, abilities are dispatched by code instead of callable
+# every lane draws from the same counter-based stream the object engine would use for that
+# battle, in the same order, so both engines give identical results for the same seed
+
+NO_ABILITY = 0
+ANT = 1
+CRICKET = 2
+MOSQUITO = 3
+HORSE = 4
+
+# (trigger, ability) pairs the batch engine knows how to resolve
+ABILITY_CODES = {
+    (None, None): NO_ABILITY,
+    (TriggerType.FAINT, ant_ability): ANT,
+    (TriggerType.FAINT, cricket_ability): CRICKET,
+    (TriggerType.START_OF_BATTLE, mosquito_ability): MOSQUITO,
+    (TriggerType.FRIEND_SUMMONED, horse_ability): HORSE,
+}
+
+ZOMBIE_ATTACK = 1
+ZOMBIE_HEALTH = 1
+
+
+class EncodedTeams:
+    # teams packed into (T, slots) arrays, lanes gather rows from here by index
+    def __init__(self, templates: Sequence[TeamTemplate]):
+        slots = max((len(t.names) for t in templates), default=5)
+        n = len(templates)
+        self.slots = slots
+        self.attack = np.zeros((n, slots), dtype=np.int16)
+        self.health = np.zeros((n, slots), dtype=np.int16)
+        self.present = np.zeros((n, slots), dtype=bool)
+        self.alive = np.zeros((n, slots), dtype=bool)
+        self.ability = np.zeros((n, slots), dtype=np.int8)
+
+        for t, template in enumerate(templates):
+            for i in template.occupied:
+                key = (template.trigger[i], template.ability[i])
+                if key not in ABILITY_CODES:
+                    raise ValueError(f"batch engine cannot resolve {template.names[i]} ({key[0]}, {key[1]})")
+                self.attack[t, i] = template.attack[i]
+                self.health[t, i] = template.health[i]
+                self.present[t, i] = True
+                self.alive[t, i] = not template.fainted[i]
+                self.ability[t, i] = ABILITY_CODES[key]
+
+    def __len__(self):
+        return len(self.attack)
+
+    @classmethod
+    def from_teams(cls, teams: Sequence[Union[Team, TeamTemplate]]) -> 'EncodedTeams':
+        return cls([t.template() if isinstance(t, Team) else t for t in teams])
+
+
+def _nth_true(mask: np.ndarray, n: np.ndarray) -> np.ndarray:
+    # column of the n-th (0-based) True in each row
+    return np.argmax(np.cumsum(mask, axis=1) > n[:, None], axis=1)
+
+
+class BatchBattleEngine:
+    def __init__(self, seed=None):
+        if seed is None:
+            import random
+            seed = random.SystemRandom().randrange(2**32)
+        self.seed = seed
+        # battles that aren't tied to a matchup, same running stream as BattleSimulator
+        self.battle_count = 0
+        self.draw_counts = None  # random draws per lane of the last run
+
+    def _rand_below(self, lanes: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        # uniform index in [0, count) for the given lanes, advances their draw counters
+        values = randbelow_array(self._keys[lanes], self._battles[lanes], self._counters[lanes], counts)
+        self._counters[lanes] += 1
+        return values
+
+    def run(self, encoded: EncodedTeams, idx1: np.ndarray, idx2: np.ndarray,
+            keys: np.ndarray, battles: np.ndarray) -> np.ndarray:
+        # winners per lane, 1 / 2 / 0 for draw, same convention as GameState.winner
+        # lane k draws from stream keys[k], battle index battles[k]
+        idx1 = np.asarray(idx1, dtype=np.int64)
+        idx2 = np.asarray(idx2, dtype=np.int64)
+        n = len(idx1)
+        self._keys = np.asarray(keys, dtype=np.uint64)
+        self._battles = np.asarray(battles, dtype=np.int64)
+        self._counters = np.zeros(n, dtype=np.uint64)
+        draw_counts = np.zeros(n, dtype=np.int64)
+
+        # stack both sides on axis 1 so attacks and checks run for both teams at once
+        atk = np.stack([encoded.attack[idx1], encoded.attack[idx2]], axis=1)
+        hp = np.stack([encoded.health[idx1], encoded.health[idx2]], axis=1)
+        alive = np.stack([encoded.alive[idx1], encoded.alive[idx2]], axis=1)
+        present = np.stack([encoded.present[idx1], encoded.present[idx2]], axis=1)
+        ab = np.stack([encoded.ability[idx1], encoded.ability[idx2]], axis=1)
+
+        winners = np.full(n, -1, dtype=np.int8)
+        lanes = np.arange(n)
+
+        # start of battle, then the faint pass it can cause
+        self._start_of_battle(atk, hp, alive, ab)
+        self._process_faints(atk, hp, alive, present, ab)
+
+        while len(lanes):
+            # winner check, same as GameState.check_winner
+            any1 = alive[:, 0].any(axis=1)
+            any2 = alive[:, 1].any(axis=1)
+            finished = ~(any1 & any2)
+            if finished.any():
+                done = lanes[finished]
+                winners[done] = np.where(~any1[finished] & ~any2[finished], 0,
+                                         np.where(any1[finished], 1, 2))
+                draw_counts[done] = self._counters[finished]
+                keep = ~finished
+                lanes = lanes[keep]
+                atk, hp, alive, present, ab = atk[keep], hp[keep], alive[keep], present[keep], ab[keep]
+                self._keys, self._battles, self._counters = self._keys[keep], self._battles[keep], self._counters[keep]
+                if not len(lanes):
+                    break
+
+            # front pets trade simultaneously
+            rows = np.arange(len(lanes))
+            front1 = np.argmax(alive[:, 0], axis=1)
+            front2 = np.argmax(alive[:, 1], axis=1)
+            damage1 = atk[rows, 0, front1]
+            damage2 = atk[rows, 1, front2]
+            hp[rows, 0, front1] = np.maximum(hp[rows, 0, front1] - damage2, 0)
+            hp[rows, 1, front2] = np.maximum(hp[rows, 1, front2] - damage1, 0)
+
+            self._process_faints(atk, hp, alive, present, ab)
+
+        self.draw_counts = draw_counts
+        return winners
+
+    def _start_of_battle(self, atk, hp, alive, ab):
+        # interleave the k-th start of battle pet of team 1, then of team 2
+        sob = alive & (ab == MOSQUITO)
+        if not sob.any():
+            return
+        counts = sob.sum(axis=2)
+        for k in range(sob.shape[2]):
+            for side in (0, 1):
+                lanes = np.nonzero(counts[:, side] > k)[0]
+                if not len(lanes):
+                    continue
+                # mosquito: 1 damage to a random non-fainted enemy
+                enemies = alive[lanes, 1 - side]
+                c = enemies.sum(axis=1)
+                has = c > 0
+                lanes, enemies, c = lanes[has], enemies[has], c[has]
+                if not len(lanes):
+                    continue
+                target = _nth_true(enemies, self._rand_below(lanes, c))
+                hp[lanes, 1 - side, target] = np.maximum(hp[lanes, 1 - side, target] - 1, 0)
+
+    def _process_faints(self, atk, hp, alive, present, ab):
+        newly = alive & (hp <= 0)
+        if not newly.any():
+            return
+        alive &= ~newly
+
+        # faint triggers resolve team 1 slots in order, then team 2
+        triggered = newly & ((ab == ANT) | (ab == CRICKET))
+        if not triggered.any():
+            return
+        for side in (0, 1):
+            for slot in range(triggered.shape[2]):
+                lanes = np.nonzero(triggered[:, side, slot])[0]
+                if not len(lanes):
+                    continue
+                codes = ab[lanes, side, slot]
+
+                ants = lanes[codes == ANT]
+                if len(ants):
+                    # ant: +1/+1 to a random living friend
+                    friends = alive[ants, side]
+                    c = friends.sum(axis=1)
+                    has = c > 0
+                    ants, friends, c = ants[has], friends[has], c[has]
+                    if len(ants):
+                        target = _nth_true(friends, self._rand_below(ants, c))
+                        atk[ants, side, target] += 1
+                        hp[ants, side, target] += 1
+
+                crickets = lanes[codes == CRICKET]
+                if len(crickets):
+                    # cricket: leaves its slot, zombie fills the first empty one
+                    present[crickets, side, slot] = False
+                    empty = np.argmax(~present[crickets, side], axis=1)
+                    horses = (alive[crickets, side] & (ab[crickets, side] == HORSE)).sum(axis=1)
+                    atk[crickets, side, empty] = ZOMBIE_ATTACK + horses
+                    hp[crickets, side, empty] = ZOMBIE_HEALTH
+                    present[crickets, side, empty] = True
+                    alive[crickets, side, empty] = True
+                    ab[crickets, side, empty] = NO_ABILITY
+
+    def run_matchups(self, encoded: EncodedTeams, idx1: np.ndarray, idx2: np.ndarray, num_battles: int,
+                     ids1: Optional[np.ndarray] = None, ids2: Optional[np.ndarray] = None) -> np.ndarray:
+        # (M, 3) counts of team1 wins, team2 wins, draws per matchup
+        # ids1/ids2 are the tournament team ids behind the streams, default to the row indices
+        idx1 = np.asarray(idx1, dtype=np.int64)
+        idx2 = np.asarray(idx2, dtype=np.int64)
+        ids1 = idx1 if ids1 is None else ids1
+        ids2 = idx2 if ids2 is None else ids2
+        m = len(idx1)
+        keys = np.repeat(stream_keys(self.seed, ids1, ids2), num_battles)
+        battles = np.tile(np.arange(num_battles), m)
+        winners = self.run(encoded, np.repeat(idx1, num_battles), np.repeat(idx2, num_battles), keys, battles)
+        return self._tally(winners, m, num_battles)
+
+    def _tally(self, winners: np.ndarray, m: int, num_battles: int) -> np.ndarray:
+        matchup = np.repeat(np.arange(m), num_battles)
+        counts = np.zeros((m, 3), dtype=np.int64)
+        for col, outcome in enumerate((1, 2, 0)):
+            counts[:, col] = np.bincount(matchup[winners == outcome], minlength=m)
+        return counts
+
+    def k_battles(self, team1: Union[Team, TeamTemplate], team2: Union[Team, TeamTemplate], num_simulations: int = 1000,
+                  matchup: Optional[Tuple[int, int]] = None) -> Dict:
+        # drop-in for BattleSimulator.k_battles, including its streams
+        encoded = EncodedTeams.from_teams([team1, team2])
+        if matchup is not None:
+            counts = self.run_matchups(encoded, [0], [1], num_simulations, [matchup[0]], [matchup[1]])
+        else:
+            keys = np.repeat(stream_keys(self.seed, [NO_MATCHUP[0]], [NO_MATCHUP[1]]), num_simulations)
+            battles = np.arange(self.battle_count, self.battle_count + num_simulations)
+            self.battle_count += num_simulations
+            winners = self.run(encoded, np.zeros(num_simulations), np.ones(num_simulations), keys, battles)
+            counts = self._tally(winners, 1, num_simulations)
+        wins1, wins2, draws = (int(x) for x in counts[0])
+        return {
+            'total_simulations': num_simulations,
+            'team1_wins': wins1,
+            'team2_wins': wins2,
+            'draws': draws,
+            'team1_win_rate': (wins1 / num_simulations) * 100,
+            'team2_win_rate': (wins2 / num_simulations) * 100,
+            'draw_rate': (draws / num_simulations) * 100,
+            'random_draws': int(self.draw_counts.sum()),
+        }
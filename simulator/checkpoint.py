@@ -0,0 +1,49 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+# manifest written next to a tournament CSV at every flush
+# it records how many matchups (and bytes) of the CSV are complete, and a hash of
+# everything that decides the results, so a resumed run can only continue the same tournament
+
+
+def checkpoint_path(output_file: str) -> str:
+    return f"{output_file}.ckpt.json"
+
+
+def config_hash(config: Dict) -> str:
+    # config must be json-serializable, key order doesn't matter
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def write_checkpoint(output_file: str, manifest: Dict):
+    # temp file + rename, a crash leaves either the old manifest or the new one
+    path = checkpoint_path(output_file)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(output_file: str) -> Optional[Dict]:
+    path = checkpoint_path(output_file)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def validate_resume(output_file: str, manifest: Dict, config: Dict, header: str):
+    # raise if the CSV on disk can't be continued by this run
+    if manifest['config_hash'] != config_hash(config):
+        raise ValueError(f"{checkpoint_path(output_file)} was written by a different tournament configuration")
+    if not os.path.exists(output_file):
+        raise ValueError(f"checkpoint found but {output_file} is missing")
+    if os.path.getsize(output_file) < manifest['bytes_committed']:
+        raise ValueError(f"{output_file} is shorter than its checkpoint ({manifest['bytes_committed']:,} bytes)")
+    with open(output_file, newline='') as f:
+        if f.readline() != header:
+            raise ValueError(f"{output_file} header doesn't match this tournament")
@@ -1,7 +1,7 @@
 
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import List, Optional, Callable, Any
+from typing import Dict, List, Optional, Callable, Any, Tuple
 from enum import Enum
 import copy
 import random
@@ -39,6 +39,7 @@ class Pet:
     trigger_type: Optional[TriggerType] = None
     is_fainted: bool = False
     position: Optional[int] = None  # position in team
+    species_id: int = -1  # index into PET_REGISTRY, -1 for summoned tokens
 
     def __repr__(self):
         status = "X" if self.is_fainted else ""
@@ -66,6 +67,9 @@ class Team:
     # team structure
     pets: List[Optional[Pet]] = field(default_factory=lambda: [None] * 5)
     max_size: int = 5
+    # trigger -> living pets with that trigger in slot order, built on first use
+    # kept current on faint and summon, so a phase nobody listens to costs one dict lookup
+    dispatch: Optional[Dict[TriggerType, List[Pet]]] = field(default=None, repr=False, compare=False)
 
     def __repr__(self):
         return f"Team({[p for p in self.pets if p]})"
@@ -83,61 +87,189 @@ class Team:
         for i, p in enumerate(self.pets):
             if p is pet:
                 self.pets[i] = None
+                self.unsubscribe(pet)
                 break
 
+    def subscribers(self, trigger: TriggerType) -> List[Pet]:
+        # living pets that react to this trigger, front to back
+        if self.dispatch is None:
+            self.dispatch = {}
+            for pet in self.pets:
+                if pet and not pet.is_fainted:
+                    self.subscribe(pet)
+        return self.dispatch.get(trigger, ())
+
+    def subscribe(self, pet: Pet):
+        # pets without an ability never show up in the index
+        if self.dispatch is None or pet.trigger_type is None or not pet.ability:
+            return
+        listeners = self.dispatch.setdefault(pet.trigger_type, [])
+        k = len(listeners)
+        while k and listeners[k - 1].position > pet.position:
+            k -= 1
+        listeners.insert(k, pet)
+
+    def unsubscribe(self, pet: Pet):
+        if self.dispatch is None:
+            return
+        listeners = self.dispatch.get(pet.trigger_type)
+        if not listeners:
+            return
+        # by identity, pets are dataclasses and two equal ones can share a team
+        k = next((k for k, p in enumerate(listeners) if p is pet), None)
+        if k is not None:
+            del listeners[k]
+            if not listeners:
+                del self.dispatch[pet.trigger_type]
+
+    def faint(self, pet: Pet):
+        pet.is_fainted = True
+        self.unsubscribe(pet)
+
     def get_pet_at(self, position: int) -> Optional[Pet]:
         if 0 <= position < len(self.pets):
             return self.pets[position]
         return None
 
     def add_pet(self, pet: Pet, position: Optional[int] = None) -> bool:
-        # numerical name handler
-        base_name = pet.name
-        existing_names = []
-        for p in self.pets:
-            if p and not p.is_fainted:
-                existing_names.append(p.name)
-        if base_name in existing_names:
-            counter = 2
-            while f"{base_name}{counter}" in existing_names:
-                counter += 1
-            pet.name = f"{base_name}{counter}"
-
+        # pets are told apart by species id and slot, equal names are fine
         if position is not None:
             if 0 <= position < self.max_size and self.pets[position] is None:
                 self.pets[position] = pet
                 pet.position = position
+                self.subscribe(pet)
                 return True
         else:
             for i in range(self.max_size):
                 if self.pets[i] is None:
                     self.pets[i] = pet
                     pet.position = i
+                    self.subscribe(pet)
                     return True
         return False
 
     def add_pets(self, *pet_names: str) -> 'Team':
-        # add multiple
-        from pets import create_pet
+        # add multiple, names resolve to species ids once
+        from team_codes import pet_from_species, species_id
         for name in pet_names:
-            self.add_pet(create_pet(name))
+            self.add_pet(pet_from_species(species_id(name)))
         return self
 
     def copy(self) -> Team:
         # deep copy, probably legacy
         return copy.deepcopy(self)
 
+    def template(self) -> TeamTemplate:
+        # immutable snapshot for fast battle resets
+        return TeamTemplate.from_team(self)
+
+    def canonical_key(self) -> Tuple:
+        # living pets in slot order, fainted ones dropped since they can't act again
+        # an empty slot is kept only when a living pet sits behind it, a summon could land there
+        key = []
+        gaps = 0
+        for pet in self.pets:
+            if pet is None:
+                gaps += 1
+            elif not pet.is_fainted:
+                if gaps:
+                    key.extend([None] * gaps)
+                    gaps = 0
+                key.append((pet.attack, pet.health, pet.trigger_type, pet.ability))
+        return tuple(key)
+
+
+@dataclass(frozen=True)
+class TeamTemplate:
+    # flat per-slot arrays, None where the slot is empty
+    # abilities are shared callables, so nothing here ever needs a deepcopy
+    names: Tuple[Optional[str], ...]
+    attack: Tuple[int, ...]
+    health: Tuple[int, ...]
+    species: Tuple[int, ...]
+    trigger: Tuple[Optional[TriggerType], ...]
+    ability: Tuple[Optional[Callable], ...]
+    position: Tuple[Optional[int], ...]
+    level: Tuple[int, ...]
+    experience: Tuple[int, ...]
+    fainted: Tuple[bool, ...]
+    occupied: Tuple[int, ...]  # slot indices that hold a pet
+    max_size: int = 5
+
+    def __post_init__(self):
+        # prebuilt attribute dicts, a reset is then one dict copy per pet
+        slot_fields = tuple(
+            (i, {
+                'name': self.names[i],
+                'attack': self.attack[i],
+                'health': self.health[i],
+                'level': self.level[i],
+                'experience': self.experience[i],
+                'ability': self.ability[i],
+                'trigger_type': self.trigger[i],
+                'is_fainted': self.fainted[i],
+                'position': self.position[i],
+                'species_id': self.species[i],
+            })
+            for i in self.occupied
+        )
+        object.__setattr__(self, '_slot_fields', slot_fields)
+        # trigger -> subscribing slots, instantiate turns it into the team's dispatch index
+        dispatch_slots = {}
+        for i in self.occupied:
+            if self.trigger[i] is not None and self.ability[i] and not self.fainted[i]:
+                dispatch_slots.setdefault(self.trigger[i], []).append(i)
+        object.__setattr__(self, '_dispatch_slots', tuple((t, tuple(slots)) for t, slots in dispatch_slots.items()))
+
+    @classmethod
+    def from_team(cls, team: Team) -> TeamTemplate:
+        slots = team.pets
+        occupied = tuple(i for i, p in enumerate(slots) if p is not None)
+
+        def column(attr, empty):
+            return tuple(getattr(p, attr) if p is not None else empty for p in slots)
+
+        return cls(
+            names=column('name', None),
+            attack=column('attack', 0),
+            health=column('health', 0),
+            species=column('species_id', -1),
+            trigger=column('trigger_type', None),
+            ability=column('ability', None),
+            position=column('position', None),
+            level=column('level', 0),
+            experience=column('experience', 0),
+            fainted=column('is_fainted', False),
+            occupied=occupied,
+            max_size=team.max_size,
+        )
+
+    def instantiate(self) -> Team:
+        # fresh mutable team, skips dataclass __init__ and deepcopy
+        pets = [None] * len(self.names)
+        new = object.__new__
+        for i, fields in self._slot_fields:
+            pet = new(Pet)
+            pet.__dict__ = fields.copy()
+            pets[i] = pet
+        team = object.__new__(Team)
+        dispatch = {trigger: [pets[i] for i in slots] for trigger, slots in self._dispatch_slots}
+        team.__dict__ = {'pets': pets, 'max_size': self.max_size, 'dispatch': dispatch}
+        return team
+
 
 @dataclass
 class RandomChoice:
-    ####### old random
+    # one random event, abilities hand these to the state's RandomnessHandler
     description: str
     options: List[Any]
     probabilities: Optional[List[float]] = None
+    uniform: bool = field(init=False, default=False)
 
     def __post_init__(self):
         if self.probabilities is None:
             # uniform distribution
+            self.uniform = True
             self.probabilities = [1.0 / len(self.options)] * len(self.options)
 
 
@@ -151,11 +283,34 @@ class GameState:
     pending_triggers: List[tuple] = field(default_factory=list)
     winner: Optional[int] = None  # 1, 2, or 0 for draw
     is_terminal: bool = False
+    # where abilities get their random draws from
+    randomness: RandomnessHandler = field(default_factory=lambda: RandomnessHandler())
 
     def copy(self) -> GameState:
         # deep copy
         return copy.deepcopy(self)
 
+    @classmethod
+    def from_templates(cls, team1: TeamTemplate, team2: TeamTemplate) -> GameState:
+        # fresh battle from two immutable templates
+        return cls(team1=team1.instantiate(), team2=team2.instantiate())
+
+    def canonical_key(self) -> Tuple:
+        # hashable board, two states with the same key play out the same from here
+        return self.team1.canonical_key(), self.team2.canonical_key()
+
+    def clone(self) -> GameState:
+        # cheap mid-battle copy, shares the randomness handler
+        return GameState(
+            team1=self.team1.template().instantiate(),
+            team2=self.team2.template().instantiate(),
+            phase=self.phase,
+            turn_number=self.turn_number,
+            winner=self.winner,
+            is_terminal=self.is_terminal,
+            randomness=self.randomness,
+        )
+
     def check_winner(self) -> Optional[int]:
         # check for winner
         team1_alive = len(self.team1.get_alive_pets()) > 0
@@ -233,12 +388,20 @@ class GameState:
 
 
 class RandomnessHandler:
-    # gutted out tree exploration options
-    def __init__(self):
-        pass
-        # i removed all this when i took out tree exploration
+    # sampling handler, exact_solver swaps in one that enumerates every option
+    # rng is anything with choice() and random(), the random module by default
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else random
+        self.draws = 0  # random events resolved so far
 
-    # gutted deterministic and explorable choices in favor of random
     def choose_random(self, choice: RandomChoice) -> Any:
-        result = random.choices(choice.options, weights=choice.probabilities)[0]
-        return result
\ No newline at end of file
+        self.draws += 1
+        if choice.uniform:
+            return self.rng.choice(choice.options)
+        u = self.rng.random()
+        cumulative = 0.0
+        for option, probability in zip(choice.options, choice.probabilities):
+            cumulative += probability
+            if u < cumulative:
+                return option
+        return choice.options[-1]
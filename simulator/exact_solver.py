@@ -0,0 +1,128 @@
+from typing import Any, Dict, List, Optional, Tuple, Union
+from core import GameState, Team, TeamTemplate, RandomChoice, RandomnessHandler
+from simulator import BattleSimulator
+from transposition import TranspositionCache
+
+# exact win/loss/draw probabilities by branching on every random event
+# instead of sampling, identical intermediate states are solved once
+
+
+class BranchingRandomness(RandomnessHandler):
+    # replays a fixed prefix of choices, takes option 0 past it and records every event
+    def __init__(self, script: List[int]):
+        self.script = script
+        self.trail: List[List[float]] = []
+
+    def choose_random(self, choice: RandomChoice) -> Any:
+        depth = len(self.trail)
+        k = self.script[depth] if depth < len(self.script) else 0
+        self.trail.append(choice.probabilities)
+        return choice.options[k]
+
+
+def _outcome(winner: int) -> Tuple[float, float, float]:
+    # (team1 win, team2 win, draw)
+    return (1.0 if winner == 1 else 0.0, 1.0 if winner == 2 else 0.0, 1.0 if winner == 0 else 0.0)
+
+
+class ExactSolver:
+    def __init__(self, simulator: Optional[BattleSimulator] = None, cache: Optional[TranspositionCache] = None):
+        self.simulator = simulator or BattleSimulator()
+        # shared across solves when given, otherwise states are merged within one matchup only
+        self.cache = cache
+        self.states_solved = 0
+        self.branches = 0
+
+    def _branches(self, state: GameState, step) -> List[Tuple[float, GameState]]:
+        # every outcome of one step with its probability, identical results merged
+        merged: Dict[Tuple, List] = {}
+        script: List[int] = []
+        while True:
+            child = state.clone()
+            handler = BranchingRandomness(script)
+            child.randomness = handler
+            step(child)
+            self.branches += 1
+
+            # probability of this path through the step
+            prob = 1.0
+            trail = handler.trail
+            choices = script + [0] * (len(trail) - len(script))
+            for k, probabilities in zip(choices, trail):
+                prob *= probabilities[k]
+
+            key = (child.is_terminal, child.winner, child.canonical_key())
+            if key in merged:
+                merged[key][0] += prob
+            else:
+                merged[key] = [prob, child]
+
+            # odometer over the recorded events, deepest first
+            script = choices
+            while script and script[-1] + 1 >= len(trail[len(script) - 1]):
+                script = script[:-1]
+            if not script:
+                break
+            script = script[:-1] + [script[-1] + 1]
+
+        return [(prob, child) for prob, child in merged.values()]
+
+    def _solve_state(self, state: GameState, memo: TranspositionCache) -> Tuple[float, float, float]:
+        if state.is_terminal:
+            return _outcome(state.winner)
+        key = state.canonical_key()
+        known = memo.get(key)
+        if known is not None:
+            return known
+
+        self.states_solved += 1
+        win1 = win2 = draw = 0.0
+        for prob, child in self._branches(state, self.simulator.advance):
+            w1, w2, d = self._solve_state(child, memo)
+            win1 += prob * w1
+            win2 += prob * w2
+            draw += prob * d
+
+        memo.put(key, (win1, win2, draw))
+        return win1, win2, draw
+
+    def _memo(self) -> TranspositionCache:
+        # the shared cache, or a fresh unbounded one for this solve
+        return self.cache if self.cache is not None else TranspositionCache(maxsize=float('inf'))
+
+    def solve_state(self, state: GameState) -> Tuple[float, float, float]:
+        # exact (team1 win, team2 win, draw) from a mid-battle state
+        return self._solve_state(state, self._memo())
+
+    def solve(self, team1: Union[Team, TeamTemplate], team2: Union[Team, TeamTemplate]) -> Dict:
+        # exact outcome distribution for one matchup
+        root = self.simulator.new_state(team1, team2)
+        memo = self._memo()
+
+        win1 = win2 = draw = 0.0
+        for prob, child in self._branches(root, self.simulator.start_battle):
+            w1, w2, d = self._solve_state(child, memo)
+            win1 += prob * w1
+            win2 += prob * w2
+            draw += prob * d
+
+        return {
+            'team1_win_prob': win1,
+            'team2_win_prob': win2,
+            'draw_prob': draw,
+        }
+
+    def k_battles(self, team1: Union[Team, TeamTemplate], team2: Union[Team, TeamTemplate], num_simulations: int = 1000,
+                  matchup: Optional[Tuple[int, int]] = None) -> Dict:
+        # same keys as BattleSimulator.k_battles, counts are expectations over num_simulations battles
+        # matchup is accepted for the same call signature, no stream is needed
+        probs = self.solve(team1, team2)
+        return {
+            'total_simulations': num_simulations,
+            'team1_wins': probs['team1_win_prob'] * num_simulations,
+            'team2_wins': probs['team2_win_prob'] * num_simulations,
+            'draws': probs['draw_prob'] * num_simulations,
+            'team1_win_rate': probs['team1_win_prob'] * 100,
+            'team2_win_rate': probs['team2_win_prob'] * 100,
+            'draw_rate': probs['draw_prob'] * 100,
+        }
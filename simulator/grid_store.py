@@ -0,0 +1,140 @@
+import csv
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from team_codes import write_species
+
+# tournament results as dense n x n arrays on disk, one .npy file per outcome
+# wins[i, j] / losses[i, j] / draws[i, j] are team i's results as team 1 against team j
+# np.load(mmap_mode='r') gives every analysis script zero-copy views, no CSV parsing
+#
+#   <dir>/wins.npy, losses.npy, draws.npy   uint32 counts (float64 expectations for the exact engine)
+#   <dir>/totals.npy, ci.npy                adaptive runs only, achieved battles and interval half width
+#   <dir>/teams.csv                         Team_ID, Team_Code, Composition
+#   <dir>/meta.json                         n, num_battles, engine, seed, species, ...
+
+OUTCOMES = ('wins', 'losses', 'draws')
+
+
+class GridWriter:
+    def __init__(self, path: str, n: int, exact: bool = False, adaptive: bool = False, resume: bool = False):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        # r+ keeps the rows a resumed run has already written
+        mode = 'r+' if resume else 'w+'
+        dtype = np.float64 if exact else np.uint32
+        self.arrays = {name: open_memmap(os.path.join(path, f"{name}.npy"), mode=mode, dtype=dtype, shape=(n, n))
+                       for name in OUTCOMES}
+        if adaptive:
+            self.arrays['totals'] = open_memmap(os.path.join(path, "totals.npy"), mode=mode, dtype=np.uint32,
+                                                shape=(n, n))
+            self.arrays['ci'] = open_memmap(os.path.join(path, "ci.npy"), mode=mode, dtype=np.float64, shape=(n, n))
+        # bytes one matchup takes across the arrays
+        self.cell_bytes = sum(array.itemsize for array in self.arrays.values())
+
+    def write_row(self, i: int, counts: Sequence[Sequence], start: int = 0):
+        # one tournament row, columns start.. (earlier ones are already on disk after a resume)
+        entries = np.asarray(counts[start:], dtype=np.float64)
+        if not len(entries):
+            return
+        for k, name in enumerate(self.arrays):
+            self.arrays[name][i, start:] = entries[:, k]
+
+    def write_cells(self, i: int, columns: Sequence[int], counts: Sequence[Sequence]):
+        # cells (i, j) for j in columns, in any order
+        entries = np.asarray(counts, dtype=np.float64)
+        if not len(entries):
+            return
+        columns = np.asarray(columns, dtype=np.int64)
+        for k, name in enumerate(self.arrays):
+            self.arrays[name][i, columns] = entries[:, k]
+
+    def flush(self):
+        for array in self.arrays.values():
+            array.flush()
+
+
+def write_teams(path: str, codes: Sequence[int], compositions: Sequence[str], meta: Dict):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "teams.csv"), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Team_ID', 'Team_Code', 'Composition'])
+        for team_id, (code, name) in enumerate(zip(codes, compositions)):
+            writer.writerow([team_id, code, name])
+    with open(os.path.join(path, "meta.json"), 'w') as f:
+        json.dump(dict(meta, n=len(codes)), f, indent=2)
+
+
+class Grid:
+    # read side, arrays are memory-mapped views
+    def __init__(self, path: str, mmap_mode: Optional[str] = 'r'):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.wins = np.load(os.path.join(path, "wins.npy"), mmap_mode=mmap_mode)
+        self.losses = np.load(os.path.join(path, "losses.npy"), mmap_mode=mmap_mode)
+        self.draws = np.load(os.path.join(path, "draws.npy"), mmap_mode=mmap_mode)
+        adaptive = os.path.exists(os.path.join(path, "totals.npy"))
+        self.totals = np.load(os.path.join(path, "totals.npy"), mmap_mode=mmap_mode) if adaptive else None
+        self.ci = np.load(os.path.join(path, "ci.npy"), mmap_mode=mmap_mode) if adaptive else None
+
+        self.codes: List[int] = []
+        self.compositions: List[str] = []
+        with open(os.path.join(path, "teams.csv"), newline='') as f:
+            for row in csv.DictReader(f):
+                self.codes.append(int(row['Team_Code']))
+                self.compositions.append(row['Composition'])
+
+    @property
+    def n(self) -> int:
+        return self.meta['n']
+
+    def battles(self) -> np.ndarray:
+        # battles per cell, the cap unless the run was adaptive
+        if self.totals is not None:
+            return self.totals
+        return np.full((self.n, self.n), self.meta['num_battles'], dtype=np.uint32)
+
+
+def load_grid(path: str, mmap_mode: Optional[str] = 'r') -> Grid:
+    return Grid(path, mmap_mode)
+
+
+def export_csv(path: str, csv_file: str, rows_per_chunk: int = 64) -> str:
+    # same columns and formatting run_tournament writes
+    grid = load_grid(path)
+    species = grid.meta['species']
+    adaptive = grid.totals is not None
+    fieldnames = ['Team1_ID', 'Team1_Code', 'Team1_Composition', 'Team2_ID', 'Team2_Code', 'Team2_Composition',
+                  'Team1_Wins', 'Team2_Wins', 'Draws', 'Total_Battles']
+    if adaptive:
+        fieldnames.append('CI_Half_Width')
+
+    n = grid.n
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
+        for start in range(0, n, rows_per_chunk):
+            stop = min(n, start + rows_per_chunk)
+            # python scalars, so ints print as ints and floats round trip
+            wins = grid.wins[start:stop].tolist()
+            losses = grid.losses[start:stop].tolist()
+            draws = grid.draws[start:stop].tolist()
+            if adaptive:
+                totals = grid.totals[start:stop].tolist()
+                ci = grid.ci[start:stop].tolist()
+            for k, i in enumerate(range(start, stop)):
+                for j in range(n):
+                    row = [i, grid.codes[i], grid.compositions[i], j, grid.codes[j], grid.compositions[j],
+                           wins[k][j], losses[k][j], draws[k][j]]
+                    if adaptive:
+                        row += [totals[k][j], ci[k][j]]
+                    else:
+                        row.append(grid.meta['num_battles'])
+                    writer.writerow(row)
+    # species table, as for any tournament CSV
+    write_species(csv_file, species)
+    return csv_file
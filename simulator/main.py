@@ -5,17 +5,75 @@ import sys
 from core import Team
 from simulator import BattleSimulator
 from pprint import pp
-from team_combinations import generate_all_team_sequences, run_tournament
+from team_combinations import generate_all_team_sequences, run_sampled_tournament, run_tournament
+
+
+def flag_value(name: str, default: str = None) -> str:
+    # value following a --flag, or the default
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return default
+
 
 if __name__ == "__main__":
+    # object (pet-by-pet), batch (numpy, lockstep) or exact (no sampling) engine for tournaments
+    # batch is opt-in, --ci-width and --profile need the object engine, --cache-size object or exact
+    engine = flag_value("--engine", "object")
+    # process pool size, output is identical for any value
+    workers = int(flag_value("--workers", "1"))
+    seed = flag_value("--seed", None)
+    seed = int(seed) if seed is not None else None
+    # shared transposition cache entries per worker, off by default
+    cache_size = int(flag_value("--cache-size", "0")) or None
+    # adaptive stopping, num_battles becomes a cap (object engine only)
+    ci_width = flag_value("--ci-width", None)
+    ci_width = float(ci_width) if ci_width is not None else None
+    # simulate each pair of battle-equivalent teams once, mirror cells are flipped copies
+    dedup = "--dedup" in sys.argv
+    # fixed output path, needed to --resume an interrupted run from its checkpoint
+    output = flag_value("--output", None)
+    resume = "--resume" in sys.argv
+    # sqlite file of finished matchups, reruns only simulate what changed
+    result_store = flag_value("--result-store", None)
+    # memory-mapped n x n result arrays, --no-csv skips the CSV
+    grid_dir = flag_value("--grid", None)
+    write_csv = "--no-csv" not in sys.argv
+    # JSON report of time per battle phase and ability, turns and summons (object engine only)
+    profile = flag_value("--profile", None)
+    # JSON-lines throughput records (rates, ETA, worker utilization, output size) to a file or - for stdout
+    telemetry = flag_value("--telemetry", None)
+    telemetry_interval = float(flag_value("--telemetry-interval", "10"))
+    # sampled tournament: every team plays this many opponents instead of the full grid
+    sample_opponents = flag_value("--sample-opponents", None)
+    design = flag_value("--design", "balanced")
+    # pets per team, or a span like 1-5 for every length in one tournament
+    team_lengths = [int(length) for length in flag_value("--team-length", "3").split("-")]
+    # a grid-only run keeps its checkpoint in the grid directory
+    if resume and (output if write_csv else grid_dir) is None:
+        print("--resume needs --output <csv of the interrupted run>, or --grid <dir> with --no-csv")
+        sys.exit(1)
+
     # check for tournament mode
     if "--tournament" in sys.argv:
         print("Running FULL TOURNAMENT MODE")
         print("-"*10)
 
-        teams = generate_all_team_sequences(team_length=3)
+        teams = generate_all_team_sequences(*team_lengths)
 
-        output_file = run_tournament(teams, num_battles=1, chunk_size=10000)
+        if sample_opponents is not None:
+            output_file = run_sampled_tournament(teams, int(sample_opponents), num_battles=1, output_file=output,
+                                                 design=design, engine=engine, seed=seed, workers=workers,
+                                                 cache_size=cache_size, ci_width=ci_width, chunk_size=10000,
+                                                 telemetry=telemetry, telemetry_interval=telemetry_interval)
+        else:
+            output_file = run_tournament(teams, num_battles=1, output_file=output, chunk_size=10000, engine=engine,
+                                         seed=seed, workers=workers, cache_size=cache_size,
+                                         ci_width=ci_width, dedup=dedup, resume=resume,
+                                         result_store=result_store, grid_dir=grid_dir, write_csv=write_csv,
+                                         profile=profile, telemetry=telemetry,
+                                         telemetry_interval=telemetry_interval)
 
         print("tournament complete")
         print(f"results saved to: {output_file}")
@@ -36,7 +94,12 @@ if __name__ == "__main__":
         Team().add_pets("Fish", "Ant", "Ant"),
         Team().add_pets("Ant", "Fish", "Fish")]
 
-        output_file = run_tournament(teams, num_battles=10000, chunk_size=10000)
+        output_file = run_tournament(teams, num_battles=10000, output_file=output, chunk_size=10000, engine=engine,
+                                     seed=seed, workers=workers, cache_size=cache_size,
+                                     ci_width=ci_width, dedup=dedup, resume=resume,
+                                     result_store=result_store, grid_dir=grid_dir, write_csv=write_csv,
+                                     profile=profile, telemetry=telemetry,
+                                     telemetry_interval=telemetry_interval)
         print("tournament complete")
         print(f"results saved to: {output_file}")
 
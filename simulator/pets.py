@@ -128,6 +128,10 @@ PET_REGISTRY = {
 }
 
 
+# stable integer id per species, registry order
+SPECIES_IDS = {name: i for i, name in enumerate(PET_REGISTRY)}
+
+
 def create_pet(pet_name: str) -> Pet:
 
     name_lower = pet_name.lower()
@@ -135,7 +139,9 @@ def create_pet(pet_name: str) -> Pet:
         available = ", ".join(PET_REGISTRY.keys())
         raise ValueError(f"Unknown pet '{pet_name}'. Available: {available}")
 
-    return PET_REGISTRY[name_lower]()
+    pet = PET_REGISTRY[name_lower]()
+    pet.species_id = SPECIES_IDS[name_lower]
+    return pet
 
 # returns the registry str
 def list_available_pets() -> list[str]:
@@ -0,0 +1,199 @@
+import json
+import time
+from collections import Counter, defaultdict
+from functools import wraps
+from typing import Callable, Dict
+
+# opt-in instrumentation for BattleSimulator: time and calls per phase and per ability function,
+# plus histograms of turns and summons per battle
+#
+#   profile = BattleProfile()
+#   simulator = BattleSimulator(seed=1, profile=profile)
+#   simulator.k_battles(team1, team2, 1000)
+#   profile.dump("profile.json")
+#
+# attaching swaps timed wrappers in for the simulator's own methods on that one instance, so an
+# unprofiled simulator runs the plain class methods and pays nothing; each battle's state gets a
+# timed check_winner and timed abilities (one wrapper per ability function, made once)
+# times are inclusive: a faint phase includes the abilities it fires, a cricket the horse it wakes
+# with a transposition cache a battle stops after start of battle, so those battles are counted
+# as cache_resolved and left out of the turns and summons histograms
+# a wrapped ability is part of a board's cache key, so a process keeps one profile for every
+# simulator it runs (take() hands over the numbers), or equal boards would miss each other
+
+# simulator methods timed as phases
+PHASES = {
+    'new_state': 'new_state',                 # fresh state from the templates (the per-battle copy)
+    'start_battle': 'start_battle',
+    '_battle_turn': 'battle_turn',
+    '_execute_attack': 'execute_attack',
+    '_process_faints': 'process_faints',
+    '_resolve_from_cache': 'cache_lookup',
+}
+
+
+class BattleProfile:
+    def __init__(self):
+        self.battles = 0
+        self.battle_seconds = 0.0
+        self.phase_calls: Counter = Counter()
+        self.phase_seconds: Dict[str, float] = defaultdict(float)
+        self.ability_calls: Counter = Counter()
+        self.ability_seconds: Dict[str, float] = defaultdict(float)
+        self.turns: Counter = Counter()      # turns in a battle -> battles
+        self.summons: Counter = Counter()    # summoned tokens in a battle -> battles
+        self.cache_resolved = 0              # battles drawn from the cache, not played out
+        self._ability_wrappers: Dict[Callable, Callable] = {}
+
+    def __getstate__(self):
+        # wrappers are closures, a pickled profile (back from a worker) only carries the numbers
+        state = self.__dict__.copy()
+        state['_ability_wrappers'] = {}
+        return state
+
+    def _timed(self, name: str, function: Callable) -> Callable:
+        calls, seconds = self.phase_calls, self.phase_seconds
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds[name] += time.perf_counter() - start
+                calls[name] += 1
+        return timed
+
+    def _ability(self, function: Callable) -> Callable:
+        wrapper = self._ability_wrappers.get(function)
+        if wrapper is None:
+            name = getattr(function, '__name__', repr(function))
+            calls, seconds = self.ability_calls, self.ability_seconds
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    seconds[name] += time.perf_counter() - start
+                    calls[name] += 1
+            # a wrapped ability handed back in (a cloned state) isn't wrapped twice
+            self._ability_wrappers[function] = self._ability_wrappers[wrapper] = wrapper
+        return wrapper
+
+    def attach(self, simulator):
+        # instance attributes shadow the class methods, only on this simulator
+        for method, name in PHASES.items():
+            setattr(simulator, method, self._timed(name, getattr(simulator, method)))
+
+        trigger_phase = simulator._trigger_phase
+        timed_triggers = {}
+
+        def _trigger_phase(state, trigger_type):
+            # one phase per trigger type
+            timed = timed_triggers.get(trigger_type)
+            if timed is None:
+                timed = timed_triggers[trigger_type] = self._timed(f"trigger_phase:{trigger_type.value}",
+                                                                   trigger_phase)
+            return timed(state, trigger_type)
+        simulator._trigger_phase = _trigger_phase
+
+        new_state = simulator.new_state
+
+        def instrumented_state(*args, **kwargs):
+            state = new_state(*args, **kwargs)
+            state.check_winner = self._timed('check_winner', state.check_winner)
+            for team in (state.team1, state.team2):
+                for pet in team.pets:
+                    if pet is not None and pet.ability:
+                        pet.ability = self._ability(pet.ability)
+            return state
+        simulator.new_state = instrumented_state
+
+        simulate_battle = simulator.simulate_battle
+
+        def profiled_battle(*args, **kwargs):
+            start = time.perf_counter()
+            state = simulate_battle(*args, **kwargs)
+            self.battle_seconds += time.perf_counter() - start
+            self.battles += 1
+            if simulator.transposition_cache is not None:
+                self.cache_resolved += 1
+                return state
+            self.turns[state.turn_number] += 1
+            # summoned tokens have no species
+            self.summons[sum(1 for team in (state.team1, state.team2) for pet in team.pets
+                             if pet is not None and pet.species_id < 0)] += 1
+            return state
+        simulator.simulate_battle = profiled_battle
+
+    def merge(self, other: 'BattleProfile') -> 'BattleProfile':
+        # add another profile's numbers (another worker, another block) into this one
+        self.battles += other.battles
+        self.battle_seconds += other.battle_seconds
+        self.cache_resolved += other.cache_resolved
+        self.phase_calls.update(other.phase_calls)
+        self.ability_calls.update(other.ability_calls)
+        self.turns.update(other.turns)
+        self.summons.update(other.summons)
+        for name, seconds in other.phase_seconds.items():
+            self.phase_seconds[name] += seconds
+        for name, seconds in other.ability_seconds.items():
+            self.ability_seconds[name] += seconds
+        return self
+
+    def take(self) -> 'BattleProfile':
+        # the numbers so far as a new profile, this one starts again from zero and keeps its
+        # wrappers (the timers hold on to these very counters, so they are cleared in place)
+        taken = BattleProfile().merge(self)
+        self.battles = self.cache_resolved = 0
+        self.battle_seconds = 0.0
+        for counter in (self.phase_calls, self.phase_seconds, self.ability_calls, self.ability_seconds,
+                        self.turns, self.summons):
+            counter.clear()
+        return taken
+
+    def to_dict(self) -> Dict:
+        def timings(calls, seconds):
+            return {name: {'calls': calls[name], 'seconds': seconds[name],
+                           'mean_us': 1e6 * seconds[name] / max(calls[name], 1)}
+                    for name in sorted(calls, key=lambda name: -seconds[name])}
+
+        def histogram(counter):
+            return {str(value): counter[value] for value in sorted(counter)}
+
+        def mean(counter):
+            return sum(value * count for value, count in counter.items()) / max(sum(counter.values()), 1)
+
+        return {
+            'battles': self.battles,
+            'battle_seconds': self.battle_seconds,
+            'battles_per_sec': self.battles / self.battle_seconds if self.battle_seconds else 0.0,
+            'cache_resolved': self.cache_resolved,
+            'phases': timings(self.phase_calls, self.phase_seconds),
+            'abilities': timings(self.ability_calls, self.ability_seconds),
+            'turns_per_battle': histogram(self.turns),
+            'mean_turns': mean(self.turns),
+            'summons_per_battle': histogram(self.summons),
+            'mean_summons': mean(self.summons),
+        }
+
+    def dump(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def summary(self) -> str:
+        report = self.to_dict()
+        lines = [f"{report['battles']:,} battles in {report['battle_seconds']:.2f}s "
+                 f"({report['battles_per_sec']:,.0f}/s), {report['mean_turns']:.2f} turns and "
+                 f"{report['mean_summons']:.2f} summons per played out battle"]
+        if report['cache_resolved']:
+            lines.append(f"  {report['cache_resolved']:,} battles resolved by the transposition cache "
+                         f"after start of battle, not in the turns and summons")
+        for section in ('phases', 'abilities'):
+            for name, timing in report[section].items():
+                share = 100 * timing['seconds'] / max(report['battle_seconds'], 1e-12)
+                lines.append(f"  {name:32} {timing['calls']:>12,} calls {timing['seconds']:9.3f}s "
+                             f"{timing['mean_us']:8.2f}us {share:5.1f}%")
+        return "\n".join(lines)
@@ -0,0 +1,111 @@
+import hashlib
+import inspect
+import json
+import sqlite3
+from functools import lru_cache
+from typing import Dict, Iterable, Sequence, Tuple
+
+# content-addressed matchup results on disk
+# a cell is keyed by what actually decides it: both team definitions (stats, triggers
+# and the source of every ability), the engine version and the run settings, so a
+# registry change only invalidates the cells whose teams changed
+
+# bump whenever battle rules change outcomes, in either engine
+ENGINE_VERSION = 1
+
+# bump whenever the adaptive stopping rule changes, only cells run with a ci_width depend on it
+STOPPING_VERSION = 2
+
+KEY_BYTES = 16
+
+
+@lru_cache(maxsize=None)
+def ability_digest(ability) -> bytes:
+    # source of the ability and of the module-level helpers it calls
+    if ability is None:
+        return b""
+    h = hashlib.blake2b(digest_size=KEY_BYTES)
+    h.update(inspect.getsource(ability).encode())
+    for name in sorted(ability.__code__.co_names):
+        helper = ability.__globals__.get(name)
+        if inspect.isfunction(helper) and helper is not ability:
+            h.update(inspect.getsource(helper).encode())
+    return h.digest()
+
+
+def team_digest(template) -> bytes:
+    # slot by slot, names don't matter, stats, triggers and abilities do
+    h = hashlib.blake2b(digest_size=KEY_BYTES)
+    for i in range(len(template.names)):
+        if i not in template.occupied:
+            h.update(b"-|")
+            continue
+        trigger = template.trigger[i].value if template.trigger[i] is not None else ""
+        h.update(f"{template.attack[i]},{template.health[i]},{template.level[i]},{template.fainted[i]},{trigger},".encode())
+        h.update(ability_digest(template.ability[i]))
+        h.update(b"|")
+    return h.digest()
+
+
+def stream_id(digest: bytes) -> int:
+    # stable team id for the random streams, non-negative int64
+    return int.from_bytes(digest[:8], 'little') >> 2
+
+
+def settings_digest(**settings) -> bytes:
+    settings['engine_version'] = ENGINE_VERSION
+    if settings.get('ci_width') is not None:
+        settings['stopping_version'] = STOPPING_VERSION
+    return hashlib.blake2b(json.dumps(settings, sort_keys=True).encode(), digest_size=KEY_BYTES).digest()
+
+
+def cell_key(team1: bytes, team2: bytes, settings: bytes) -> bytes:
+    return hashlib.blake2b(team1 + team2 + settings, digest_size=KEY_BYTES).digest()
+
+
+class ResultStore:
+    # sqlite file of cell key -> result entry (the tuple a tournament row holds per opponent)
+    # columns are untyped, so integer counts stay ints and exact expectations stay floats
+    BATCH = 500  # keys per query, below sqlite's bound-parameter limit
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        # WAL: a crash loses at most the uncommitted tail, and commits don't fsync the whole file
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA cache_size=-262144")  # 256 MiB of pages, keys are random
+        self.conn.execute("CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, w1, w2, d, total, ci) "
+                          "WITHOUT ROWID")
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _select(self, columns: str, keys: Sequence[bytes]):
+        for k in range(0, len(keys), self.BATCH):
+            chunk = keys[k:k + self.BATCH]
+            marks = ",".join("?" * len(chunk))
+            yield from self.conn.execute(f"SELECT {columns} FROM results WHERE key IN ({marks})", chunk)
+
+    def contains_many(self, keys: Sequence[bytes]) -> set:
+        return {bytes(key) for (key,) in self._select("key", keys)}
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, Tuple]:
+        found = {}
+        for key, w1, w2, d, total, ci in self._select("key, w1, w2, d, total, ci", keys):
+            found[bytes(key)] = (w1, w2, d) if total is None else (w1, w2, d, total, ci)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[bytes, Sequence]]):
+        # buffered until commit()
+        rows = ((key, *entry[:3], *(entry[3:5] if len(entry) > 3 else (None, None))) for key, entry in items)
+        self.conn.executemany("INSERT OR REPLACE INTO results (key, w1, w2, d, total, ci) VALUES (?, ?, ?, ?, ?, ?)",
+                              rows)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,79 @@
+import numpy as np
+from typing import Any, Sequence
+
+# counter-based random streams: every draw is a pure function of
+# (seed, team1_id, team2_id, battle index, draw index), so any battle of any
+# matchup can be regenerated on its own, in any process, in any order
+# the numpy versions below produce the same numbers lane by lane for the batch engine
+
+MASK64 = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+
+# team ids used for battles that aren't tied to a tournament cell
+NO_MATCHUP = (-1, -1)
+
+
+def _mix(z: int) -> int:
+    # splitmix64 finalizer
+    z = (z + GOLDEN) & MASK64
+    z = ((z ^ (z >> 30)) * MIX1) & MASK64
+    z = ((z ^ (z >> 27)) * MIX2) & MASK64
+    return z ^ (z >> 31)
+
+
+def stream_key(seed: int, team1_id: int, team2_id: int) -> int:
+    # 64-bit key of one matchup's stream
+    return _mix(_mix(_mix(seed & MASK64) ^ (team1_id & MASK64)) ^ (team2_id & MASK64))
+
+
+def draw(key: int, battle: int, counter: int) -> int:
+    # the counter-th 64-bit draw of one battle
+    return _mix(_mix(key ^ (battle & MASK64)) ^ counter)
+
+
+class CounterRNG:
+    # one battle's stream, quacks like the parts of random.Random the abilities use
+    def __init__(self, key: int, battle: int = 0):
+        self.key = key
+        self.battle = battle
+        self.draws = 0
+
+    def _next(self) -> int:
+        value = draw(self.key, self.battle, self.draws)
+        self.draws += 1
+        return value
+
+    def randbelow(self, n: int) -> int:
+        # top 53 bits scaled to [0, n), matches randbelow_array exactly
+        return ((self._next() >> 11) * n) >> 53
+
+    def choice(self, seq: Sequence[Any]) -> Any:
+        return seq[self.randbelow(len(seq))]
+
+    def random(self) -> float:
+        return (self._next() >> 11) * (1.0 / (1 << 53))
+
+
+# numpy versions, one lane per battle
+
+def _mix_array(z: np.ndarray) -> np.ndarray:
+    z = z + np.uint64(GOLDEN)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(MIX2)
+    return z ^ (z >> np.uint64(31))
+
+
+def stream_keys(seed: int, team1_ids: np.ndarray, team2_ids: np.ndarray) -> np.ndarray:
+    base = np.uint64(_mix(seed & MASK64))
+    ids1 = np.asarray(team1_ids, dtype=np.int64).astype(np.uint64)
+    ids2 = np.asarray(team2_ids, dtype=np.int64).astype(np.uint64)
+    return _mix_array(_mix_array(base ^ ids1) ^ ids2)
+
+
+def randbelow_array(keys: np.ndarray, battles: np.ndarray, counters: np.ndarray, n: np.ndarray) -> np.ndarray:
+    # per-lane CounterRNG.randbelow, n must stay below 2**11
+    battles = np.asarray(battles, dtype=np.int64).astype(np.uint64)
+    values = _mix_array(_mix_array(keys ^ battles) ^ counters.astype(np.uint64))
+    return (((values >> np.uint64(11)) * np.asarray(n, dtype=np.uint64)) >> np.uint64(53)).astype(np.int64)
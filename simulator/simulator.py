@@ -1,38 +1,104 @@
 
-from typing import Optional, List, Tuple, Dict
+from typing import Optional, List, Tuple, Dict, Union
 from collections import defaultdict
-from core import GameState, Team, Phase, TriggerType, Pet
+import math
+from core import GameState, Team, TeamTemplate, Phase, TriggerType, Pet, RandomnessHandler, RandomChoice
+from rng import CounterRNG, NO_MATCHUP, stream_key
+
+# an exact outcome probability this close to 1 counts as certain
+DECIDED_TOLERANCE = 1e-12
 
 # after progress report, decided against game tree exploration, removed it
 class BattleSimulator:
-    def __init__(self, deterministic: bool = False, seed: Optional[int] = None):
+    def __init__(self, deterministic: bool = False, seed: Optional[int] = None, transposition_cache=None,
+                 profile=None):
         self.deterministic = deterministic
-        self.seed = seed
-        if seed is not None:
+        # the simulator owns its streams, the global random module is never touched
+        if seed is None:
             import random
-            random.seed(seed)
+            seed = random.SystemRandom().randrange(2**32)
+        self.seed = seed
+        # battles that aren't tied to a matchup count up on their own stream
+        self.battle_count = 0
+        self._free_key = stream_key(seed, *NO_MATCHUP)
+        # with a cache, battles stop after start of battle and draw the winner
+        # from the exact distribution of that board, which is solved once and shared
+        self.transposition_cache = transposition_cache
+        self._solver = None
+        # a profiling.BattleProfile records time per phase and ability, turns and summons;
+        # it wraps this instance's methods, so without one nothing changes
+        self.profile = profile
+        if profile is not None:
+            profile.attach(self)
+
+    def matchup_rng(self, team1_id: int, team2_id: int, battle: int) -> CounterRNG:
+        # stream for one battle of one tournament cell
+        return CounterRNG(stream_key(self.seed, team1_id, team2_id), battle)
+
+    def _next_free_rng(self) -> CounterRNG:
+        rng = CounterRNG(self._free_key, self.battle_count)
+        self.battle_count += 1
+        return rng
+
+    def new_state(self, team1: Union[Team, TeamTemplate], team2: Union[Team, TeamTemplate], rng=None) -> GameState:
+        # fresh battle, teams are never mutated
+        if isinstance(team1, Team):
+            team1 = team1.template()
+        if isinstance(team2, Team):
+            team2 = team2.template()
+        state = GameState.from_templates(team1, team2)
+        state.randomness = RandomnessHandler(rng if rng is not None else self._next_free_rng())
+        return state
 
-    def simulate_battle(self, team1: Team, team2: Team) -> GameState:
-        # run a battle
-        state = GameState(team1=team1.copy(), team2=team2.copy())
+    def simulate_battle(self, team1: Union[Team, TeamTemplate], team2: Union[Team, TeamTemplate], rng=None) -> GameState:
+        # run a battle, state.randomness.draws is how many random numbers it used
+        state = self.new_state(team1, team2, rng)
 
-        # start of battle triggers
-        self._trigger_phase(state, TriggerType.START_OF_BATTLE)
+        self.start_battle(state)
 
-        self._process_faints(state)
+        if self.transposition_cache is not None:
+            self._resolve_from_cache(state)
+            return state
 
         # main battle loop
         while not state.is_terminal:
-            self._battle_turn(state)
-
-            # check for winner
-            winner = state.check_winner()
-            if winner is not None:
-                state.winner = winner
-                state.is_terminal = True
+            self.advance(state)
 
         return state
 
+    def _resolve_from_cache(self, state: GameState):
+        # the returned state carries the winner, not the final board
+        key = state.canonical_key()
+        outcome = self.transposition_cache.get(key)
+        if outcome is None:
+            if self._solver is None:
+                from exact_solver import ExactSolver
+                self._solver = ExactSolver(simulator=BattleSimulator(seed=0), cache=self.transposition_cache)
+            outcome = self._solver.solve_state(state.clone())
+        # decided board, no draw needed; probabilities summed over many branches can fall a
+        # rounding error short of 1, and a draw there would shift the battle's stream
+        decided = max(outcome)
+        if decided >= 1.0 - DECIDED_TOLERANCE:
+            state.winner = (1, 2, 0)[outcome.index(decided)]
+        else:
+            state.winner = state.randomness.choose_random(RandomChoice("cached outcome", [1, 2, 0], list(outcome)))
+        state.is_terminal = True
+
+    def start_battle(self, state: GameState):
+        # start of battle triggers
+        self._trigger_phase(state, TriggerType.START_OF_BATTLE)
+
+        self._process_faints(state)
+
+    def advance(self, state: GameState):
+        # one turn, then check for winner
+        self._battle_turn(state)
+
+        winner = state.check_winner()
+        if winner is not None:
+            state.winner = winner
+            state.is_terminal = True
+
     def _battle_turn(self, state: GameState):
         # single turn
         state.turn_number += 1
@@ -75,15 +141,11 @@ class BattleSimulator:
         fainted_pets = []
 
         # check ALL pets (not just alive ones) to find newly fainted pets
-        for pet in [p for p in state.team1.pets if p]:
-            if pet.health <= 0 and not pet.is_fainted:
-                pet.is_fainted = True
-                fainted_pets.append((pet, state.team1))
-
-        for pet in [p for p in state.team2.pets if p]:
-            if pet.health <= 0 and not pet.is_fainted:
-                pet.is_fainted = True
-                fainted_pets.append((pet, state.team2))
+        for team in (state.team1, state.team2):
+            for pet in team.pets:
+                if pet and pet.health <= 0 and not pet.is_fainted:
+                    team.faint(pet)
+                    fainted_pets.append((pet, team))
 
         # trigger faint abilities
         for pet, team in fainted_pets:
@@ -91,11 +153,14 @@ class BattleSimulator:
                 pet.ability(state, pet, team)
 
     def _trigger_phase(self, state: GameState, trigger_type: TriggerType):
-        # collect all pets with this trigger from both teams
-        team1_pets = [(pet, state.team1) for pet in state.team1.get_alive_pets()
-                      if pet.trigger_type == trigger_type and pet.ability]
-        team2_pets = [(pet, state.team2) for pet in state.team2.get_alive_pets()
-                      if pet.trigger_type == trigger_type and pet.ability]
+        # subscribers of this trigger from both teams, nothing to do if neither has any
+        team1_listeners = state.team1.subscribers(trigger_type)
+        team2_listeners = state.team2.subscribers(trigger_type)
+        if not team1_listeners and not team2_listeners:
+            return
+        # snapshot, abilities may faint or summon while the phase runs
+        team1_pets = [(pet, state.team1) for pet in team1_listeners]
+        team2_pets = [(pet, state.team2) for pet in team2_listeners]
 
         # interleave triggers by position to ensure fairness
         # process position 0 from both teams, then position 1 from both teams, etc.
@@ -119,13 +184,22 @@ class BattleSimulator:
             return
 
         # check all pets behind the attacker
-        for pet in team.get_alive_pets():
+        for pet in list(team.subscribers(TriggerType.FRIEND_AHEAD_ATTACKS)):
             if pet.position is not None and pet.position > attacker.position:
-                if pet.trigger_type == TriggerType.FRIEND_AHEAD_ATTACKS and pet.ability:
-                    pet.ability(state, pet, team)
+                pet.ability(state, pet, team)
 
     # does k battles
-    def k_battles(self, team1: Team, team2: Team, num_simulations: int = 1000) -> Dict:
+    def k_battles(self, team1: Union[Team, TeamTemplate], team2: Union[Team, TeamTemplate], num_simulations: int = 1000,
+                  ci_width: Optional[float] = None, min_simulations: int = 30, z: float = 1.96,
+                  matchup: Optional[Tuple[int, int]] = None) -> Dict:
+        # ci_width turns on adaptive stopping: num_simulations becomes a cap, and sampling stops once
+        # every outcome rate's Wilson interval is narrower than ci_width (rates as fractions)
+        # the width is only checked at min_simulations, then at every doubling and at the cap, and
+        # z is Bonferroni-corrected for those checks, so the reported interval keeps its coverage
+        # whichever check stops it (checking after every battle would stop early on lucky runs)
+        # a first battle that draws no random numbers is deterministic, so it stops at one
+        # matchup=(team1_id, team2_id) pins battle b to stream (seed, team1_id, team2_id, b),
+        # so the result is reproducible on its own, otherwise battles use the simulator's running stream
 
         stats = defaultdict(int)
         stats['total_simulations'] = num_simulations
@@ -133,8 +207,25 @@ class BattleSimulator:
         stats['team2_wins'] = 0
         stats['draws'] = 0
 
-        for _ in range(num_simulations):
-            result = self.simulate_battle(team1, team2)
+        # snapshot once, every battle resets from the same templates
+        if isinstance(team1, Team):
+            team1 = team1.template()
+        if isinstance(team2, Team):
+            team2 = team2.template()
+
+        matchup_key = stream_key(self.seed, *matchup) if matchup is not None else None
+        random_draws = 0
+        completed = 0
+        half_width = None
+        if ci_width is not None:
+            checks = check_schedule(min_simulations, num_simulations)
+            next_check = 0
+            z = corrected_z(z, len(checks))
+        for battle in range(num_simulations):
+            rng = CounterRNG(matchup_key, battle) if matchup_key is not None else None
+            result = self.simulate_battle(team1, team2, rng)
+            random_draws += result.randomness.draws
+            completed += 1
 
             if result.winner == 1:
                 stats['team1_wins'] += 1
@@ -144,9 +235,52 @@ class BattleSimulator:
                 stats['draws'] += 1
             else:
                 raise Exception("battle result not in {0,1,2}")
-        
-        stats['team1_win_rate'] = (stats['team1_wins'] / num_simulations) * 100
-        stats['team2_win_rate'] = (stats['team2_wins'] / num_simulations) * 100
-        stats['draw_rate'] = (stats['draws'] / num_simulations) * 100
 
-        return dict(stats)
\ No newline at end of file
+            if ci_width is None:
+                continue
+            if completed == 1 and random_draws == 0:
+                half_width = 0.0
+                break
+            if completed == checks[next_check]:
+                next_check += 1
+                half_width = max(wilson_half_width(stats[k], completed, z) for k in ('team1_wins', 'team2_wins', 'draws'))
+                if 2 * half_width <= ci_width:
+                    break
+
+        stats['total_simulations'] = completed
+        stats['team1_win_rate'] = (stats['team1_wins'] / completed) * 100
+        stats['team2_win_rate'] = (stats['team2_wins'] / completed) * 100
+        stats['draw_rate'] = (stats['draws'] / completed) * 100
+        stats['random_draws'] = random_draws
+        if ci_width is not None:
+            if half_width is None:
+                half_width = max(wilson_half_width(stats[k], completed, z) for k in ('team1_wins', 'team2_wins', 'draws'))
+            stats['ci_half_width'] = half_width
+
+        return dict(stats)
+
+
+def check_schedule(min_simulations: int, num_simulations: int) -> List[int]:
+    # battle counts at which adaptive stopping looks at the interval: min_simulations, doubling, then the cap
+    checks = []
+    n = max(min_simulations, 1)
+    while n < num_simulations:
+        checks.append(n)
+        n *= 2
+    checks.append(num_simulations)
+    return checks
+
+
+def corrected_z(z: float, checks: int) -> float:
+    # z for the same two-sided confidence level split evenly over the checks (Bonferroni)
+    from statistics import NormalDist
+    alpha = 2 * (1 - NormalDist().cdf(z))
+    return NormalDist().inv_cdf(1 - alpha / (2 * checks))
+
+
+def wilson_half_width(successes: int, n: int, z: float = 1.96) -> float:
+    # half width of the Wilson score interval for a binomial rate
+    if n == 0:
+        return 0.5
+    p = successes / n
+    return z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
@@ -0,0 +1,256 @@
+import json
+import os
+from collections.abc import Sequence as SequenceABC
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# teams as integers: a team of L pets is the base-R number of its species ids
+# (R = registry size, front pet most significant), shifted past every shorter team
+# so all lengths share one range, and length-L codes come out in product order
+# the analysis tools decode these with a species table instead of parsing names
+
+
+def registry_species() -> List[str]:
+    # display names in registry order, index = species id
+    from pets import PET_REGISTRY
+    return [create().name for create in PET_REGISTRY.values()]
+
+
+def species_id(name: str) -> int:
+    # registry index of a pet name, any case
+    from pets import PET_REGISTRY, SPECIES_IDS
+    s = SPECIES_IDS.get(name.lower())
+    if s is None:
+        raise ValueError(f"Unknown pet '{name}'. Available: {', '.join(PET_REGISTRY)}")
+    return s
+
+
+def pet_from_species(s: int):
+    # a fresh pet of species id s
+    from pets import PET_REGISTRY
+    pet = list(PET_REGISTRY.values())[s]()
+    pet.species_id = s
+    return pet
+
+
+def length_offset(length: int, registry_size: int) -> int:
+    # first code of a team with `length` pets, 1 + R + ... + R^(length-1)
+    if registry_size == 1:
+        return length
+    return (registry_size ** length - 1) // (registry_size - 1)
+
+
+def encode(species_ids: Sequence[int], registry_size: int) -> int:
+    code = 0
+    for s in species_ids:
+        if not 0 <= s < registry_size:
+            raise ValueError(f"species id {s} outside registry of {registry_size}")
+        code = code * registry_size + s
+    return length_offset(len(species_ids), registry_size) + code
+
+
+def decode(code: int, registry_size: int) -> Tuple[int, ...]:
+    # species ids front to back
+    length = 0
+    while code >= length_offset(length + 1, registry_size):
+        length += 1
+    code -= length_offset(length, registry_size)
+    digits = []
+    for _ in range(length):
+        code, s = divmod(code, registry_size)
+        digits.append(s)
+    return tuple(reversed(digits))
+
+
+def codes_of_length(length: int, registry_size: int) -> range:
+    # every team of `length` pets, product order
+    start = length_offset(length, registry_size)
+    return range(start, start + registry_size ** length)
+
+
+def team_code(team, registry_size: Optional[int] = None) -> int:
+    # living pets front to back, summoned tokens have no species and can't be encoded
+    if registry_size is None:
+        from pets import PET_REGISTRY
+        registry_size = len(PET_REGISTRY)
+    species = [p.species_id for p in team.pets if p and not p.is_fainted]
+    if any(s < 0 for s in species):
+        raise ValueError(f"{team} has pets outside the registry")
+    return encode(species, registry_size)
+
+
+def team_from_code(code: int):
+    from core import Team
+    from pets import PET_REGISTRY
+    team = Team()
+    for slot, s in enumerate(decode(code, len(PET_REGISTRY))):
+        pet = pet_from_species(s)
+        pet.position = slot
+        team.pets[slot] = pet
+    return team
+
+
+def template_from_code(code: int, registry_size: Optional[int] = None):
+    # the TeamTemplate of team_from_code(code).template(), assembled from per-species
+    # prototypes without creating any Pet or Team
+    from core import TeamTemplate
+    prototypes = _prototypes()
+    ids = decode(code, registry_size or len(prototypes))
+    slots = 5
+    empty = (None, 0, 0, None, None, 0, 0)
+    columns = [prototypes[s] for s in ids] + [empty] * (slots - len(ids))
+    names, attack, health, trigger, ability, level, experience = zip(*columns)
+    occupied = tuple(range(len(ids)))
+    return TeamTemplate(
+        names=names, attack=attack, health=health,
+        species=tuple(ids) + (-1,) * (slots - len(ids)),
+        trigger=trigger, ability=ability,
+        position=occupied + (None,) * (slots - len(ids)),
+        level=level, experience=experience,
+        fainted=(False,) * slots,
+        occupied=occupied,
+        max_size=slots,
+    )
+
+
+_PROTOTYPES = []
+
+
+def _prototypes() -> List[Tuple]:
+    # (name, attack, health, trigger, ability, level, experience) per species id
+    if not _PROTOTYPES:
+        from pets import PET_REGISTRY
+        for create in PET_REGISTRY.values():
+            pet = create()
+            _PROTOTYPES.append((pet.name, pet.attack, pet.health, pet.trigger_type, pet.ability, pet.level,
+                                pet.experience))
+    return _PROTOTYPES
+
+
+class TeamSpace(SequenceABC):
+    # every team of min_length..max_length pets, by team id (code order), nothing built up front
+    # teams and templates are made on access, so a 59k (or mixed 1..5 pet, 66k) team space
+    # costs a range object; tournaments take one wherever they take a list of teams
+    def __init__(self, min_length: int = 1, max_length: Optional[int] = None, registry_size: Optional[int] = None,
+                 codes: Optional[range] = None):
+        if registry_size is None:
+            from pets import PET_REGISTRY
+            registry_size = len(PET_REGISTRY)
+        self.registry_size = registry_size
+        if codes is None:
+            max_length = min_length if max_length is None else max_length
+            if not 1 <= min_length <= max_length:
+                raise ValueError(f"team lengths must satisfy 1 <= min_length <= max_length, got {min_length}..{max_length}")
+            # lengths are contiguous code ranges, so any span of lengths is one range
+            codes = range(length_offset(min_length, registry_size), length_offset(max_length + 1, registry_size))
+        self.codes = codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        # a Team, or a TeamSpace over a slice of the codes
+        if isinstance(index, slice):
+            return TeamSpace(registry_size=self.registry_size, codes=self.codes[index])
+        return team_from_code(self.codes[index])
+
+    def __iter__(self):
+        for code in self.codes:
+            yield team_from_code(code)
+
+    def __repr__(self) -> str:
+        return f"TeamSpace({len(self):,} teams, codes {self.codes.start}..{self.codes.stop - 1})"
+
+    def code(self, index: int) -> int:
+        return self.codes[index]
+
+    def index(self, code: int) -> int:
+        return self.codes.index(code)
+
+    def template(self, index: int):
+        return template_from_code(self.codes[index], self.registry_size)
+
+    def templates(self, cache_size: Optional[int] = None) -> 'LazyTemplates':
+        return LazyTemplates(self, TEMPLATE_CACHE if cache_size is None else cache_size)
+
+    def composition(self, index: int, species: Sequence[str]) -> str:
+        return composition(self.codes[index], species)
+
+    def blocks(self, size: int):
+        # (first team id, templates) for consecutive runs of `size` teams
+        for start in range(0, len(self), size):
+            yield start, [self.template(i) for i in range(start, min(len(self), start + size))]
+
+
+# templates a LazyTemplates keeps, about 3 KB each
+TEMPLATE_CACHE = 1 << 15
+
+
+class LazyTemplates(SequenceABC):
+    # templates of a TeamSpace by team id, for the tournament workers
+    # the first cache_size built are kept and the rest are rebuilt on use: tournaments sweep
+    # the teams in order over and over, which a least-recently-used cache would thrash on
+    def __init__(self, space: TeamSpace, cache_size: int = TEMPLATE_CACHE):
+        self.space = space
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def __getstate__(self):
+        # workers start with an empty cache
+        return {'space': self.space, 'cache_size': self.cache_size, '_cache': {}}
+
+    def __len__(self) -> int:
+        return len(self.space)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        template = self._cache.get(index)
+        if template is None:
+            template = self.space.template(index)
+            if len(self._cache) < self.cache_size:
+                self._cache[index] = template
+        return template
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def composition(code: int, species: Sequence[str]) -> str:
+    # "Ant, Ant, Cricket", same format the CSV has always used for compositions
+    return ", ".join(species[s] for s in decode(code, len(species)))
+
+
+# species table written next to each results file, so codes still decode after the registry changes
+
+def species_path(csv_path: str) -> str:
+    return f"{csv_path}.species.json"
+
+
+def write_species(csv_path: str, species: Optional[List[str]] = None):
+    with open(species_path(csv_path), 'w') as f:
+        json.dump({'species': species if species is not None else registry_species()}, f)
+
+
+def load_species(csv_path: str) -> List[str]:
+    # the results file's own table, or the current registry if there is none
+    path = species_path(csv_path)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)['species']
+    return registry_species()
+
+
+def team_compositions(df, csv_path: str) -> Dict[int, str]:
+    # Team_ID -> composition for a results dataframe, one entry per team
+    if 'Team1_Code' in df.columns:
+        species = load_species(csv_path)
+        pairs = dict(zip(df['Team1_ID'], df['Team1_Code']))
+        pairs.update(zip(df['Team2_ID'], df['Team2_Code']))
+        return {int(team_id): composition(int(code), species) for team_id, code in pairs.items()}
+    # older files only have the strings
+    names = dict(zip(df['Team1_ID'], df['Team1_Composition']))
+    names.update(zip(df['Team2_ID'], df['Team2_Composition']))
+    return {int(team_id): name for team_id, name in names.items()}
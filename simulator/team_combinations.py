@@ -1,78 +1,723 @@
 
-from itertools import product
 import csv
+import multiprocessing
+import os
+import random
+import time
 from datetime import datetime
+from typing import Sequence
 from core import Team
 from pets import list_available_pets
 from simulator import BattleSimulator
+from checkpoint import config_hash, load_checkpoint, validate_resume, write_checkpoint
+from team_codes import TeamSpace, composition, registry_species, team_code, write_species
 
-def generate_all_team_sequences(team_length: int = 1) -> list[Team]:
-    # team sequences
-    available_pets = list_available_pets()
-    all_sequences = list(product(available_pets, repeat=team_length))
+# lanes per batch engine call, enough to amortize numpy overhead
+BATCH_LANES = 1 << 16
+# matchups per work block for the object engine
+OBJECT_BLOCK_MATCHUPS = 4096
+# new result store entries per sqlite commit
+STORE_COMMIT_MATCHUPS = 1 << 16
 
-    teams = []
-    for sequence in all_sequences:
-        team = Team()
-        team.add_pets(*sequence)
-        teams.append(team)
+def generate_all_team_sequences(team_length: int = 1, max_length: int = None) -> TeamSpace:
+    # every team of team_length (up to max_length) pets in team code order, product order over
+    # the registry within a length; lazy, teams are built on access (see TeamSpace)
+    return TeamSpace(team_length, max_length, len(list_available_pets()))
 
-    return teams
 
+def _templates(teams):
+    # templates by team id, built on demand for a TeamSpace
+    if isinstance(teams, TeamSpace):
+        return teams.templates()
+    return [team.template() for team in teams]
 
-def run_tournament(teams: list[Team], num_battles: int = 10, output_file: str = None, chunk_size: int = 1000) -> str:
-    simulator = BattleSimulator()
+
+def _codes(teams, registry_size: int):
+    if isinstance(teams, TeamSpace):
+        return teams.codes
+    return [team_code(team, registry_size) for team in teams]
+
+
+def _team_cost(template) -> int:
+    # rough work estimate: every pet costs a turn, abilities add draws and summons
+    return len(template.occupied) + sum(1 for i in template.occupied if template.ability[i] is not None)
+
+
+def plan_blocks(templates, num_battles: int, engine: str, triangle: bool = False,
+                columns: list = None) -> list[tuple[int, int]]:
+    # contiguous row ranges of roughly equal estimated cost
+    # every matchup draws from its own (seed, team1_id, team2_id, battle) stream,
+    # so blocks only decide who does the work, never the results
+    # triangle: row i only plays columns j >= i, columns: row i only plays columns[i]
+    n = len(templates)
+    if n == 0:
+        return []
+    costs = [_team_cost(t) for t in templates]
+    if columns is not None:
+        row_costs = [num_battles * (len(cols) * costs[i] + sum(costs[j] for j in cols))
+                     for i, cols in enumerate(columns)]
+    elif triangle:
+        # suffix sums, row i pays for columns i..n-1
+        suffix = [0] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            suffix[i] = suffix[i + 1] + costs[i]
+        row_costs = [num_battles * ((n - i) * c + suffix[i]) for i, c in enumerate(costs)]
+    else:
+        total = sum(costs)
+        row_costs = [num_battles * (n * c + total) for c in costs]
+
+    if engine == "batch":
+        rows_per_block = max(1, BATCH_LANES // max(1, n * num_battles))
+    else:
+        rows_per_block = max(1, OBJECT_BLOCK_MATCHUPS // n)
+    # sized for full rows, so sparse rows pack more of themselves into a block
+    budget = max(1, 2 * num_battles * sum(costs) * rows_per_block)
+
+    blocks = []
+    start, acc = 0, 0
+    for i, cost in enumerate(row_costs):
+        acc += cost
+        if acc >= budget:
+            blocks.append((start, i + 1))
+            start, acc = i + 1, 0
+    if start < n:
+        blocks.append((start, n))
+    return blocks
+
+
+# per-process state, set once by _init_worker
+_WORKER = {}
+
+def _init_worker(templates, options: dict):
+    # options: num_battles, engine, seed, cache_size, ci_width, profile,
+    # ids (tournament team id of each template, used for the streams), triangle, columns
+    _WORKER.clear()
+    _WORKER.update(options)
+    _WORKER['templates'] = templates
+    # one transposition cache per process, shared by every block it runs
+    if options.get('cache_size'):
+        from transposition import TranspositionCache
+        _WORKER['cache'] = TranspositionCache(options['cache_size'])
+    if options['engine'] == "batch":
+        from batch_engine import EncodedTeams
+        _WORKER['encoded'] = EncodedTeams(templates)
+    # and one profile, its ability wrappers go into the cache keys
+    if options.get('profile'):
+        from profiling import BattleProfile
+        _WORKER['profiler'] = BattleProfile()
+
+
+def _row_columns(i: int, n: int):
+    # opponents of row i in this run
+    columns = _WORKER.get('columns')
+    if columns is not None:
+        return columns[i]
+    return range(i, n) if _WORKER.get('triangle', False) else range(n)
+
+
+def _run_block(block: tuple[int, int]) -> tuple[int, list, dict]:
+    # wins/losses/draws for every matchup of rows [start, stop), plus the block's stats:
+    # cache hits/misses, its BattleProfile when profiling, and battles, matchups, worker pid
+    # and seconds for telemetry
+    began = time.perf_counter()
+    start, stop = block
+    templates = _WORKER['templates']
+    num_battles = _WORKER['num_battles']
+    seed = _WORKER['seed']
+    ids = _WORKER.get('ids') or range(len(templates))
+    n = len(templates)
+
+    if _WORKER['engine'] == "batch":
+        import numpy as np
+        from batch_engine import BatchBattleEngine
+
+        rows = np.arange(start, stop)
+        cols = [np.asarray(_row_columns(i, n), dtype=np.int64) for i in rows]
+        lengths = np.array([len(c) for c in cols], dtype=np.int64)
+        idx1 = np.repeat(rows, lengths)
+        idx2 = np.concatenate(cols)
+        ids = np.asarray(ids)
+        counts = BatchBattleEngine(seed=seed).run_matchups(_WORKER['encoded'], idx1, idx2, num_battles,
+                                                           ids[idx1], ids[idx2])
+        bounds = np.concatenate([[0], np.cumsum(lengths)])
+        stats = dict(hits=0, misses=0, profile=None, battles=len(idx1) * num_battles, matchups=len(idx1),
+                     worker=os.getpid(), seconds=time.perf_counter() - began)
+        return start, [counts[bounds[k]:bounds[k + 1]].tolist() for k in range(len(rows))], stats
+
+    cache = _WORKER.get('cache')
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    profile = _WORKER.get('profiler')
+    if _WORKER['engine'] == "exact":
+        from exact_solver import ExactSolver
+        simulator = ExactSolver(cache=cache)
+    else:
+        simulator = BattleSimulator(seed=seed, transposition_cache=cache, profile=profile)
+    ci_width = _WORKER.get('ci_width')
+    block_rows = []
+    battles = matchups = 0
+    for i in range(start, stop):
+        team1 = templates[i]
+        counts = []
+        for j in _row_columns(i, n):
+            team2 = templates[j]
+            matchup = (ids[i], ids[j])
+            if ci_width is None:
+                result = simulator.k_battles(team1, team2, num_simulations=num_battles, matchup=matchup)
+                counts.append((result['team1_wins'], result['team2_wins'], result['draws']))
+            else:
+                # adaptive: achieved sample count and interval ride along with the counts
+                result = simulator.k_battles(team1, team2, num_simulations=num_battles, ci_width=ci_width,
+                                             matchup=matchup)
+                counts.append((result['team1_wins'], result['team2_wins'], result['draws'],
+                               result['total_simulations'], result['ci_half_width']))
+            battles += result['total_simulations']
+        matchups += len(counts)
+        block_rows.append(counts)
+    if cache is not None:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    if profile is not None:
+        # this block's numbers only, the worker's profile carries on
+        profile = profile.take()
+    stats = dict(hits=hits, misses=misses, profile=profile, battles=battles, matchups=matchups,
+                 worker=os.getpid(), seconds=time.perf_counter() - began)
+    return start, block_rows, stats
+
+
+def _tournament_rows(templates, options: dict, workers: int = 1, cache_totals: dict = None, first_row: int = 0):
+    # (row index, counts) in row order from first_row on, sequential or sharded over a process pool
+    blocks = plan_blocks(templates, options['num_battles'], options['engine'], options.get('triangle', False),
+                         options.get('columns'))
+    blocks = [(max(start, first_row), stop) for start, stop in blocks if stop > first_row]
+    if cache_totals is None:
+        cache_totals = {}
+    cache_totals.setdefault('hits', 0)
+    cache_totals.setdefault('misses', 0)
+
+    def add_totals(stats):
+        cache_totals['hits'] += stats['hits']
+        cache_totals['misses'] += stats['misses']
+        if cache_totals.get('telemetry') is not None:
+            cache_totals['telemetry'].block(stats)
+        profile = stats['profile']
+        if profile is not None:
+            if cache_totals.get('profile') is None:
+                cache_totals['profile'] = profile
+            else:
+                cache_totals['profile'].merge(profile)
+
+    if workers <= 1:
+        _init_worker(templates, options)
+        results = map(_run_block, blocks)
+        for start, block_rows, stats in results:
+            add_totals(stats)
+            for k, counts in enumerate(block_rows):
+                yield start + k, counts
+        return
+
+    # equal-cost blocks, many more than workers, so idle workers keep pulling work
+    # imap hands results back in submission order, which keeps the CSV ordered
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(templates, options)) as pool:
+        for start, block_rows, stats in pool.imap(_run_block, blocks):
+            add_totals(stats)
+            for k, counts in enumerate(block_rows):
+                yield start + k, counts
+
+
+def battle_signature(team: Team) -> tuple:
+    # everything about a team that can change a battle: stats, triggers and abilities per slot
+    # names don't count, so shop-only pets with equal stats are interchangeable
+    return team.canonical_key()
+
+
+def _deduplicated_rows(teams: Sequence[Team], options: dict, workers: int, cache_totals: dict):
+    # simulate each unordered pair of battle-equivalence classes once, then expand to the full grid
+    # mirror symmetry relies on the engine resolving simultaneous triggers team 1 first, which
+    # gives the same outcome distribution either way round for every pet in the registry
+    # each class row of the upper triangle is written out as it comes in: as the row of every
+    # team in the class over the teams of that class and later ones, and flipped, as the cells of
+    # every team of a later class against the class's teams; nothing k x k is held, and the
+    # output comes in that order instead of row by row
+    # yields (team1 id, team2 ids, counts)
+    import numpy as np
+
+    class_of = []
+    representatives = []
+    classes = {}
+    for i, team in enumerate(teams):
+        signature = battle_signature(team)
+        if signature not in classes:
+            classes[signature] = len(representatives)
+            representatives.append(i)
+        class_of.append(classes[signature])
+    k = len(representatives)
+    print(f"battle-equivalence classes: {k:,} (of {len(teams):,} teams)")
+    print(f"simulated matchups: {k * (k + 1) // 2:,} (of {len(teams) ** 2:,})")
+
+    templates = _templates([teams[i] for i in representatives])
+    options = dict(options, ids=representatives, triangle=True)
+
+    class_of = np.asarray(class_of)
+    # team ids by class, so the teams of classes a.. are a suffix
+    by_class = np.argsort(class_of, kind='stable')
+    class_starts = np.searchsorted(class_of[by_class], np.arange(k + 1))
+    for a, row in _tournament_rows(templates, options, workers, cache_totals):
+        # row[b - a] is class a against class b, for b = a..k-1
+        members = by_class[class_starts[a]:class_starts[a + 1]]
+        later = by_class[class_starts[a]:]
+        entries = [row[b - a] for b in class_of[later].tolist()]
+        for i in members.tolist():
+            yield i, later, entries
+        # the mirror cells, team 1 and team 2 wins swapped
+        rest = by_class[class_starts[a + 1]:]
+        for j, b in zip(rest.tolist(), class_of[rest].tolist()):
+            entry = row[b - a]
+            yield j, members, [(entry[1], entry[0]) + tuple(entry[2:])] * len(members)
+
+
+def _stored_rows(teams: Sequence[Team], options: dict, workers: int, cache_totals: dict, store_path: str,
+                 first_row: int = 0):
+    # cells already in the result store are read back, only the rest are simulated
+    # streams are keyed by team content instead of row index, so a cell means the same
+    # thing in every tournament that contains both teams
+    from result_store import ResultStore, cell_key, settings_digest, stream_id, team_digest
+
+    templates = _templates(teams)
+    digests = [team_digest(t) for t in templates]
+    # object and batch engines give identical results for the same streams, so they share cells,
+    # and so do runs with and without a transposition cache
+    sampling = "exact" if options['engine'] == "exact" else "sampled"
+    settings = settings_digest(num_battles=options['num_battles'], sampling=sampling, seed=options['seed'],
+                               ci_width=options['ci_width'])
+    n = len(teams)
+
+    def row_keys(i):
+        return [cell_key(digests[i], d, settings) for d in digests]
+
+    store = ResultStore(store_path)
+    try:
+        columns = []
+        for i in range(n):
+            if i < first_row:
+                columns.append([])
+                continue
+            keys = row_keys(i)
+            found = store.contains_many(keys)
+            columns.append([j for j, key in enumerate(keys) if key not in found])
+        missing = sum(len(cols) for cols in columns)
+        print(f"result store: {(n - first_row) * n - missing:,} cached matchups, {missing:,} to simulate")
+
+        options = dict(options, ids=[stream_id(d) for d in digests], columns=columns)
+        pending = 0
+        for i, fresh in _tournament_rows(templates, options, workers, cache_totals, first_row):
+            # commit in large batches, an interrupted run keeps everything up to the last one
+            pending += len(fresh)
+            if pending >= STORE_COMMIT_MATCHUPS:
+                store.commit()
+                pending = 0
+            if len(fresh) == n:
+                # nothing cached in this row
+                store.put_many(zip(row_keys(i), fresh))
+                yield i, fresh
+                continue
+            keys = row_keys(i)
+            found = store.get_many(keys)
+            found.update(zip([keys[j] for j in columns[i]], fresh))
+            store.put_many((keys[j], entry) for j, entry in zip(columns[i], fresh))
+            yield i, [found[key] for key in keys]
+    finally:
+        store.close()
+
+
+def run_tournament(teams: Sequence[Team], num_battles: int = 10, output_file: str = None, chunk_size: int = 1000,
+                   engine: str = "object", seed: int = None, workers: int = 1, cache_size: int = None,
+                   ci_width: float = None, dedup: bool = False, resume: bool = False,
+                   result_store: str = None, grid_dir: str = None, write_csv: bool = True,
+                   profile: str = None, telemetry: str = None, telemetry_interval: float = 10.0) -> str:
+    # exact writes expected counts (floats) instead of sampled ones
+    if engine not in ("object", "batch", "exact"):
+        raise ValueError(f"Unknown engine '{engine}'. Available: object, batch, exact")
+    # cache_size turns on a per-process transposition cache of sub-battle outcomes
+    if cache_size and engine == "batch":
+        raise ValueError("transposition cache needs the object or exact engine")
+    # ci_width makes num_battles a cap, each matchup stops once its outcome rates have converged
+    if ci_width is not None and engine != "object":
+        raise ValueError("adaptive stopping needs the object engine")
+    # profile writes a BattleProfile JSON report of every battle simulated, merged across workers
+    if profile and engine != "object":
+        raise ValueError("profiling needs the object engine")
+    # telemetry appends JSON-lines progress records (rates, ETA, worker utilization) every
+    # telemetry_interval seconds and a summary at the end to that file, '-' for stdout
+    # result_store is an sqlite file of finished matchups, shared between tournaments
+    if result_store and dedup:
+        raise ValueError("dedup and the result store can't be combined")
+    # grid_dir also writes memory-mapped n x n result arrays, write_csv=False writes only those
+    if not write_csv and grid_dir is None:
+        raise ValueError("write_csv=False needs a grid_dir")
+    # resume continues output_file (or grid_dir) from its checkpoint manifest
+    if resume and (output_file if write_csv else grid_dir) is None:
+        raise ValueError("resume needs the output of the interrupted run")
 
     # generate output filename
     if output_file is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M")
         output_file = f"tr_{timestamp}.csv"
 
+    # integer team codes, compositions decoded from them once per team, not once per row
+    species = registry_species()
+    codes = _codes(teams, len(species))
+    compositions = [composition(code, species) for code in codes]
+
+    # the manifest lives next to the CSV, or in the grid directory when there's no CSV
+    checkpoint_target = output_file if write_csv else os.path.join(grid_dir, "grid")
+    manifest = load_checkpoint(checkpoint_target) if resume else None
+    if manifest is not None and seed is None:
+        # an unseeded run resumes with the seed it drew
+        seed = manifest['config']['seed']
+    # every matchup derives its own stream from this, so output is the same for any worker count
+    if seed is None:
+        seed = random.SystemRandom().randrange(2**32)
+
+    fieldnames = ['Team1_ID', 'Team1_Code', 'Team1_Composition', 'Team2_ID', 'Team2_Code', 'Team2_Composition',
+                  'Team1_Wins', 'Team2_Wins', 'Draws', 'Total_Battles']
+    if ci_width is not None:
+        fieldnames.append('CI_Half_Width')
+    # everything that decides the bytes of the CSV, worker count and chunk size don't
+    # the team list goes in as a digest, the manifest is rewritten at every flush
+    config = dict(teams=config_hash({'codes': list(codes), 'species': species}), num_battles=num_battles,
+                  engine=engine, seed=seed, cache_size=cache_size, ci_width=ci_width, dedup=dedup,
+                  content_streams=bool(result_store), grid=grid_dir is not None)
+
     total_matchups = len(teams) * len(teams)  # full grid, not half
     matchup_count = 0
+    if manifest is not None:
+        # the grid holds the same rows as the CSV, it can't be added or dropped halfway through
+        if manifest['config'].get('grid', False) != (grid_dir is not None):
+            written = "with" if manifest['config'].get('grid', False) else "without"
+            raise ValueError(f"{checkpoint_target} was written {written} a result grid, "
+                             f"resume it {written} grid_dir")
+        if write_csv:
+            validate_resume(output_file, manifest, config, ",".join(fieldnames) + "\r\n")
+        elif manifest['config_hash'] != config_hash(config):
+            raise ValueError(f"{grid_dir} was written by a different tournament configuration")
+        matchup_count = manifest['matchups_committed']
+        if manifest['complete']:
+            print(f"{checkpoint_target if write_csv else grid_dir} is already complete")
+            return output_file if write_csv else grid_dir
 
     print(f"\nStarting FULL GRID tournament with {len(teams)} teams...")
     print(f"total matchups: {total_matchups}")
     print(f"battles per matchup: {num_battles}")
     print(f"total simulations: {total_matchups * num_battles:,}")
+    print(f"engine: {engine}")
+    print(f"workers: {workers}")
+    print(f"seed: {seed}")
+    if matchup_count:
+        print(f"resuming after {matchup_count:,} committed matchups")
 
-    # open CSV file for streaming writes
-    with open(output_file, 'w', newline='') as csvfile:
-        fieldnames = ['Team1_ID', 'Team1_Composition', 'Team2_ID', 'Team2_Composition', 'Team1_Wins', 'Team2_Wins', 'Draws', 'Total_Battles']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
+    # rows before first_row are already on disk, the first one may be partly written
+    first_row = matchup_count // max(1, len(teams))
+    options = dict(num_battles=num_battles, engine=engine, seed=seed, cache_size=cache_size, ci_width=ci_width,
+                   profile=bool(profile))
+    cache_totals = {}
+    if dedup:
+        # one simulation per distinct unordered pair, (j, i) is the mirror of (i, j)
+        # the class grid is solved again on a resume, only the writing is saved
+        rows = _deduplicated_rows(teams, options, workers, cache_totals)
+    elif result_store:
+        rows = _stored_rows(teams, options, workers, cache_totals, result_store, first_row)
+    else:
+        templates = _templates(teams)
+        rows = _tournament_rows(templates, options, workers, cache_totals, first_row)
 
-        # full grid: each team plays every team (including itself)
-        for i, team1 in enumerate(teams):
-            print(f"Progress: {matchup_count}/{total_matchups:,} matchups ({100*matchup_count/total_matchups:.1f}%)")
-            for j, team2 in enumerate(teams):
-                matchup_count += 1
+    n = len(teams)
+    grid = None
+    if grid_dir is not None:
+        from grid_store import GridWriter, write_teams
+        grid = GridWriter(grid_dir, n, exact=engine == "exact", adaptive=ci_width is not None,
+                          resume=manifest is not None)
+        write_teams(grid_dir, codes, compositions,
+                    dict(num_battles=num_battles, engine=engine, seed=seed, ci_width=ci_width, species=species))
 
-                # get team compositions as strings
-                team1_comp = ", ".join([p.name for p in team1.get_alive_pets()])
-                team2_comp = ", ".join([p.name for p in team2.get_alive_pets()])
+    def commit(csvfile, complete=False):
+        # manifest only ever points at results that are on disk
+        if grid is not None:
+            grid.flush()
+        if csvfile is not None:
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+        write_checkpoint(checkpoint_target, {
+            'config_hash': config_hash(config),
+            'config': config,
+            'matchups_committed': matchup_count,
+            'bytes_committed': csvfile.tell() if csvfile is not None else 0,
+            'total_matchups': total_matchups,
+            'complete': complete,
+        })
 
-                # run the battles
-                battle_result = simulator.k_battles(team1, team2, num_simulations=num_battles)
+    # open CSV file for streaming writes, or reopen it past the last committed row
+    if not write_csv:
+        csvfile = None
+    elif manifest is not None:
+        csvfile = open(output_file, 'r+', newline='')
+        # anything after the committed bytes is a torn or uncommitted row
+        csvfile.truncate(manifest['bytes_committed'])
+        csvfile.seek(manifest['bytes_committed'])
+    else:
+        csvfile = open(output_file, 'w', newline='')
+    writer = csv.DictWriter(csvfile, fieldnames=fieldnames) if csvfile is not None else None
+    if manifest is None:
+        if writer is not None:
+            writer.writeheader()
+        commit(csvfile)
+
+    monitor = None
+    if telemetry:
+        from telemetry import TournamentTelemetry
+
+        def output_size():
+            size = csvfile.tell() if csvfile is not None else 0
+            return size + (matchup_count * grid.cell_bytes if grid is not None else 0)
+        monitor = TournamentTelemetry(telemetry, total_matchups, telemetry_interval, matchup_count, output_size,
+                                      dict(config, team_count=n, workers=workers))
+        cache_totals['telemetry'] = monitor
+
+    # full grid: each team plays every team (including itself)
+    # rows come as (team1 id, counts) over every column, or for dedup as (team1 id, team2 ids, counts)
+    if dedup:
+        position = 0
+    else:
+        rows = ((i, None, counts) for i, counts in rows if i >= first_row)
+        position = first_row * n
+    # matchups seen in the order they come, anything before matchup_count is already on disk
+    next_report = matchup_count
+    try:
+        for i, columns, counts in rows:
+            cells = n if columns is None else len(columns)
+            start = max(0, matchup_count - position)
+            position += cells
+            if start >= cells:
+                continue
+            if matchup_count >= next_report:
+                print(f"Progress: {matchup_count}/{total_matchups:,} matchups ({100*matchup_count/total_matchups:.1f}%)")
+                next_report = matchup_count + n
+            if grid is not None:
+                if columns is None:
+                    grid.write_row(i, counts, start)
+                else:
+                    grid.write_cells(i, columns[start:], counts[start:])
+            if writer is None:
+                # grid only, checkpoint at the first row end past each chunk
+                before = matchup_count
+                matchup_count += cells - start
+                if matchup_count // chunk_size > before // chunk_size:
+                    commit(csvfile)
+                    print(f"flushed count: {matchup_count:,}/{total_matchups:,})")
+                if monitor is not None:
+                    monitor.progress(matchup_count, i)
+                continue
+
+            for k in range(start, cells):
+                j = k if columns is None else int(columns[k])
+                entry = counts[k]
+                matchup_count += 1
 
                 # write to csv
-                writer.writerow({
+                row = {
                     'Team1_ID': i,
-                    'Team1_Composition': team1_comp,
+                    'Team1_Code': codes[i],
+                    'Team1_Composition': compositions[i],
                     'Team2_ID': j,
-                    'Team2_Composition': team2_comp,
-                    'Team1_Wins': battle_result['team1_wins'],
-                    'Team2_Wins': battle_result['team2_wins'],
-                    'Draws': battle_result['draws'],
+                    'Team2_Code': codes[j],
+                    'Team2_Composition': compositions[j],
+                    'Team1_Wins': entry[0],
+                    'Team2_Wins': entry[1],
+                    'Draws': entry[2],
                     'Total_Battles': num_battles
-                })
+                }
+                if ci_width is not None:
+                    # achieved sample count replaces the cap
+                    row['Total_Battles'] = entry[3]
+                    row['CI_Half_Width'] = entry[4]
+                writer.writerow(row)
 
-                # flush
+                # flush and checkpoint
                 if matchup_count % chunk_size == 0:
-                    csvfile.flush()
+                    commit(csvfile)
                     print(f"flushed count: {matchup_count:,}/{total_matchups:,})")
+            if monitor is not None:
+                monitor.progress(matchup_count, i)
+        commit(csvfile, complete=True)
+        if monitor is not None:
+            monitor.summary(cache_hits=cache_totals.get('hits', 0), cache_misses=cache_totals.get('misses', 0))
+    finally:
+        if monitor is not None:
+            monitor.close()
+        if csvfile is not None:
+            csvfile.close()
     print(f"processed {matchup_count:,} matchups")
+    # species table for decoding the codes, even after the registry changes
+    if write_csv:
+        write_species(output_file, species)
+    if cache_size:
+        lookups = cache_totals['hits'] + cache_totals['misses']
+        print(f"transposition cache: {cache_totals['hits']:,} hits / {cache_totals['misses']:,} misses "
+              f"({100 * cache_totals['hits'] / max(1, lookups):.1f}% hit rate)")
+    if profile:
+        report = cache_totals.get('profile')
+        if report is None:
+            from profiling import BattleProfile
+            report = BattleProfile()
+        print(report.summary())
+        report.dump(profile)
+        print(f"profile saved to: {profile}")
+    if grid_dir is not None:
+        print(f"result arrays saved to: {grid_dir}")
+    if not write_csv:
+        return grid_dir
     print(f"results saved to: {output_file}")
 
 
-    return output_file
\ No newline at end of file
+    return output_file
+
+
+def opponent_design(n: int, opponents: int, design: str = "balanced", seed: int = 0) -> list[list[int]]:
+    # opponents of every row team for a sampled tournament, sorted, no self-play
+    #   balanced    one random derangement per round, so every team plays `opponents` matchups
+    #               as team 1 and as many as team 2
+    #   stratified  the team space (code order, so grouped by leading pets) is cut into
+    #               `opponents` contiguous strata and each team plays one team from each,
+    #               every stratum member spread evenly over the rows
+    # a pair drawn twice is played once, rare while opponents is much smaller than n
+    import numpy as np
+
+    if design not in ("balanced", "stratified"):
+        raise ValueError(f"Unknown design '{design}'. Available: balanced, stratified")
+    if not 0 < opponents < n:
+        raise ValueError(f"opponents must be between 1 and {n - 1} for {n} teams")
+    rng = np.random.default_rng(seed)
+    rows = np.arange(n)
+    rounds = []
+    if design == "balanced":
+        for _ in range(opponents):
+            permutation = rng.permutation(n)
+            # fixed points swap with a random other slot, which never creates a new one
+            for i in np.nonzero(permutation == rows)[0]:
+                if permutation[i] != i:
+                    continue
+                k = int(rng.integers(n - 1))
+                k += k >= i
+                permutation[i], permutation[k] = permutation[k], permutation[i]
+            rounds.append(permutation)
+    else:
+        bounds = np.linspace(0, n, opponents + 1).astype(np.int64)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            members = lo + rng.permutation(hi - lo)
+            # rows in random order take the stratum's members in turn
+            order = rng.permutation(n)
+            choice = np.empty(n, dtype=np.int64)
+            choice[order] = members[np.arange(n) % len(members)]
+            # a team drawn against itself takes the next member instead (none in a stratum of one)
+            selves = np.nonzero(choice == rows)[0]
+            if len(members) == 1:
+                choice[selves] = -1
+            elif len(selves):
+                position = np.empty(n, dtype=np.int64)
+                position[members] = np.arange(len(members))
+                choice[selves] = members[(position[selves] + 1) % len(members)]
+            rounds.append(choice)
+    columns = np.stack(rounds, axis=1)
+    return [sorted(set(int(j) for j in row if j >= 0)) for row in columns]
+
+
+def run_sampled_tournament(teams: Sequence[Team], opponents: int, num_battles: int = 10, output_file: str = None,
+                           design: str = "balanced", engine: str = "object", seed: int = None, workers: int = 1,
+                           cache_size: int = None, ci_width: float = None, chunk_size: int = 1000,
+                           telemetry: str = None, telemetry_interval: float = 10.0) -> str:
+    # every team plays `opponents` sampled opponents instead of the whole grid, for team spaces
+    # (4 and 5 pets) whose full grid can't be run; rows have the full tournament's CSV columns,
+    # so the stats scripts and NE solvers read them as they are (unplayed cells are missing, and
+    # stats_engine also writes full-grid estimates with confidence intervals for sampled files)
+    # cells use the same streams as the full grid, a sampled cell equals the full run's one
+    if engine not in ("object", "batch", "exact"):
+        raise ValueError(f"Unknown engine '{engine}'. Available: object, batch, exact")
+    if cache_size and engine == "batch":
+        raise ValueError("transposition cache needs the object or exact engine")
+    if ci_width is not None and engine != "object":
+        raise ValueError("adaptive stopping needs the object engine")
+
+    if output_file is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+        output_file = f"tr_sampled_{timestamp}.csv"
+    if seed is None:
+        seed = random.SystemRandom().randrange(2**32)
+
+    species = registry_species()
+    codes = _codes(teams, len(species))
+    compositions = [composition(code, species) for code in codes]
+    n = len(teams)
+    columns = opponent_design(n, opponents, design, seed)
+    total_matchups = sum(len(cols) for cols in columns)
+
+    print(f"\nStarting SAMPLED tournament with {n:,} teams ({design} design, {opponents} opponents per team)...")
+    print(f"sampled matchups: {total_matchups:,} (of {n * n:,})")
+    print(f"battles per matchup: {num_battles}")
+    print(f"engine: {engine}")
+    print(f"workers: {workers}")
+    print(f"seed: {seed}")
+
+    fieldnames = ['Team1_ID', 'Team1_Code', 'Team1_Composition', 'Team2_ID', 'Team2_Code', 'Team2_Composition',
+                  'Team1_Wins', 'Team2_Wins', 'Draws', 'Total_Battles']
+    if ci_width is not None:
+        fieldnames.append('CI_Half_Width')
+    options = dict(num_battles=num_battles, engine=engine, seed=seed, cache_size=cache_size, ci_width=ci_width,
+                   columns=columns)
+    cache_totals = {}
+    templates = _templates(teams)
+    rows = _tournament_rows(templates, options, workers, cache_totals)
+
+    matchup_count = 0
+    monitor = None
+    with open(output_file, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        if telemetry:
+            from telemetry import TournamentTelemetry
+            monitor = TournamentTelemetry(telemetry, total_matchups, telemetry_interval, 0, csvfile.tell,
+                                          dict(num_battles=num_battles, engine=engine, seed=seed, design=design,
+                                               opponents=opponents, team_count=n, workers=workers))
+            cache_totals['telemetry'] = monitor
+        try:
+            for i, counts in rows:
+                for j, entry in zip(columns[i], counts):
+                    row = {
+                        'Team1_ID': i,
+                        'Team1_Code': codes[i],
+                        'Team1_Composition': compositions[i],
+                        'Team2_ID': j,
+                        'Team2_Code': codes[j],
+                        'Team2_Composition': compositions[j],
+                        'Team1_Wins': entry[0],
+                        'Team2_Wins': entry[1],
+                        'Draws': entry[2],
+                        'Total_Battles': num_battles,
+                    }
+                    if ci_width is not None:
+                        row['Total_Battles'] = entry[3]
+                        row['CI_Half_Width'] = entry[4]
+                    writer.writerow(row)
+                    matchup_count += 1
+                    if matchup_count % chunk_size == 0:
+                        csvfile.flush()
+                        print(f"flushed count: {matchup_count:,}/{total_matchups:,})")
+                if monitor is not None:
+                    monitor.progress(matchup_count, i)
+            if monitor is not None:
+                monitor.summary(cache_hits=cache_totals['hits'], cache_misses=cache_totals['misses'])
+        finally:
+            if monitor is not None:
+                monitor.close()
+
+    print(f"processed {matchup_count:,} matchups")
+    write_species(output_file, species)
+    print(f"results saved to: {output_file}")
+    return output_file
@@ -0,0 +1,125 @@
+import json
+import sys
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# JSON-lines throughput telemetry for long tournaments
+# a 'progress' record every interval seconds and a 'summary' record at the end, appended to a
+# file ('-' for stdout), so runs can be tailed, plotted and compared
+#
+# throughput counts what the workers actually simulated (a dedup or result store run writes
+# more matchups than it simulates), progress and ETA count matchups written; the moving average
+# of battles per matchup and the slowest interval's rows show where a run slows down
+
+# work blocks in the battles per matchup moving average
+WINDOW = 32
+
+
+class TournamentTelemetry:
+    def __init__(self, path: str, total_matchups: int, interval: float = 10.0, written: int = 0,
+                 output_size: Optional[Callable[[], int]] = None, config: Optional[Dict] = None):
+        self.file = sys.stdout if path == '-' else open(path, 'a')
+        self.total_matchups = total_matchups
+        self.interval = interval
+        self.output_size = output_size or (lambda: 0)
+        self.config = config or {}
+        self.start = time.time()
+        # matchups already on disk when the run started (a resume), not part of this run's rate
+        self.first_written = self.written = written
+        self.row = None
+        self.battles = 0
+        self.matchups = 0
+        self.busy: Dict[int, float] = {}    # worker pid -> seconds spent simulating
+        self.window = deque(maxlen=WINDOW)  # (battles, matchups) of the latest blocks
+        self.records = 0
+        self.slowest = None
+        self._last = (self.start, 0, self.written, self.row)
+
+    def block(self, stats: Dict):
+        # a finished work block: battles, matchups, worker, seconds
+        self.battles += stats['battles']
+        self.matchups += stats['matchups']
+        self.busy[stats['worker']] = self.busy.get(stats['worker'], 0.0) + stats['seconds']
+        self.window.append((stats['battles'], stats['matchups']))
+        self._maybe_emit()
+
+    def progress(self, written: int, row: int):
+        # matchups written so far, and the team1 row being written
+        self.written = written
+        self.row = row
+        self._maybe_emit()
+
+    def _maybe_emit(self):
+        if time.time() - self._last[0] >= self.interval:
+            self._emit()
+
+    def _emit(self):
+        now = time.time()
+        last_time, last_battles, last_written, last_row = self._last
+        span = max(now - last_time, 1e-9)
+        elapsed = max(now - self.start, 1e-9)
+        written_rate = (self.written - self.first_written) / elapsed
+        remaining = self.total_matchups - self.written
+        battles_per_sec = (self.battles - last_battles) / span
+        window_battles = sum(b for b, _ in self.window)
+        window_matchups = sum(m for _, m in self.window)
+        record = {
+            'event': 'progress',
+            'time': now,
+            'elapsed_seconds': elapsed,
+            'matchups_written': self.written,
+            'total_matchups': self.total_matchups,
+            'percent': 100 * self.written / max(self.total_matchups, 1),
+            'row': self.row,
+            'battles_simulated': self.battles,
+            'matchups_simulated': self.matchups,
+            'battles_per_sec': battles_per_sec,
+            'matchups_per_sec': (self.written - last_written) / span,
+            'overall_battles_per_sec': self.battles / elapsed,
+            'eta_seconds': remaining / written_rate if written_rate > 0 else None,
+            'battles_per_matchup': window_battles / window_matchups if window_matchups else None,
+            'output_bytes': self.output_size(),
+            'worker_utilization': self._utilization(elapsed),
+        }
+        self._write(record)
+        # rows covered by this interval, to find the expensive regions
+        if self.battles > last_battles and (self.slowest is None or battles_per_sec < self.slowest['battles_per_sec']):
+            self.slowest = {'battles_per_sec': battles_per_sec, 'rows': [last_row, self.row]}
+        self._last = (now, self.battles, self.written, self.row)
+
+    def _utilization(self, elapsed: float) -> Dict[str, float]:
+        return {str(worker): busy / elapsed for worker, busy in sorted(self.busy.items())}
+
+    def _write(self, record: Dict):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.records += 1
+
+    def summary(self, **extra) -> Dict:
+        # final record: totals, mean rates, the slowest interval and the run's configuration
+        elapsed = max(time.time() - self.start, 1e-9)
+        record = {
+            'event': 'summary',
+            'time': time.time(),
+            'elapsed_seconds': elapsed,
+            'matchups_written': self.written,
+            'total_matchups': self.total_matchups,
+            'battles_simulated': self.battles,
+            'matchups_simulated': self.matchups,
+            'battles_per_sec': self.battles / elapsed,
+            'matchups_per_sec': (self.written - self.first_written) / elapsed,
+            'battles_per_matchup': self.battles / self.matchups if self.matchups else None,
+            'output_bytes': self.output_size(),
+            'workers': len(self.busy),
+            'worker_utilization': self._utilization(elapsed),
+            'slowest_interval': self.slowest,
+            'config': self.config,
+        }
+        record.update(extra)
+        self._write(record)
+        return record
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
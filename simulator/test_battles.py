@@ -48,4 +48,716 @@ def test_three_five():
     atol(res['team1_win_rate'], 48, 5)
     # 1/5 * 1/5
     atol(res['team2_win_rate'], 4, 3)
-    atol(res['draw_rate'], 48, 5)
\ No newline at end of file
+    atol(res['draw_rate'], 48, 5)
+
+
+def test_template_reset():
+    # battles reset from an immutable template, authored team is untouched
+    team1 = Team().add_pets("cricket", "ant", "horse")
+    team2 = Team().add_pets("pig", "pig", "pig")
+    template = team1.template()
+
+    simulator = BattleSimulator(seed=3)
+    for _ in range(20):
+        simulator.simulate_battle(template, team2)
+
+    fresh = template.instantiate()
+    assert [(p.name, p.attack, p.health, p.is_fainted) for p in fresh.get_alive_pets()] == \
+        [("Cricket", 1, 2, False), ("Ant", 2, 2, False), ("Horse", 2, 1, False)]
+    assert team2.get_alive_pets()[0].health == 1
+
+def test_batch_engine():
+    # lockstep numpy engine agrees with the pet-by-pet engine
+    from batch_engine import BatchBattleEngine
+
+    engine = BatchBattleEngine(seed=0)
+    assert engine.k_battles(Team().add_pets("cricket", "cricket", "horse"),
+                            Team().add_pets("pig", "mouse", "pig", "mouse", "mouse"), 50)['draws'] == 50
+    assert engine.k_battles(Team().add_pets("ant", "ant"), Team().add_pets("fish"), 50)['team1_wins'] == 50
+
+    res = engine.k_battles(Team().add_pets("mosquito", "mosquito", "mosquito"),
+                           Team().add_pets("pig", "pig", "pig", "pig", "pig"), 1000)
+    atol(res['team1_win_rate'], 48, 5)
+    atol(res['team2_win_rate'], 4, 3)
+    atol(res['draw_rate'], 48, 5)
+
+def test_parallel_tournament(tmp_path):
+    # sharded tournament writes the same bytes as a sequential one
+    from team_combinations import generate_all_team_sequences, run_tournament
+
+    teams = generate_all_team_sequences(team_length=1)
+    sequential = run_tournament(teams, num_battles=5, output_file=str(tmp_path / "seq.csv"), seed=7)
+    parallel = run_tournament(teams, num_battles=5, output_file=str(tmp_path / "par.csv"), seed=7, workers=2)
+
+    assert open(sequential, 'rb').read() == open(parallel, 'rb').read()
+
+
+def test_counter_streams(tmp_path):
+    # per-matchup streams: both engines agree cell for cell, any cell can be redone alone
+    from batch_engine import BatchBattleEngine
+    from team_combinations import generate_all_team_sequences, run_tournament
+
+    teams = generate_all_team_sequences(team_length=2)[:30]
+    by_object = run_tournament(teams, num_battles=4, output_file=str(tmp_path / "object.csv"), seed=11)
+    by_batch = run_tournament(teams, num_battles=4, output_file=str(tmp_path / "batch.csv"), seed=11, engine="batch")
+    assert open(by_object, 'rb').read() == open(by_batch, 'rb').read()
+
+    team1 = Team().add_pets("mosquito", "ant", "cricket")
+    team2 = Team().add_pets("ant", "mosquito", "horse")
+    res = BattleSimulator(seed=4).k_battles(team1, team2, 200, matchup=(17, 23))
+    assert res == BattleSimulator(seed=4).k_battles(team1, team2, 200, matchup=(17, 23))
+    assert res == BatchBattleEngine(seed=4).k_battles(team1, team2, 200, matchup=(17, 23))
+    assert res['random_draws'] > 0
+
+def test_exact_three_five():
+    # same matchup as test_three_five, solved exactly
+    from exact_solver import ExactSolver
+
+    team1 = Team().add_pets("mosquito", "mosquito", "mosquito")
+    team2 = Team().add_pets("pig", "pig", "pig", "pig", "pig")
+
+    res = ExactSolver().solve(team1, team2)
+    atol(res['team1_win_prob'], 0.48, 1e-9)
+    atol(res['team2_win_prob'], 0.04, 1e-9)
+    atol(res['draw_prob'], 0.48, 1e-9)
+
+def test_transposition_cache():
+    # cached outcomes are shared between matchups and agree with sampling
+    from transposition import TranspositionCache
+
+    cache = TranspositionCache(maxsize=1000)
+    simulator = BattleSimulator(seed=0, transposition_cache=cache)
+    team1 = Team().add_pets("mosquito", "mosquito", "mosquito")
+    team2 = Team().add_pets("pig", "pig", "pig", "pig", "pig")
+
+    res = simulator.k_battles(team1, team2, num_simulations=1000)
+    atol(res['team1_win_rate'], 48, 5)
+    atol(res['draw_rate'], 48, 5)
+    assert cache.hits > 0 and cache.misses > 0
+
+    # fainted pets don't change the canonical board
+    state = simulator.new_state(Team().add_pets("fish", "pig"), Team().add_pets("pig"))
+    before = state.canonical_key()
+    state.team1.pets[0].is_fainted = True
+    assert state.canonical_key() == (((4, 1, None, None),), ((4, 1, None, None),))
+    assert before != state.canonical_key()
+
+    # a certain outcome a rounding error short of 1 draws no random number
+    fish, pig = Team().add_pets("fish"), Team().add_pets("pig")
+    state = simulator.new_state(fish, pig)
+    simulator.start_battle(state)
+    cache.put(state.canonical_key(), (1 - 1e-16, 1e-16, 0.0))
+    state = simulator.simulate_battle(fish, pig)
+    assert state.winner == 1 and state.randomness.draws == 0
+
+def test_adaptive_stopping():
+    # no random draws in the first battle means one battle is enough
+    simulator = BattleSimulator(seed=0)
+    res = simulator.k_battles(Team().add_pets("fish", "fish", "fish"), Team().add_pets("pig", "pig", "pig"),
+                              num_simulations=10000, ci_width=0.02)
+    assert res['total_simulations'] == 1 and res['ci_half_width'] == 0.0
+
+    # random matchups stop once the interval is narrow enough
+    res = simulator.k_battles(Team().add_pets("mosquito", "mosquito", "mosquito"),
+                              Team().add_pets("pig", "pig", "pig", "pig", "pig"),
+                              num_simulations=10000, ci_width=0.1)
+    assert res['total_simulations'] < 10000 and 2 * res['ci_half_width'] <= 0.1
+    # only at the scheduled checks, with z corrected for how many there are
+    from simulator import check_schedule, corrected_z, wilson_half_width
+    assert check_schedule(30, 10000) == [30, 60, 120, 240, 480, 960, 1920, 3840, 7680, 10000]
+    assert res['total_simulations'] in check_schedule(30, 10000)
+    z = corrected_z(1.96, 10)
+    assert z > 1.96
+    assert res['ci_half_width'] == max(wilson_half_width(res[k], res['total_simulations'], z)
+                                       for k in ('team1_wins', 'team2_wins', 'draws'))
+
+def test_dedup_tournament(tmp_path, monkeypatch):
+    # one exact solve per unordered class pair expands to the same grid
+    import csv
+    import numpy as np
+    import pytest
+    from team_combinations import battle_signature, generate_all_team_sequences, run_tournament
+
+    # repeated teams make classes with several members
+    space = generate_all_team_sequences(team_length=2)
+    teams = list(space[:40]) + list(space[5:10])
+    full = run_tournament(teams, num_battles=10, output_file=str(tmp_path / "full.csv"), engine="exact",
+                          grid_dir=str(tmp_path / "full.grid"))
+    dedup = run_tournament(teams, num_battles=10, output_file=str(tmp_path / "dedup.csv"), engine="exact",
+                           dedup=True, grid_dir=str(tmp_path / "dedup.grid"))
+
+    def cells(path):
+        with open(path) as f:
+            return {(row['Team1_ID'], row['Team2_ID']): row for row in csv.DictReader(f)}
+    full_cells, dedup_cells = cells(full), cells(dedup)
+    assert len(dedup_cells) == len(teams) ** 2 and full_cells.keys() == dedup_cells.keys()
+    for key, row in full_cells.items():
+        for col in ('Team1_Wins', 'Team2_Wins', 'Draws'):
+            atol(float(row[col]), float(dedup_cells[key][col]), 1e-9)
+    from grid_store import load_grid
+    assert np.allclose(load_grid(str(tmp_path / "full.grid")).wins, load_grid(str(tmp_path / "dedup.grid")).wins)
+
+    # an interrupted dedup run resumes to the same bytes
+    import team_combinations
+    rows = team_combinations._tournament_rows
+
+    def dies_after_three_rows(*args, **kwargs):
+        for n, row in enumerate(rows(*args, **kwargs)):
+            if n == 3:
+                raise KeyboardInterrupt
+            yield row
+    output = str(tmp_path / "resumed.csv")
+    monkeypatch.setattr(team_combinations, "_tournament_rows", dies_after_three_rows)
+    with pytest.raises(KeyboardInterrupt):
+        run_tournament(teams, num_battles=10, output_file=output, engine="exact", dedup=True, chunk_size=50)
+    monkeypatch.setattr(team_combinations, "_tournament_rows", rows)
+    run_tournament(teams, num_battles=10, output_file=output, engine="exact", dedup=True, chunk_size=50, resume=True)
+    assert open(dedup, 'rb').read() == open(output, 'rb').read()
+
+    # same stats, same triggers, different names
+    assert battle_signature(Team().add_pets("fish", "pig")) != battle_signature(Team().add_pets("pig", "fish"))
+    assert battle_signature(Team().add_pets("ant")) == battle_signature(Team().add_pets("ant"))
+
+def test_trigger_dispatch():
+    # the index follows faints and summons, empty phases have no subscribers
+    from core import TriggerType
+
+    team = Team().add_pets("cricket", "horse", "ant").template().instantiate()
+    assert [p.name for p in team.subscribers(TriggerType.FAINT)] == ["Cricket", "Ant"]
+    assert not team.subscribers(TriggerType.BEFORE_ATTACK)
+
+    cricket = team.pets[0]
+    team.faint(cricket)
+    team.remove_pet(cricket)
+    assert [p.name for p in team.subscribers(TriggerType.FAINT)] == ["Ant"]
+    team.add_pet(Team().add_pets("mosquito").pets[0])
+    assert [p.position for p in team.subscribers(TriggerType.START_OF_BATTLE)] == [0]
+
+    # equal pets are told apart by identity
+    from dataclasses import replace
+    team = Team().add_pets("ant", "cricket").template().instantiate()
+    ant = team.pets[0]
+    twin = replace(ant)
+    team.subscribe(twin)
+    assert twin == ant and twin is not ant
+    team.unsubscribe(twin)
+    assert [id(p) for p in team.subscribers(TriggerType.FAINT)] == [id(ant), id(team.pets[1])]
+
+def test_team_codes():
+    # codes round trip, lengths don't collide, generated teams come out in code order
+    from team_codes import codes_of_length, composition, decode, encode, registry_species, team_code
+    from team_combinations import generate_all_team_sequences
+
+    assert decode(encode((2, 0, 8), 9), 9) == (2, 0, 8)
+    assert encode((), 9) == 0 and encode((0,), 9) == 1 and encode((0, 0), 9) == 10
+    teams = generate_all_team_sequences(team_length=2)
+    assert [team_code(t) for t in teams] == list(codes_of_length(2, 9))
+    assert composition(team_code(Team().add_pets("ant", "ant", "cricket")), registry_species()) == "Ant, Ant, Cricket"
+    # names resolve to species ids, duplicates keep their names, and hand-built teams match decoded ones
+    from team_codes import species_id, template_from_code
+    team = Team().add_pets("Ant", "ant", "cricket")
+    assert [p.name for p in team.pets if p] == ["Ant", "Ant", "Cricket"]
+    assert [p.species_id for p in team.pets if p] == [species_id("ant")] * 2 + [species_id("CRICKET")]
+    assert team.template() == template_from_code(team_code(team))
+
+def test_resume_tournament(tmp_path, monkeypatch):
+    # a run killed mid-row resumes from its checkpoint to the same bytes
+    import team_combinations
+    from team_combinations import generate_all_team_sequences, run_tournament
+
+    teams = generate_all_team_sequences(team_length=1)
+    reference = run_tournament(teams, num_battles=5, output_file=str(tmp_path / "ref.csv"), seed=5)
+
+    rows = team_combinations._tournament_rows
+
+    def dies_after_four_rows(*args, **kwargs):
+        for n, row in enumerate(rows(*args, **kwargs)):
+            if n == 4:
+                raise KeyboardInterrupt
+            yield row
+
+    output = str(tmp_path / "run.csv")
+    monkeypatch.setattr(team_combinations, "_tournament_rows", dies_after_four_rows)
+    try:
+        run_tournament(teams, num_battles=5, output_file=output, chunk_size=7, seed=5)
+    except KeyboardInterrupt:
+        pass
+    monkeypatch.setattr(team_combinations, "_tournament_rows", rows)
+    with open(output, 'a') as f:
+        f.write("4,5,Horse,2")  # torn row
+
+    # the interrupted run had no grid, one can't be started halfway through
+    import pytest
+    with pytest.raises(ValueError, match="without a result grid"):
+        run_tournament(teams, num_battles=5, output_file=output, chunk_size=7, seed=5, resume=True,
+                       grid_dir=str(tmp_path / "run.grid"))
+    run_tournament(teams, num_battles=5, output_file=output, chunk_size=7, seed=5, resume=True)
+    assert open(reference, 'rb').read() == open(output, 'rb').read()
+
+    # a grid-only run keeps its checkpoint in the grid directory and resumes from there
+    import numpy as np
+    from grid_store import load_grid
+    grid_dir = str(tmp_path / "only.grid")
+    monkeypatch.setattr(team_combinations, "_tournament_rows", dies_after_four_rows)
+    with pytest.raises(KeyboardInterrupt):
+        run_tournament(teams, num_battles=5, chunk_size=7, seed=5, grid_dir=grid_dir, write_csv=False)
+    monkeypatch.setattr(team_combinations, "_tournament_rows", rows)
+    run_tournament(teams, num_battles=5, chunk_size=7, seed=5, grid_dir=grid_dir, write_csv=False, resume=True)
+    reference_grid = run_tournament(teams, num_battles=5, seed=5, grid_dir=str(tmp_path / "ref.grid"), write_csv=False)
+    for name in ('wins', 'losses', 'draws'):
+        assert np.array_equal(getattr(load_grid(grid_dir), name), getattr(load_grid(reference_grid), name))
+
+def test_result_store(tmp_path):
+    # growing the team list only simulates the new cells, old cells read back unchanged
+    import csv
+    from result_store import ResultStore, team_digest
+    from team_combinations import generate_all_team_sequences, run_tournament
+
+    teams = generate_all_team_sequences(team_length=2)
+    store = str(tmp_path / "results.sqlite")
+    small = run_tournament(teams[:5], num_battles=20, output_file=str(tmp_path / "small.csv"), seed=2,
+                           result_store=store)
+    assert len(ResultStore(store)) == 25
+    large = run_tournament(teams[:7], num_battles=20, output_file=str(tmp_path / "large.csv"), seed=2,
+                           result_store=store, engine="batch")
+    assert len(ResultStore(store)) == 49
+    again = run_tournament(teams[:7], num_battles=20, output_file=str(tmp_path / "again.csv"), seed=2,
+                           result_store=store)
+    assert open(again, 'rb').read() == open(large, 'rb').read()
+
+    with open(small) as a, open(large) as b:
+        old = {(r['Team1_ID'], r['Team2_ID']): r for r in csv.DictReader(a)}
+        new = {(r['Team1_ID'], r['Team2_ID']): r for r in csv.DictReader(b)}
+    assert all(new[cell] == row for cell, row in old.items())
+
+    # a stat change is a different team
+    buffed = Team().add_pets("ant", "ant")
+    buffed.pets[0].attack += 1
+    assert team_digest(buffed.template()) != team_digest(Team().add_pets("ant", "ant").template())
+
+def test_grid_store(tmp_path):
+    # memory-mapped arrays hold the same results as the CSV, and convert back to it byte for byte
+    import numpy as np
+    from grid_store import export_csv, load_grid
+    from team_combinations import generate_all_team_sequences, run_tournament
+
+    teams = generate_all_team_sequences(team_length=2)[:20]
+    for engine, ci_width in (("batch", None), ("exact", None), ("object", 0.3)):
+        grid_dir = str(tmp_path / f"{engine}.grid")
+        output = run_tournament(teams, num_battles=8, output_file=str(tmp_path / f"{engine}.csv"), seed=4,
+                                engine=engine, ci_width=ci_width, grid_dir=grid_dir)
+        exported = export_csv(grid_dir, str(tmp_path / f"{engine}_export.csv"))
+        assert open(output, 'rb').read() == open(exported, 'rb').read()
+
+    grid = load_grid(str(tmp_path / "batch.grid"))
+    assert isinstance(grid.wins, np.memmap) and grid.wins.dtype == np.uint32
+    assert ((grid.wins + grid.losses + grid.draws) == grid.battles()).all()
+    only = run_tournament(teams, num_battles=8, seed=4, engine="batch", grid_dir=str(tmp_path / "only.grid"),
+                          write_csv=False)
+    assert (load_grid(only).wins == grid.wins).all()
+
+def test_stats_engine(tmp_path):
+    # vectorized per-team stats match a row-by-row count
+    import csv
+    import sys
+    from pathlib import Path
+    from collections import defaultdict
+    from team_combinations import generate_all_team_sequences, run_tournament
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'stats'))
+    from stats_engine import load_results, team_totals
+
+    teams = generate_all_team_sequences(team_length=2)[:25]
+    output = run_tournament(teams, num_battles=6, output_file=str(tmp_path / "tr.csv"), seed=8, engine="batch")
+    totals = team_totals(load_results(output)).set_index('Team_ID')
+
+    wins, lost_to = defaultdict(int), defaultdict(set)
+    for row in csv.DictReader(open(output)):
+        i, j, w1, w2 = int(row['Team1_ID']), int(row['Team2_ID']), int(row['Team1_Wins']), int(row['Team2_Wins'])
+        wins[i] += w1
+        wins[j] += w2
+        if w2 > 0:
+            lost_to[i].add(j)
+        if w1 > 0:
+            lost_to[j].add(i)
+    assert all(totals.loc[k, 'Total_Win_Count'] == wins[k] for k in range(25))
+    assert all(totals.loc[k, 'Unique_Loss_Count'] == len(lost_to[k]) for k in range(25))
+
+
+def test_bradley_terry():
+    # the three fitters agree, and a full grid gives the same pairs as its rows
+    import sys
+    from pathlib import Path
+    import numpy as np
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'stats'))
+    from bradley_terry import fit_bradley_terry, pairs_from_matrices, pairs_from_rows
+
+    rng = np.random.default_rng(3)
+    n = 40
+    theta = rng.normal(0, 1, n)
+    p = 1 / (1 + np.exp(theta[None, :] - theta[:, None]))
+    wins = rng.binomial(20, p)
+    draws = np.zeros_like(wins)
+    losses = 20 - wins
+
+    pairs = pairs_from_matrices(wins, losses, draws)
+    ids1, ids2 = np.indices((n, n)).reshape(2, -1)
+    from_rows = pairs_from_rows(ids1, ids2, wins.ravel(), losses.ravel(), draws.ravel(), n)
+    assert all(np.allclose(a, b) for a, b in zip(pairs, from_rows))
+
+    fits = [fit_bradley_terry(*pairs, n_teams=n, method=method) for method in ('mm', 'newton', 'lbfgs')]
+    assert all(fit.converged for fit in fits)
+    for fit in fits[1:]:
+        assert np.allclose(fit.log_strengths, fits[0].log_strengths, atol=1e-4)
+    assert np.corrcoef(fits[1].log_strengths, theta)[0, 1] > 0.9
+    assert fits[1].exact_std_errors and np.all(fits[1].std_errors > 0)
+
+    # sampled matchups, half the pairs missing
+    keep = rng.random(n * n) < 0.5
+    sparse_pairs = pairs_from_rows(ids1[keep], ids2[keep], wins.ravel()[keep], losses.ravel()[keep],
+                                   draws.ravel()[keep], n)
+    assert len(sparse_pairs[0]) < len(pairs[0])
+    assert fit_bradley_terry(*sparse_pairs, n_teams=n).converged
+
+    # the 5-pet team space, 100 sampled opponents of 50 battles each: a size where L-BFGS-B's
+    # own stopping rules used to end it short of the gradient test
+    rng = np.random.default_rng(1)
+    n = 59049
+    theta = rng.normal(0, 1, n)
+    ids1 = np.repeat(np.arange(n), 100)
+    ids2 = rng.integers(0, n, len(ids1))
+    wins = rng.binomial(50, 1 / (1 + np.exp(theta[ids2] - theta[ids1])))
+    draws = rng.binomial(50 - wins, 0.2)
+    pairs = pairs_from_rows(ids1, ids2, wins, 50 - wins - draws, draws, n)
+    fit = fit_bradley_terry(*pairs, n_teams=n, method='lbfgs')
+    assert fit.converged and fit.max_gradient < 1e-6, fit.summary()
+    assert np.corrcoef(fit.log_strengths, theta)[0, 1] > 0.9
+
+
+def test_iterative_nash_solvers():
+    # first-order solvers reach the LP's game value, warm starts begin at the given strategy
+    import sys
+    from pathlib import Path
+    import numpy as np
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'ne'))
+    from iterative_solvers import exploitability, solve
+
+    rng = np.random.default_rng(4)
+    upper = rng.uniform(-1, 1, (30, 30))
+    payoff = np.triu(upper, 1) - np.triu(upper, 1).T  # symmetric zero-sum game, value 0
+
+    # fictitious play converges much more slowly
+    for method, tolerance in (('rm+', 1e-3), ('omwu', 1e-3), ('fp', 2e-2)):
+        result = solve(payoff, method, tolerance=tolerance, iterations=100000, report_every=0)
+        assert result.converged, method
+        assert len(result.history) == result.iterations
+        gap, value = exploitability(payoff, result.strategy, result.opponent)
+        assert abs(gap - result.exploitability) < 1e-9
+        assert abs(value) < tolerance and np.isclose(result.strategy.sum(), 1)
+
+    cold = solve(payoff, 'rm+', tolerance=1e-4, report_every=0)
+    warm = solve(payoff, 'rm+', tolerance=1e-3, warm_start=cold.strategy, report_every=0)
+    assert warm.converged and warm.iterations < 10
+
+
+def test_double_oracle(tmp_path):
+    # the restricted game's mix is an equilibrium of the full game, from a fraction of its matchups
+    import sys
+    from pathlib import Path
+    import numpy as np
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'ne'))
+    from double_oracle import MatchupOracle, double_oracle
+    from team_codes import codes_of_length, registry_species
+
+    candidates = list(codes_of_length(2, len(registry_species())))
+    store = str(tmp_path / "results.sqlite")
+    oracle = MatchupOracle(num_battles=5, seed=3, result_store=store)
+    result = double_oracle(candidates, oracle, tolerance=0.01)
+    oracle.close()
+    pairs = len(candidates) * (len(candidates) - 1) // 2
+    assert result.converged and result.matchups_simulated < pairs // 2
+
+    # a second oracle reads everything back from the store
+    replay = MatchupOracle(num_battles=5, seed=3, result_store=store)
+    again = double_oracle(candidates, replay, tolerance=0.01)
+    assert replay.simulated == 0 and again.codes == result.codes
+
+    full = replay.matrix(candidates, candidates)
+    replay.close()
+    mix = np.zeros(len(candidates))
+    mix[[candidates.index(code) for code in result.codes]] = result.strategy
+    assert (full @ mix).max() - mix @ full @ mix <= 0.01 + 1e-9
+
+
+def test_payoff_cache(tmp_path, monkeypatch):
+    # the second load reads the cached matrix, a changed CSV is parsed again
+    import os
+    import sys
+    from pathlib import Path
+    import numpy as np
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'ne'))
+    from nash_equilibrium_fast import FastNashSolver, payoff_cache_path
+    from team_combinations import generate_all_team_sequences, run_tournament
+
+    teams = generate_all_team_sequences(team_length=2)[:12]
+    output = run_tournament(teams, num_battles=4, output_file=str(tmp_path / "tr.csv"), seed=2, engine="batch")
+    parsed = FastNashSolver(output)
+    assert os.path.exists(f"{payoff_cache_path(output)}.npy")
+    cached = FastNashSolver(output)
+    assert np.array_equal(parsed.payoff_matrix, cached.payoff_matrix)
+    assert parsed.team_names == cached.team_names and len(parsed.team_names) == 12
+
+    run_tournament(teams, num_battles=4, output_file=output, seed=3, engine="batch")
+    rebuilt = FastNashSolver(output)
+    assert np.array_equal(rebuilt.payoff_matrix, FastNashSolver(output, use_cache=False).payoff_matrix)
+    assert not np.array_equal(rebuilt.payoff_matrix, cached.payoff_matrix)
+
+    # a CSV read in many chunks, mirror rows split across them, gives the grid's matrix
+    import nash_equilibrium_fast
+    grid_dir = str(tmp_path / "tr.grid")
+    output = run_tournament(generate_all_team_sequences(team_length=2)[:40], num_battles=4,
+                            output_file=str(tmp_path / "chunked.csv"), seed=7, engine="batch", grid_dir=grid_dir)
+    monkeypatch.setattr(nash_equilibrium_fast, "CSV_CHUNK", 333)
+    chunked = FastNashSolver(output, use_cache=False).payoff_matrix
+    assert np.array_equal(chunked, FastNashSolver(grid_dir).payoff_matrix)
+    assert np.array_equal(chunked, -chunked.T) and chunked.any()
+
+
+def test_cycle_finder():
+    # matrix counts and the bitset enumeration match brute force
+    import itertools
+    import sys
+    from pathlib import Path
+    import numpy as np
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'ne'))
+    from cycles import cycle_participation, dominance_graph, three_cycles
+
+    rng = np.random.default_rng(5)
+    n = 14
+    upper = rng.uniform(-1, 1, (n, n))
+    payoff = np.triu(upper, 1) - np.triu(upper, 1).T
+    adjacency = dominance_graph(payoff, 0.15)
+    participation = cycle_participation(adjacency, max_length=5)
+
+    for k in (3, 4, 5):
+        through = np.zeros(n, dtype=int)
+        for cycle in itertools.permutations(range(n), k):
+            if cycle[0] == min(cycle) and all(adjacency[cycle[m], cycle[(m + 1) % k]] for m in range(k)):
+                through[list(cycle)] += 1
+        assert np.array_equal(participation[k], through), k
+
+    cycles = three_cycles(adjacency, payoff)
+    assert len(cycles) == participation[3].sum() // 3
+    assert all(adjacency[i, j] and adjacency[j, k] and adjacency[k, i]
+               for i, j, k in cycles[['Team1_ID', 'Team2_ID', 'Team3_ID']].values)
+    assert cycles['Avg_Dominance'].is_monotonic_decreasing
+    assert three_cycles(adjacency, payoff, top=5).equals(cycles.head(5))
+
+
+def test_binned_heatmap(tmp_path):
+    # binning a CSV or a grid gives the per-cell points share, pooled bins stay exact means
+    import sys
+    from pathlib import Path
+    import numpy as np
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'tools'))
+    from heatmap import binned_heatmap, positions_from_scores, write_tiles
+    from team_combinations import generate_all_team_sequences, run_tournament
+    from grid_store import load_grid
+
+    teams = generate_all_team_sequences(team_length=2)[:20]
+    output = run_tournament(teams, num_battles=6, output_file=str(tmp_path / "tr.csv"), seed=6, engine="batch",
+                            grid_dir=str(tmp_path / "grid"))
+    grid = load_grid(str(tmp_path / "grid"))
+    share = (2 * grid.wins.astype(float) + grid.draws) / 12
+
+    scores = share.mean(axis=1)
+    positions = positions_from_scores(scores)
+    for source in (output, str(tmp_path / "grid")):
+        image, sums, counts = binned_heatmap(source, positions, size=64)
+        order = np.argsort(positions)
+        assert np.allclose(image, share[np.ix_(order, order)])
+        half, _, _ = binned_heatmap(source, positions, size=10)
+        assert np.allclose(half, share[np.ix_(order, order)].reshape(10, 2, 10, 2).mean(axis=(1, 3)))
+    assert np.all(np.diff(scores[np.argsort(positions)]) <= 0)
+    assert write_tiles(sums, counts, str(tmp_path / "tiles")) == 1
+    assert (tmp_path / "tiles" / "0" / "0" / "0.png").exists()
+
+
+def test_benchmark_compare():
+    # slower rates, longer times and bigger peaks past the tolerances are regressions, faster isn't
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+    from bench import SCENARIOS, compare, run_scenario
+
+    result = run_scenario('battle_vanilla', repeat=1)
+    assert result['battles_per_sec'] > 0 and result['peak_rss_mb'] > 0
+    assert 'nash_rm_6561' in SCENARIOS and 'tournament_2pet' in SCENARIOS
+
+    baseline = {'results': {'a': {'seconds': 1.0, 'battles_per_sec': 100.0, 'peak_rss_mb': 50.0},
+                            'b': {'seconds': 1.0, 'battles_per_sec': 100.0, 'peak_rss_mb': 50.0}}}
+    current = {'results': {'a': {'seconds': 0.5, 'battles_per_sec': 200.0, 'peak_rss_mb': 55.0},
+                           'b': {'seconds': 1.5, 'battles_per_sec': 70.0, 'peak_rss_mb': 90.0}}}
+    regressed = {(name, metric) for name, metric, *_, flag in compare(baseline, current, 0.15, 0.25) if flag}
+    assert regressed == {('b', 'seconds'), ('b', 'battles_per_sec'), ('b', 'peak_rss_mb')}
+    current['results']['a'] = {'error': 'failed'}
+    assert any(metric == 'error' for _, metric, *_ in compare(baseline, current, 0.15, 0.25))
+
+
+def test_battle_profile(tmp_path, monkeypatch):
+    # profiling changes no result, counts every battle, and merges across workers
+    import json
+    from profiling import BattleProfile
+    from team_combinations import generate_all_team_sequences, run_tournament
+
+    team1 = Team().add_pets("cricket", "horse", "ant")
+    team2 = Team().add_pets("mosquito", "pig", "fish")
+    profile = BattleProfile()
+    plain = BattleSimulator(seed=3).k_battles(team1, team2, num_simulations=200, matchup=(1, 2))
+    profiled = BattleSimulator(seed=3, profile=profile).k_battles(team1, team2, num_simulations=200, matchup=(1, 2))
+    assert plain == profiled
+
+    report = profile.to_dict()
+    assert report['battles'] == 200
+    assert sum(report['turns_per_battle'].values()) == 200
+    assert sum(report['summons_per_battle'].values()) == 200 and report['mean_summons'] > 0
+    assert report['phases']['new_state']['calls'] == 200
+    assert report['phases']['trigger_phase:start_of_battle']['calls'] == 200
+    assert report['phases']['check_winner']['calls'] == sum(int(t) * c for t, c in report['turns_per_battle'].items())
+    assert {'cricket_ability', 'horse_ability', 'ant_ability', 'mosquito_ability'} <= set(report['abilities'])
+    # a simulator without a profile runs the class methods untouched
+    assert 'simulate_battle' not in vars(BattleSimulator(seed=3))
+
+    teams = generate_all_team_sequences(team_length=1)
+    plain_csv = run_tournament(teams, num_battles=5, output_file=str(tmp_path / "plain.csv"), engine="object", seed=8)
+    profiled_csv = run_tournament(teams, num_battles=5, output_file=str(tmp_path / "profiled.csv"), engine="object",
+                                  seed=8, workers=2, profile=str(tmp_path / "profile.json"))
+    with open(plain_csv) as a, open(profiled_csv) as b:
+        assert a.read() == b.read()
+    with open(tmp_path / "profile.json") as f:
+        assert json.load(f)['battles'] == len(teams) ** 2 * 5
+
+    # with a cache, profiling keeps the cache keys (same hits and misses), and battles drawn
+    # from the cache stay out of the turns histogram
+    import team_combinations
+    teams = generate_all_team_sequences(team_length=2)[:60]
+    monkeypatch.setattr(team_combinations, "OBJECT_BLOCK_MATCHUPS", 9 * len(teams))
+    options = dict(num_battles=3, engine="object", seed=1, cache_size=100000, ci_width=None)
+    totals = [{}, {}]
+    for profiled, cache_totals in zip((False, True), totals):
+        list(team_combinations._tournament_rows(team_combinations._templates(teams), dict(options, profile=profiled),
+                                                cache_totals=cache_totals))
+    assert (totals[0]['hits'], totals[0]['misses']) == (totals[1]['hits'], totals[1]['misses'])
+    report = totals[1]['profile'].to_dict()
+    assert report['cache_resolved'] == report['battles'] == len(teams) ** 2 * 3
+    assert report['turns_per_battle'] == {}
+
+
+def test_tournament_telemetry(tmp_path):
+    # JSON-lines progress records and a summary that adds up, without changing the results
+    import json
+    from team_combinations import generate_all_team_sequences, run_tournament
+
+    teams = generate_all_team_sequences(team_length=1)
+    plain = run_tournament(teams, num_battles=20, output_file=str(tmp_path / "plain.csv"), engine="object", seed=4)
+    log = tmp_path / "telemetry.jsonl"
+    logged = run_tournament(teams, num_battles=20, output_file=str(tmp_path / "logged.csv"), engine="object",
+                            seed=4, workers=2, telemetry=str(log), telemetry_interval=0)
+    with open(plain) as a, open(logged) as b:
+        assert a.read() == b.read()
+
+    records = [json.loads(line) for line in log.read_text().splitlines()]
+    progress, summary = records[:-1], records[-1]
+    assert progress and all(r['event'] == 'progress' for r in progress)
+    assert [r['matchups_written'] for r in progress] == sorted(r['matchups_written'] for r in progress)
+    assert progress[-1]['eta_seconds'] == 0
+    assert summary['event'] == 'summary'
+    assert summary['matchups_written'] == summary['matchups_simulated'] == len(teams) ** 2
+    assert summary['battles_simulated'] == len(teams) ** 2 * 20 and summary['battles_per_matchup'] == 20
+    assert summary['output_bytes'] == (tmp_path / "logged.csv").stat().st_size
+    assert 1 <= summary['workers'] <= 2 and all(0 < u <= 1 for u in summary['worker_utilization'].values())
+    assert summary['config']['seed'] == 4
+
+
+def test_sampled_tournament(tmp_path):
+    # sampled cells are the full grid's cells, sparse stats match the dense ones, estimates cover the truth
+    import sys
+    from pathlib import Path
+    import numpy as np
+    import pandas as pd
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'stats'))
+    import stats_engine
+    from team_combinations import generate_all_team_sequences, opponent_design, run_sampled_tournament, run_tournament
+
+    for design in ("balanced", "stratified"):
+        columns = opponent_design(81, 12, design, seed=1)
+        assert all(i not in row and 0 < len(row) <= 12 for i, row in enumerate(columns))
+        assert np.bincount(np.concatenate(columns), minlength=81).min() >= 9
+
+    teams = generate_all_team_sequences(team_length=2)
+    full = run_tournament(teams, num_battles=20, output_file=str(tmp_path / "full.csv"), engine="batch", seed=5)
+    sampled = run_sampled_tournament(teams, 16, num_battles=20, output_file=str(tmp_path / "sampled.csv"),
+                                     engine="batch", seed=5)
+    keys = ['Team1_ID', 'Team2_ID']
+    outcomes = ['Team1_Wins', 'Team2_Wins', 'Draws']
+    merged = pd.read_csv(sampled).merge(pd.read_csv(full), on=keys, suffixes=('', '_full'))
+    assert len(merged) == len(pd.read_csv(sampled))
+    assert (merged[outcomes].values == merged[[c + '_full' for c in outcomes]].values).all()
+
+    data = stats_engine.load_results(sampled)
+    assert data.cells is not None
+    dense = stats_engine.load_results(sampled)
+    dense.cells = None
+    dense.wins, dense.losses, dense.draws = (m.toarray() for m in (data.wins, data.losses, data.draws))
+    dense.played = data.played.toarray()
+    sparse_totals = stats_engine.team_totals(data)
+    assert sparse_totals.equals(stats_engine.team_totals(dense))
+
+    truth = stats_engine.team_totals(stats_engine.load_results(full)).set_index('Team_ID')
+    estimates = stats_engine.sampled_estimates(data).set_index('Team_ID')
+    assert len(estimates) == 81
+    wins = truth.loc[estimates.index, 'Total_Win_Count']
+    covered = (estimates['Estimated_Total_Wins_Low'] <= wins) & (wins <= estimates['Estimated_Total_Wins_High'])
+    assert covered.mean() > 0.8
+    assert (estimates['Swept_Rate_Low'] <= estimates['Swept_Rate']).all()
+    assert (estimates['Swept_Rate'] <= estimates['Swept_Rate_High']).all()
+
+    ranked = stats_engine.bradley_terry_rankings(data)
+    assert (ranked['BT_Low'] <= ranked['BT_Strength']).all() and (ranked['BT_Strength'] <= ranked['BT_High']).all()
+    # Total_ columns keep the Team1-row, self-play-included definition, dense or sparse
+    by_id = ranked.set_index('Team_ID').sort_index()
+    rows = pd.read_csv(sampled).groupby('Team1_ID')
+    assert (by_id['Total_Games'].values == rows[outcomes].sum().sum(axis=1).reindex(range(81), fill_value=0)).all()
+    dense_ranked = stats_engine.bradley_terry_rankings(dense).set_index('Team_ID').sort_index()
+    assert np.allclose(dense_ranked[['Total_Wins', 'Total_Games']], by_id[['Total_Wins', 'Total_Games']])
+    full_ranked = stats_engine.bradley_terry_rankings(stats_engine.load_results(full))
+    assert (full_ranked['Total_Games'] == 81 * 20).all()
+    assert (full_ranked['Pooled_Games'] == 2 * 80 * 20).all()
+
+
+def test_team_space(tmp_path):
+    # lazy teams index, slice and template like the built ones, and tournaments take them as lists
+    import pickle
+    from team_codes import TeamSpace, codes_of_length, team_from_code
+    from team_combinations import generate_all_team_sequences, run_tournament
+
+    space = generate_all_team_sequences(1, 5)
+    assert len(space) == 9 + 81 + 729 + 6561 + 59049
+    assert len(generate_all_team_sequences(5)) == 59049
+    assert list(generate_all_team_sequences(3).codes) == list(codes_of_length(3, 9))
+    for team_id in (0, 8, 9, 89, 90, 7379, len(space) - 1):
+        code = space.code(team_id)
+        assert space.index(code) == team_id
+        assert space.template(team_id) == team_from_code(code).template() == space[team_id].template()
+    assert isinstance(space[100:200], TeamSpace) and space[100:200].code(0) == space.code(100)
+
+    templates = pickle.loads(pickle.dumps(space.templates(cache_size=4)))
+    assert [templates[i] for i in range(6)] == [space.template(i) for i in range(6)]
+    assert len(templates._cache) == 4 and templates[-1] == space.template(len(space) - 1)
+
+    mixed = generate_all_team_sequences(1, 2)
+    lazy = run_tournament(mixed, num_battles=4, output_file=str(tmp_path / "lazy.csv"), engine="batch", seed=9,
+                          workers=2)
+    built = run_tournament(list(mixed), num_battles=4, output_file=str(tmp_path / "built.csv"), engine="batch",
+                           seed=9)
+    with open(lazy) as a, open(built) as b:
+        assert a.read() == b.read()
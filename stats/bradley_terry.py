@@ -0,0 +1,357 @@
+
+import sys
+import time
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import minimize
+from scipy.sparse.linalg import cg
+
+# Bradley-Terry fitter over pair lists: every pair (i, j), i < j, that met at least once,
+# with i's wins over j, j's wins over i (draws count half to each) and the games between them
+# work per step is O(pairs), so sampled tournaments with a few hundred opponents per team
+# rank tens of thousands of teams; a full grid is just the densest pair list
+#
+#   mm      Hunter's minorize-maximize update, the iteration the stats scripts always used
+#   newton  Newton on log strengths, the Hessian is a weighted graph Laplacian solved with CG
+#   lbfgs   scipy L-BFGS-B on the negative log likelihood
+
+TILE = 2048
+# above this many teams standard errors use the diagonal of the information matrix only
+EXACT_SE_LIMIT = 3000
+
+
+@dataclass
+class BTFit:
+    strengths: np.ndarray       # geometric mean 1
+    log_strengths: np.ndarray   # mean 0
+    std_errors: np.ndarray      # of the log strengths
+    method: str
+    iterations: int
+    converged: bool
+    log_likelihood: float
+    max_gradient: float         # largest |wins - expected wins| / games of any team
+    exact_std_errors: bool
+    seconds: float
+
+    def summary(self) -> str:
+        return (f"{self.method}: {'converged' if self.converged else 'not converged'} after {self.iterations} "
+                f"iterations in {self.seconds:.1f}s, log likelihood {self.log_likelihood:.4f}, "
+                f"max gradient per game {self.max_gradient:.2e}, "
+                f"{'exact' if self.exact_std_errors else 'diagonal'} standard errors")
+
+
+def pairs_from_rows(ids1, ids2, wins1, wins2, draws, n_teams: int):
+    # (i, j, wins_ij, wins_ji) from matchup rows, both orderings of a pair pooled, self-play dropped
+    ids1 = np.asarray(ids1, dtype=np.int64)
+    ids2 = np.asarray(ids2, dtype=np.int64)
+    keep = ids1 != ids2
+    ids1, ids2 = ids1[keep], ids2[keep]
+    half = 0.5 * np.asarray(draws, dtype=np.float64)[keep]
+    wins1 = np.asarray(wins1, dtype=np.float64)[keep] + half
+    wins2 = np.asarray(wins2, dtype=np.float64)[keep] + half
+
+    lo, hi = np.minimum(ids1, ids2), np.maximum(ids1, ids2)
+    flipped = ids1 > ids2
+    lo_wins = np.where(flipped, wins2, wins1)
+    hi_wins = np.where(flipped, wins1, wins2)
+    keys, inverse = np.unique(lo * n_teams + hi, return_inverse=True)
+    w_ij = np.bincount(inverse, lo_wins, minlength=len(keys))
+    w_ji = np.bincount(inverse, hi_wins, minlength=len(keys))
+    played = (w_ij + w_ji) > 0
+    return keys[played] // n_teams, keys[played] % n_teams, w_ij[played], w_ji[played]
+
+
+def pairs_from_matrices(wins, losses, draws):
+    # same as pairs_from_rows for a full n x n grid, read tile by tile (works on memmaps)
+    n = wins.shape[0]
+    parts = []
+    for r0 in range(0, n, TILE):
+        r = slice(r0, min(n, r0 + TILE))
+        for c0 in range(r0, n, TILE):
+            c = slice(c0, min(n, c0 + TILE))
+            half = 0.5 * (np.asarray(draws[r, c], dtype=np.float64) + np.asarray(draws[c, r], dtype=np.float64).T)
+            w_ij = np.asarray(wins[r, c], dtype=np.float64) + np.asarray(losses[c, r], dtype=np.float64).T + half
+            w_ji = np.asarray(losses[r, c], dtype=np.float64) + np.asarray(wins[c, r], dtype=np.float64).T + half
+            i, j = np.nonzero(((w_ij + w_ji) > 0) & (np.arange(r0, r.stop)[:, None] < np.arange(c0, c.stop)[None, :]))
+            parts.append((i + r0, j + c0, w_ij[i, j], w_ji[i, j]))
+    if not parts:
+        empty = np.zeros(0)
+        return empty.astype(np.int64), empty.astype(np.int64), empty, empty
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+class _Pairs:
+    # the pair list plus what every method reuses: per-team games and the sparse pattern of
+    # the information matrix, so each Newton step only refills its values
+    def __init__(self, i, j, w_ij, w_ji, n_teams):
+        self.i, self.j, self.w_ij, self.w_ji, self.n = i, j, w_ij, w_ji, n_teams
+        self.games = w_ij + w_ji
+        self.team_games = self.bincount(self.games, self.games)
+        self.team_wins = self.bincount(w_ij, w_ji)
+        rows, cols = np.concatenate([i, j]), np.concatenate([j, i])
+        pattern = sparse.coo_matrix((np.arange(1, len(rows) + 1, dtype=np.float64), (rows, cols)),
+                                    shape=(n_teams, n_teams)).tocsr()
+        self.order = pattern.data.astype(np.int64) - 1
+        self.laplacian = pattern
+
+    def bincount(self, for_i, for_j):
+        # per-team sum of a value given to i and a value given to j of every pair
+        return np.bincount(self.i, for_i, minlength=self.n) + np.bincount(self.j, for_j, minlength=self.n)
+
+    def win_probability(self, theta):
+        return 1.0 / (1.0 + np.exp(theta[self.j] - theta[self.i]))
+
+    def log_likelihood(self, theta, ridge):
+        ti, tj = theta[self.i], theta[self.j]
+        ll = np.dot(self.w_ij, ti) + np.dot(self.w_ji, tj) - np.dot(self.games, np.logaddexp(ti, tj))
+        return ll - 0.5 * ridge * np.dot(theta, theta)
+
+    def gradient(self, theta, ridge):
+        # wins minus expected wins, per team
+        residual = self.w_ij - self.games * self.win_probability(theta)
+        return self.bincount(residual, -residual) - ridge * theta
+
+    def information(self, theta, ridge):
+        # Fisher information of the log strengths, a Laplacian weighted by games * p * (1 - p)
+        p = self.win_probability(theta)
+        weight = self.games * p * (1.0 - p)
+        degree = self.bincount(weight, weight) + ridge
+        self.laplacian.data = -np.concatenate([weight, weight])[self.order]
+        return self.laplacian + sparse.diags(degree), degree
+
+    def relative_gradient(self, theta, ridge):
+        # per-team gradient as a fraction of that team's games, the convergence measure
+        gradient = self.gradient(theta, ridge)
+        return np.max(np.abs(gradient) / np.maximum(self.team_games, 1), initial=0.0)
+
+
+def _fit_mm(pairs, max_iterations, tolerance):
+    strengths = np.ones(pairs.n)
+    converged = False
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        old_strengths = strengths
+        share = pairs.games / (old_strengths[pairs.i] + old_strengths[pairs.j])
+        denominator = pairs.bincount(share, share)
+        strengths = np.where(denominator > 0, pairs.team_wins / np.where(denominator > 0, denominator, 1),
+                             old_strengths)
+        # normalize to prevent overflow
+        strengths = strengths / np.exp(np.mean(np.log(strengths + 1e-10)))
+        if np.max(np.abs(strengths - old_strengths)) < tolerance:
+            converged = True
+            break
+    return np.log(strengths + 1e-10), iteration, converged
+
+
+def _fit_newton(pairs, max_iterations, tolerance, ridge):
+    theta = np.zeros(pairs.n)
+    # tiny ridge keeps the Laplacian solvable, the gauge is fixed by centering afterwards
+    stabilizer = ridge if ridge > 0 else 1e-9
+    ll = pairs.log_likelihood(theta, ridge)
+    converged = False
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        gradient = pairs.gradient(theta, ridge)
+        if np.max(np.abs(gradient) / np.maximum(pairs.team_games, 1), initial=0.0) < tolerance:
+            converged = True
+            break
+        information, diagonal = pairs.information(theta, stabilizer)
+        step, _ = cg(information, gradient, M=sparse.diags(1.0 / np.maximum(diagonal, 1e-12)), maxiter=200)
+        # backtrack until the likelihood improves
+        scale = 1.0
+        while True:
+            candidate = theta + scale * step
+            candidate_ll = pairs.log_likelihood(candidate, ridge)
+            if candidate_ll >= ll or scale < 1e-6:
+                break
+            scale *= 0.5
+        theta, ll = candidate - candidate.mean(), candidate_ll
+    return theta, iteration, converged
+
+
+def _fit_lbfgs(pairs, max_iterations, tolerance, ridge):
+    # stops on the same largest gradient per game as newton, checked after every iteration;
+    # variables are scaled by the square root of the information diagonal, and when L-BFGS-B
+    # ends short of that (the objective's relative change or the line search run into float
+    # precision around a log likelihood of 1e7) it restarts from there with a fresh scaling
+    theta = np.zeros(pairs.n)
+    iterations = 0
+    best = pairs.relative_gradient(theta, ridge)
+    while best >= tolerance and iterations < max_iterations:
+        _, diagonal = pairs.information(theta, ridge if ridge > 0 else 1e-9)
+        scale = np.sqrt(np.maximum(diagonal, 1e-12))
+        last = {}
+
+        def objective(u):
+            candidate = u / scale
+            gradient = pairs.gradient(candidate, ridge)
+            last['u'], last['gradient'] = u, gradient
+            return -pairs.log_likelihood(candidate, ridge), -gradient / scale
+
+        def callback(intermediate_result):
+            u = intermediate_result.x
+            gradient = last['gradient'] if np.array_equal(u, last['u']) else pairs.gradient(u / scale, ridge)
+            if np.max(np.abs(gradient) / np.maximum(pairs.team_games, 1), initial=0.0) < tolerance:
+                raise StopIteration
+
+        result = minimize(objective, theta * scale, jac=True, method='L-BFGS-B', callback=callback,
+                          options={'maxiter': max_iterations - iterations, 'ftol': 1e-15, 'gtol': 0.0})
+        iterations += int(result.nit)
+        candidate = result.x / scale
+        candidate = candidate - candidate.mean()
+        relative = pairs.relative_gradient(candidate, ridge)
+        if relative >= best and result.nit <= 1:
+            # no progress left at this precision
+            break
+        if relative < best:
+            theta, best = candidate, relative
+    return theta, iterations, best < tolerance
+
+
+def fit_bradley_terry(i, j, w_ij, w_ji, n_teams: int, method: str = 'newton',
+                      max_iterations: int = None, tolerance: float = 1e-6, ridge: float = 0.0) -> BTFit:
+    # tolerance: mm stops on the change in normalized strengths, as the stats scripts always did,
+    # newton and lbfgs on the largest gradient per game played
+    # ridge adds a Gaussian prior on the log strengths, finite strengths for unbeaten or winless teams
+    if method not in ('mm', 'newton', 'lbfgs'):
+        raise ValueError(f"Unknown method '{method}'. Available: mm, newton, lbfgs")
+    if method == 'mm' and ridge:
+        raise ValueError("ridge needs method 'newton' or 'lbfgs'")
+    start = time.time()
+    pairs = _Pairs(i, j, w_ij, w_ji, n_teams)
+    if method == 'mm':
+        theta, iterations, converged = _fit_mm(pairs, max_iterations or 1000, tolerance)
+    elif method == 'newton':
+        theta, iterations, converged = _fit_newton(pairs, max_iterations or 100, tolerance, ridge)
+    else:
+        theta, iterations, converged = _fit_lbfgs(pairs, max_iterations or 15000, tolerance, ridge)
+    theta = theta - theta.mean()
+
+    # standard errors from the information matrix, pseudo-inverse because strengths are only
+    # defined up to a common factor
+    information, diagonal = pairs.information(theta, ridge)
+    exact = n_teams <= EXACT_SE_LIMIT
+    if exact:
+        variance = np.diag(np.linalg.pinv(information.toarray(), hermitian=True))
+    else:
+        variance = 1.0 / np.maximum(diagonal, 1e-12)
+    std_errors = np.sqrt(np.maximum(variance, 0))
+
+    return BTFit(
+        strengths=np.exp(theta),
+        log_strengths=theta,
+        std_errors=std_errors,
+        method=method,
+        iterations=iterations,
+        converged=converged,
+        log_likelihood=float(pairs.log_likelihood(theta, ridge)),
+        max_gradient=float(pairs.relative_gradient(theta, ridge)),
+        exact_std_errors=exact,
+        seconds=time.time() - start,
+    )
+
+
+def data_pairs(data):
+    # pair list of a stats_engine.MatchupData
+    if data.cells is not None:
+        return pairs_from_rows(*data.cells, data.n)
+    if data.played is None:
+        return pairs_from_matrices(data.wins, data.losses, data.draws)
+    ids1, ids2 = np.nonzero(data.played)
+    return pairs_from_rows(ids1, ids2, data.wins[ids1, ids2], data.losses[ids1, ids2], data.draws[ids1, ids2], data.n)
+
+
+def pair_table(pairs, compositions=None, z: float = 1.96) -> pd.DataFrame:
+    # the fitter's input, one row per pair, with a Wilson interval on team i's share of the games
+    from stats_engine import wilson_interval
+    i, j, w_ij, w_ji = pairs
+    games = w_ij + w_ji
+    low, high = wilson_interval(w_ij, games, z)
+    compositions = compositions or {}
+    return pd.DataFrame({
+        'Team_i': i,
+        'Team_j': j,
+        'Team_i_Composition': [compositions.get(k, '') for k in i],
+        'Team_j_Composition': [compositions.get(k, '') for k in j],
+        'Wins_i': w_ij,
+        'Wins_j': w_ji,
+        'Games': games,
+        'Share_i': w_ij / np.maximum(games, 1),
+        'Share_i_Low': low,
+        'Share_i_High': high,
+    })
+
+
+def seat_totals(data):
+    # wins (draws as half) and games in each team's own Team1 rows, self-play included:
+    # Total_Wins / Total_Games as bradley_terry_rankings.py has always reported them
+    n = data.n
+    if data.cells is not None:
+        ids1, _, w, l, d = data.cells
+        return (np.bincount(ids1, np.asarray(w, dtype=np.float64) + 0.5 * np.asarray(d, dtype=np.float64), minlength=n),
+                np.bincount(ids1, np.asarray(w + l + d, dtype=np.float64), minlength=n))
+    wins = np.zeros(n)
+    games = np.zeros(n)
+    for r0 in range(0, n, TILE):
+        r = slice(r0, min(n, r0 + TILE))
+        for c0 in range(0, n, TILE):
+            c = slice(c0, min(n, c0 + TILE))
+            w = np.asarray(data.wins[r, c], dtype=np.float64)
+            d = np.asarray(data.draws[r, c], dtype=np.float64)
+            wins[r] += (w + 0.5 * d).sum(axis=1)
+            games[r] += (w + d + np.asarray(data.losses[r, c], dtype=np.float64)).sum(axis=1)
+    return wins, games
+
+
+def rankings(data, method: str = 'newton', ridge: float = 0.0, z: float = 1.96, **kwargs) -> pd.DataFrame:
+    # bradley_terry_rankings.csv from a stats_engine.MatchupData
+    # BT_Low / BT_High: z standard errors either side on the log scale
+    # Total_Wins / Total_Games / Win_Rate keep their old meaning (Team1 rows, self-play included),
+    # the Pooled_ columns count what the fit sees: both seats, no self-play
+    n = data.n
+    pairs = data_pairs(data)
+    fit = fit_bradley_terry(*pairs, n_teams=n, method=method, ridge=ridge, **kwargs)
+    print(fit.summary())
+
+    def rate(wins, games):
+        return np.where(games > 0, wins / np.where(games > 0, games, 1), 0)
+
+    total_wins, total_games = seat_totals(data)
+    # every game the fit used, both seats, draws as half wins
+    i, j, w_ij, w_ji = pairs
+    pooled_wins = np.bincount(i, w_ij, minlength=n) + np.bincount(j, w_ji, minlength=n)
+    pooled_games = np.bincount(i, w_ij + w_ji, minlength=n) + np.bincount(j, w_ij + w_ji, minlength=n)
+    results_df = pd.DataFrame({
+        'Team_ID': np.arange(n),
+        'Team_Composition': [data.compositions.get(k, '') for k in range(n)],
+        'BT_Strength': fit.strengths,
+        'Total_Wins': total_wins,
+        'Total_Games': total_games,
+        'Win_Rate': rate(total_wins, total_games),
+        'Log_Strength_SE': fit.std_errors,
+        'BT_Low': np.exp(fit.log_strengths - z * fit.std_errors),
+        'BT_High': np.exp(fit.log_strengths + z * fit.std_errors),
+        'Pooled_Wins': pooled_wins,
+        'Pooled_Games': pooled_games,
+        'Pooled_Win_Rate': rate(pooled_wins, pooled_games),
+    })
+    results_df = results_df.sort_values('BT_Strength', ascending=False)
+    results_df['Rank'] = range(1, len(results_df) + 1)
+    return results_df
+
+
+def main():
+    # python bradley_terry.py [results csv or grid dir] [mm|newton|lbfgs] [ridge]
+    from stats_engine import load_results
+    input_path = sys.argv[1] if len(sys.argv) > 1 else 'tr_clean.csv'
+    method = sys.argv[2] if len(sys.argv) > 2 else 'newton'
+    ridge = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    results_df = rankings(load_results(input_path), method=method, ridge=ridge)
+    results_df.to_csv('bradley_terry_rankings.csv', index=False)
+    print(f"saved bradley_terry_rankings.csv ({len(results_df)} teams)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# team codes and result grids come from the simulator package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'simulator'))
+from team_codes import team_compositions
+
+# all the per-team stats in one pass over the results
+# W[i, j] / L[i, j] / D[i, j]: team 1 wins, team 2 wins and draws of the matchup row (i, j)
+# every script in stats/ used to re-read the CSV and loop with iterrows, these are the same
+# numbers from row and column reductions, tile by tile so memory-mapped grids stay on disk
+
+TILE = 2048
+# a CSV covering less than this share of the grid (a sampled tournament) is kept as its rows
+SPARSE_FRACTION = 0.25
+
+
+class MatchupData:
+    def __init__(self, wins, losses, draws, compositions, played=None, cells=None):
+        self.wins = wins
+        self.losses = losses
+        self.draws = draws
+        self.compositions = compositions
+        # cells that were actually played, None when the grid is complete
+        self.played = played
+        # (ids1, ids2, wins, losses, draws) of the played cells when the results are sparse,
+        # the matrices are then scipy sparse and every stat works from these rows instead
+        self.cells = cells
+        self.n = wins.shape[0]
+
+
+def load_results(path: str) -> MatchupData:
+    # tournament CSV, or a result grid directory written with run_tournament(grid_dir=...)
+    if os.path.isdir(path):
+        from grid_store import load_grid
+        grid = load_grid(path)
+        return MatchupData(grid.wins, grid.losses, grid.draws, dict(enumerate(grid.compositions)))
+
+    columns = ['Team1_ID', 'Team2_ID', 'Team1_Wins', 'Team2_Wins', 'Draws']
+    header = pd.read_csv(path, nrows=0).columns
+    extra = [c for c in ('Team1_Code', 'Team2_Code', 'Team1_Composition', 'Team2_Composition') if c in header]
+    df = pd.read_csv(path, usecols=columns + extra)
+    print(f"total rows: {len(df)}")
+
+    ids1 = df['Team1_ID'].to_numpy()
+    ids2 = df['Team2_ID'].to_numpy()
+    n = int(max(ids1.max(), ids2.max())) + 1
+    # exact-engine files hold expected counts
+    dtype = np.float64 if any(df[c].dtype.kind == 'f' for c in columns[2:]) else np.int64
+    if len(df) < SPARSE_FRACTION * n * n:
+        # sampled tournament, a 59k team space would be tens of GB as dense matrices
+        from scipy import sparse
+        cells = (ids1, ids2) + tuple(df[c].to_numpy(dtype=dtype) for c in columns[2:])
+        matrices = [sparse.csr_matrix((values, (ids1, ids2)), shape=(n, n)) for values in cells[2:]]
+        played = sparse.csr_matrix((np.ones(len(df), dtype=bool), (ids1, ids2)), shape=(n, n))
+        return MatchupData(*matrices, team_compositions(df, path), played, cells)
+    matrices = []
+    for column in ('Team1_Wins', 'Team2_Wins', 'Draws'):
+        matrix = np.zeros((n, n), dtype=dtype)
+        matrix[ids1, ids2] = df[column].to_numpy()
+        matrices.append(matrix)
+    played = np.zeros((n, n), dtype=bool)
+    played[ids1, ids2] = True
+    return MatchupData(*matrices, team_compositions(df, path), None if played.all() else played)
+
+
+def team_totals(data: MatchupData) -> pd.DataFrame:
+    # every per-team count the stats scripts report, one row per team id
+    if data.cells is not None:
+        return _cell_totals(data)
+    n = data.n
+    # uint32 grids accumulate in int64
+    dtype = np.float64 if data.wins.dtype.kind == 'f' else np.int64
+    total_wins = np.zeros(n, dtype=dtype)
+    total_losses = np.zeros(n, dtype=dtype)
+    unique_losses = np.zeros(n, dtype=np.int64)
+    always_wins = np.ones(n, dtype=bool)
+    swept = np.zeros(n, dtype=bool)
+    matchups = np.zeros(n, dtype=np.int64)
+    appears = np.zeros(n, dtype=bool)
+
+    for r0 in range(0, n, TILE):
+        r = slice(r0, min(n, r0 + TILE))
+        for c0 in range(0, n, TILE):
+            c = slice(c0, min(n, c0 + TILE))
+            w = np.asarray(data.wins[r, c], dtype=dtype)
+            l = np.asarray(data.losses[r, c], dtype=dtype)
+            d = np.asarray(data.draws[r, c], dtype=dtype)
+            # W[j, k] for k in r, j in c: games the row team lost as team 2
+            mirror = np.asarray(data.wins[c, r]).T
+            p = np.asarray(data.played[r, c]) if data.played is not None else np.ones(w.shape, dtype=bool)
+            p_mirror = np.asarray(data.played[c, r]).T if data.played is not None else p
+
+            # row team as team 1, column team as team 2
+            total_wins[r] += w.sum(axis=1)
+            total_wins[c] += l.sum(axis=0)
+            total_losses[r] += l.sum(axis=1)
+            total_losses[c] += w.sum(axis=0)
+            unique_losses[r] += (((l > 0) & p) | ((mirror > 0) & p_mirror)).sum(axis=1)
+            always_wins[r] &= ((w > 0) | ~p).all(axis=1)
+            always_wins[c] &= ((l > 0) | ~p).all(axis=0)
+            swept[r] |= ((w == 0) & (d == 0) & p).any(axis=1)
+            swept[c] |= ((l == 0) & (d == 0) & p).any(axis=0)
+            matchups[r] += p.sum(axis=1)
+            matchups[c] += p.sum(axis=0)
+            appears[r] |= p.any(axis=1)
+            appears[c] |= p.any(axis=0)
+
+    ids = np.nonzero(appears)[0]
+    return pd.DataFrame({
+        'Team_ID': ids,
+        'Team_Composition': [data.compositions[i] for i in ids],
+        'Total_Win_Count': total_wins[ids],
+        'Total_Loss_Count': total_losses[ids],
+        'Unique_Loss_Count': unique_losses[ids],
+        'Always_Wins_Once': always_wins[ids].astype(int),
+        'Total_Matchups': matchups[ids],
+        'Never_Swept': ~swept[ids],
+    })
+
+
+def _cell_totals(data: MatchupData) -> pd.DataFrame:
+    # team_totals over the played cells only, for sparse results
+    n = data.n
+    ids1, ids2, w, l, d = data.cells
+    total_wins = np.bincount(ids1, w, minlength=n) + np.bincount(ids2, l, minlength=n)
+    total_losses = np.bincount(ids1, l, minlength=n) + np.bincount(ids2, w, minlength=n)
+    if w.dtype.kind != 'f':
+        total_wins, total_losses = total_wins.astype(np.int64), total_losses.astype(np.int64)
+    # distinct opponents that beat the team at least once, in either seat
+    losers = np.concatenate([ids1[l > 0], ids2[w > 0]])
+    winners = np.concatenate([ids2[l > 0], ids1[w > 0]])
+    unique_losses = np.bincount(np.unique(losers * n + winners) // n, minlength=n)
+    always_wins = np.ones(n, dtype=bool)
+    always_wins[ids1[w == 0]] = False
+    always_wins[ids2[l == 0]] = False
+    swept = np.zeros(n, dtype=bool)
+    swept[ids1[(w == 0) & (d == 0)]] = True
+    swept[ids2[(l == 0) & (d == 0)]] = True
+    matchups = np.bincount(ids1, minlength=n) + np.bincount(ids2, minlength=n)
+
+    ids = np.nonzero(matchups)[0]
+    return pd.DataFrame({
+        'Team_ID': ids,
+        'Team_Composition': [data.compositions[i] for i in ids],
+        'Total_Win_Count': total_wins[ids],
+        'Total_Loss_Count': total_losses[ids],
+        'Unique_Loss_Count': unique_losses[ids],
+        'Always_Wins_Once': always_wins[ids].astype(int),
+        'Total_Matchups': matchups[ids],
+        'Never_Swept': ~swept[ids],
+    })
+
+
+def sampled_estimates(data: MatchupData, z: float = 1.96) -> pd.DataFrame:
+    # full-grid estimates from a sampled tournament, with confidence intervals
+    # every sampled matchup (either seat, self-play dropped) is one draw of a random opponent,
+    # so a team's rates are means over its matchups and their spread gives the interval;
+    # a full grid plays every team in 2n matchups (n opponents, both seats), which scales them
+    #   Win_Rate                 mean points share per matchup (draws count half)
+    #   Estimated_Total_Wins     mean wins per matchup * 2n, the full-grid Total_Win_Count
+    #   Estimated_Unique_Losses  share of sampled opponents that beat the team at least once * n
+    #   Swept_Rate               share of matchups without a win or a draw, Wilson interval; a team
+    #                            with none sampled is Never_Swept, and Swept_Rate_High bounds how
+    #                            many sweeps the unsampled matchups could still hide
+    n = data.n
+    ids1, ids2, w, l, d = data.cells if data.cells is not None else _dense_cells(data)
+    keep = ids1 != ids2
+    team = np.concatenate([ids1[keep], ids2[keep]])
+    opponent = np.concatenate([ids2[keep], ids1[keep]])
+    wins = np.concatenate([w[keep], l[keep]]).astype(np.float64)
+    losses = np.concatenate([l[keep], w[keep]]).astype(np.float64)
+    draws = np.concatenate([d[keep], d[keep]]).astype(np.float64)
+    battles = np.maximum(wins + losses + draws, 1)
+
+    k = np.bincount(team, minlength=n)
+    played = k > 0
+    k_safe = np.maximum(k, 1)
+
+    def mean_and_half_width(values):
+        mean = np.bincount(team, values, minlength=n) / k_safe
+        square = np.bincount(team, values * values, minlength=n) / k_safe
+        variance = np.maximum(square - mean * mean, 0) * k / np.maximum(k - 1, 1)
+        half = np.where(k > 1, z * np.sqrt(variance / k_safe), np.nan)
+        return mean, half
+
+    share, share_half = mean_and_half_width((wins + 0.5 * draws) / battles)
+    mean_wins, wins_half = mean_and_half_width(wins)
+
+    # opponent level: lost at least once to them in any seat
+    pair, inverse = np.unique(team * n + opponent, return_inverse=True)
+    lost = np.bincount(inverse, losses, minlength=len(pair)) > 0
+    opponents = np.bincount(pair // n, minlength=n)
+    lost_to = np.bincount(pair // n, lost, minlength=n)
+    lost_low, lost_high = wilson_interval(lost_to, opponents, z)
+
+    swept = np.bincount(team, (wins == 0) & (draws == 0), minlength=n)
+    swept_low, swept_high = wilson_interval(swept, k, z)
+
+    ids = np.nonzero(played)[0]
+    return pd.DataFrame({
+        'Team_ID': ids,
+        'Team_Composition': [data.compositions.get(i, '') for i in ids],
+        'Sampled_Matchups': k[ids],
+        'Sampled_Opponents': opponents[ids],
+        'Win_Rate': share[ids],
+        'Win_Rate_Low': np.clip(share - share_half, 0, 1)[ids],
+        'Win_Rate_High': np.clip(share + share_half, 0, 1)[ids],
+        'Estimated_Total_Wins': (2 * n * mean_wins)[ids],
+        'Estimated_Total_Wins_Low': np.maximum(2 * n * (mean_wins - wins_half), 0)[ids],
+        'Estimated_Total_Wins_High': (2 * n * (mean_wins + wins_half))[ids],
+        'Estimated_Unique_Losses': (n * lost_to / np.maximum(opponents, 1))[ids],
+        'Estimated_Unique_Losses_Low': (n * lost_low)[ids],
+        'Estimated_Unique_Losses_High': (n * lost_high)[ids],
+        'Swept_Rate': (swept / k_safe)[ids],
+        'Swept_Rate_Low': swept_low[ids],
+        'Swept_Rate_High': swept_high[ids],
+        'Never_Swept': swept[ids] == 0,
+    }).sort_values('Win_Rate', ascending=False)
+
+
+def _dense_cells(data: MatchupData):
+    ids1, ids2 = np.nonzero(data.played) if data.played is not None else np.indices((data.n, data.n)).reshape(2, -1)
+    return ids1, ids2, np.asarray(data.wins[ids1, ids2]), np.asarray(data.losses[ids1, ids2]), \
+        np.asarray(data.draws[ids1, ids2])
+
+
+def wilson_interval(successes, trials, z: float = 1.96):
+    # Wilson score interval of successes / trials, elementwise, (0, 1) where there are no trials
+    trials = np.asarray(trials, dtype=np.float64)
+    t = np.maximum(trials, 1)
+    p = np.asarray(successes, dtype=np.float64) / t
+    center = (p + z * z / (2 * t)) / (1 + z * z / t)
+    half = z * np.sqrt(p * (1 - p) / t + z * z / (4 * t * t)) / (1 + z * z / t)
+    empty = trials == 0
+    # clipped to contain p, rounding at p = 0 or 1 can otherwise leave it a hair outside
+    low = np.clip(center - half, 0, p)
+    high = np.clip(center + half, p, 1)
+    return np.where(empty, 0.0, low), np.where(empty, 1.0, high)
+
+
+# one function per script, same columns and sort order the scripts have always written
+
+def total_win_count(totals: pd.DataFrame) -> pd.DataFrame:
+    return totals[['Team_ID', 'Team_Composition', 'Total_Win_Count']].sort_values('Total_Win_Count', ascending=False)
+
+
+def total_loss_count(totals: pd.DataFrame) -> pd.DataFrame:
+    return totals[['Team_ID', 'Team_Composition', 'Total_Loss_Count']].sort_values('Total_Loss_Count', ascending=True)
+
+
+def unique_losses(totals: pd.DataFrame) -> pd.DataFrame:
+    # teams that never lost have no entry, as before
+    lost = totals[totals['Unique_Loss_Count'] > 0]
+    return lost[['Team_ID', 'Team_Composition', 'Unique_Loss_Count']].sort_values('Unique_Loss_Count', ascending=True)
+
+
+def always_onewin(totals: pd.DataFrame) -> pd.DataFrame:
+    columns = ['Team_ID', 'Team_Composition', 'Always_Wins_Once', 'Total_Matchups']
+    return totals[columns].sort_values('Always_Wins_Once', ascending=False)
+
+
+def never_swept(totals: pd.DataFrame) -> pd.DataFrame:
+    return totals[['Team_ID', 'Team_Composition', 'Never_Swept']].sort_values('Never_Swept', ascending=False)
+
+
+def unbeaten_teams(totals: pd.DataFrame) -> pd.DataFrame:
+    return totals[totals['Total_Loss_Count'] == 0][['Team_ID', 'Team_Composition']]
+
+
+def print_unbeaten(unbeaten: pd.DataFrame):
+    if len(unbeaten):
+        print("Unbeaten Teams:")
+        for team_id, composition in zip(unbeaten['Team_ID'], unbeaten['Team_Composition']):
+            print(f"  Team {team_id}: {composition}")
+    else:
+        print("no unbeaten teams")
+
+
+def bradley_terry_rankings(data: MatchupData, method: str = 'newton', **kwargs) -> pd.DataFrame:
+    # fitted over pair lists, see bradley_terry.py
+    from bradley_terry import rankings
+    return rankings(data, method=method, **kwargs)
+
+
+def main():
+    # python stats_engine.py [results csv or grid dir] [output dir]
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    input_path = sys.argv[1] if len(sys.argv) > 1 else 'tr_clean.csv'
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(script_dir, 'data')
+    os.makedirs(output_dir, exist_ok=True)
+
+    data = load_results(input_path)
+    totals = team_totals(data)
+    outputs = {
+        'total_win_count.csv': total_win_count(totals),
+        'total_loss_count.csv': total_loss_count(totals),
+        'unique_losses.csv': unique_losses(totals),
+        'always_onewin.csv': always_onewin(totals),
+        'never_swept.csv': never_swept(totals),
+        'bradley_terry_rankings.csv': bradley_terry_rankings(data),
+    }
+    if data.cells is not None:
+        # sampled results, the totals above only cover the sampled matchups
+        from bradley_terry import data_pairs, pair_table
+        outputs['sampled_estimates.csv'] = sampled_estimates(data)
+        outputs['bradley_terry_pairs.csv'] = pair_table(data_pairs(data), data.compositions)
+    for name, df in outputs.items():
+        df.to_csv(os.path.join(output_dir, name), index=False)
+        print(f"saved {name}")
+    print_unbeaten(unbeaten_teams(totals))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,75 +1,253 @@
 
+import argparse
+import os
+import sys
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import seaborn as sns
-
-df = pd.read_csv('tr_clean.csv')
-print(f"total rows: {len(df)}")
-
-# get number of teams and battles
-num_teams = df['Team1_ID'].max() + 1
-total_battles = df['Total_Battles'].iloc[0]
-
-print(f"teams: {num_teams}")
-print(f"battles per matchup: {total_battles}")
-
-# create points matrix
-points_matrix = np.zeros((num_teams, num_teams))
-
-# calculate points for each matchup
-for idx, row in df.iterrows():
-    team1_id = int(row['Team1_ID'])
-    team2_id = int(row['Team2_ID'])
-
-    # team1 points: 2 per win, 1 per draw
-    team1_points = (row['Team1_Wins'] * 2) + (row['Draws'] * 1)
-    points_matrix[team1_id, team2_id] = team1_points
-
-# calculate total points for each team
-team_total_points = points_matrix.sum(axis=1)
+from matplotlib.colors import LinearSegmentedColormap
 
-# create heatmap
-fig_size = max(14, num_teams / 50)
-fig = plt.figure(figsize=(fig_size, fig_size), facecolor='white')
+# result grids and the Bradley-Terry fitter live in the simulator and stats folders
+tools_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(tools_dir, '..', 'simulator'))
+sys.path.insert(0, os.path.join(tools_dir, '..', 'stats'))
 
-# max possible points per matchup
-max_points = total_battles * 2
+# head to head heatmap, binned straight from the results
+# every pixel is the mean points share of the matchups that fall in it (2 per win, 1 per draw,
+# over 2 per battle), accumulated block by block, so a 59k x 59k grid is never held at full
+# resolution; teams can be ordered by id, Bradley-Terry strength, NE probability or clustering,
+# and the binned matrix can be cut into a zoomable tile pyramid (tiles/<level>/<row>/<col>.png)
 
 # custom colormap
-from matplotlib.colors import LinearSegmentedColormap
 colors = ['#FF1493', '#FFD700', '#90EE90', '#006400']
 cmap = LinearSegmentedColormap.from_list('points', colors, N=256)
 
-# create heatmap
-ax = plt.gca()
-ax.set_facecolor('white')
-
-sns.heatmap(
-    points_matrix,
-    vmin=0,
-    vmax=max_points,
-    cmap=cmap,
-    square=True,
-    cbar_kws={'label': 'Team 1 Points (Wins=2, Draws=1, Losses=0)', 'shrink': 0.8},
-    xticklabels=False,
-    yticklabels=False,
-    ax=ax
-)
-
-plt.title(f'Tournament Heatmap: Team Performance\n{num_teams} Teams × {total_battles} Battles per Matchup', fontsize=14, pad=20)
-plt.xlabel('Opponent Team ID', fontsize=12)
-plt.ylabel('Team ID', fontsize=12)
-
-grid_interval = 100
-
-ax.set_xticks(np.arange(0, num_teams, grid_interval))
-ax.set_yticks(np.arange(0, num_teams, grid_interval))
-ax.set_xticklabels([str(i) for i in range(0, num_teams, grid_interval)])
-ax.set_yticklabels([str(i) for i in range(0, num_teams, grid_interval)])
-
-plt.tight_layout()
-
-# save heatmap
-output_image = 'tr_clean_heatmap_unsorted.png'
-plt.savefig(output_image, dpi=200, bbox_inches='tight')
+TILE = 256
+ROW_BLOCK = 256
+CSV_CHUNK = 500000
+# profile width for clustering, and the most teams clustered one by one
+PROFILE_BINS = 64
+CLUSTER_LIMIT = 4096
+
+
+def team_count(source: str) -> int:
+    if os.path.isdir(source):
+        from grid_store import load_grid
+        return load_grid(source).n
+    n = 0
+    for chunk in pd.read_csv(source, usecols=['Team1_ID', 'Team2_ID'], chunksize=CSV_CHUNK):
+        n = max(n, int(chunk['Team1_ID'].max()) + 1, int(chunk['Team2_ID'].max()) + 1)
+    return n
+
+
+def bin_points(source: str, row_bin: np.ndarray, col_bin: np.ndarray, shape):
+    # sums and counts of points shares per (row bin, column bin), one row block or CSV chunk at a time
+    sums = np.zeros(shape, dtype=np.float64)
+    counts = np.zeros(shape, dtype=np.int64)
+    if os.path.isdir(source):
+        from grid_store import load_grid
+        grid = load_grid(source)
+        n = grid.n
+        # columns grouped by bin once, every block is then one reduceat
+        col_order = np.argsort(col_bin, kind='stable')
+        col_starts = np.searchsorted(col_bin[col_order], np.arange(shape[1]))
+        col_sizes = np.bincount(col_bin, minlength=shape[1])
+        filled = col_sizes > 0
+        for r0 in range(0, n, ROW_BLOCK):
+            r = slice(r0, min(n, r0 + ROW_BLOCK))
+            # battles per cell, only adaptive grids store them
+            if grid.totals is not None:
+                battles = np.asarray(grid.totals[r], dtype=np.float64)
+            else:
+                battles = grid.meta['num_battles']
+            share = (2 * np.asarray(grid.wins[r], dtype=np.float64) + grid.draws[r]) / (2 * np.maximum(battles, 1))
+            reduced = np.add.reduceat(share[:, col_order], col_starts[filled], axis=1)
+            block = np.zeros((r.stop - r0, shape[1]))
+            block[:, filled] = reduced
+            np.add.at(sums, row_bin[r], block)
+            np.add.at(counts, row_bin[r], col_sizes)
+        return sums, counts
+
+    columns = ['Team1_ID', 'Team2_ID', 'Team1_Wins', 'Draws', 'Total_Battles']
+    flat_sums, flat_counts = sums.ravel(), counts.ravel()
+    for chunk in pd.read_csv(source, usecols=columns, chunksize=CSV_CHUNK):
+        total = chunk['Total_Battles'].values
+        valid = total > 0
+        share = (2 * chunk['Team1_Wins'].values + chunk['Draws'].values)[valid] / (2 * total[valid])
+        cell = row_bin[chunk['Team1_ID'].values[valid]] * shape[1] + col_bin[chunk['Team2_ID'].values[valid]]
+        np.add.at(flat_sums, cell, share)
+        np.add.at(flat_counts, cell, 1)
+    return sums, counts
+
+
+def positions_from_scores(scores: np.ndarray) -> np.ndarray:
+    # team id -> position, highest score first, ids break ties
+    order = np.lexsort((np.arange(len(scores)), -scores))
+    positions = np.empty(len(scores), dtype=np.int64)
+    positions[order] = np.arange(len(scores))
+    return positions
+
+
+def bt_order(source: str, n: int, rankings: str = None) -> np.ndarray:
+    # strengths from a bradley_terry_rankings.csv, or fitted from the results
+    if rankings:
+        df = pd.read_csv(rankings, usecols=['Team_ID', 'BT_Strength'])
+        scores = np.full(n, -np.inf)
+        scores[df['Team_ID'].values] = df['BT_Strength'].values
+        return positions_from_scores(scores)
+    from stats_engine import load_results
+    from bradley_terry import rankings as bt_rankings
+    df = bt_rankings(load_results(source))
+    scores = np.full(n, -np.inf)
+    scores[df['Team_ID'].values] = df['BT_Strength'].values
+    return positions_from_scores(scores)
+
+
+def ne_order(n: int, strategy: str) -> np.ndarray:
+    # NE probability from nash_results_full_strategy.csv, expected payoff among the rest
+    df = pd.read_csv(strategy, usecols=['Team_ID', 'Probability', 'Expected_Payoff'])
+    probability = np.full(n, -np.inf)
+    payoff = np.full(n, -np.inf)
+    probability[df['Team_ID'].values] = df['Probability'].values
+    payoff[df['Team_ID'].values] = df['Expected_Payoff'].values
+    order = np.lexsort((np.arange(n), -payoff, -probability))
+    positions = np.empty(n, dtype=np.int64)
+    positions[order] = np.arange(n)
+    return positions
+
+
+def cluster_order(source: str, n: int) -> np.ndarray:
+    # average-linkage clustering of each team's results profile (mean points share against
+    # PROFILE_BINS groups of opponents), leaves order; past CLUSTER_LIMIT teams the profiles
+    # are first grouped with k-means and the centroids are clustered
+    from scipy.cluster.hierarchy import leaves_list, linkage
+    from scipy.cluster.vq import kmeans2
+
+    bins = min(PROFILE_BINS, n)
+    sums, counts = bin_points(source, np.arange(n), np.arange(n) * bins // n, (n, bins))
+    profiles = sums / np.maximum(counts, 1)
+    if n <= CLUSTER_LIMIT:
+        order = leaves_list(linkage(profiles, method='average'))
+    else:
+        centroids, labels = kmeans2(profiles, CLUSTER_LIMIT, minit='++', seed=0)
+        centroid_rank = np.empty(CLUSTER_LIMIT, dtype=np.int64)
+        centroid_rank[leaves_list(linkage(centroids, method='average'))] = np.arange(CLUSTER_LIMIT)
+        # within a cluster, strongest profile first
+        order = np.lexsort((np.arange(n), -profiles.mean(axis=1), centroid_rank[labels]))
+    positions = np.empty(n, dtype=np.int64)
+    positions[order] = np.arange(n)
+    return positions
+
+
+def binned_heatmap(source: str, positions: np.ndarray, size: int):
+    # size x size mean points shares (fewer pixels when there are fewer teams), NaN where nothing was played
+    # plus the sums and counts behind them, for the tiles
+    n = len(positions)
+    size = min(size, n)
+    pixel = positions * size // n
+    sums, counts = bin_points(source, pixel, pixel, (size, size))
+    with np.errstate(invalid='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan), sums, counts
+
+
+def write_tiles(sums: np.ndarray, counts: np.ndarray, tiles_dir: str) -> int:
+    # pyramid of TILE x TILE pngs, level 0 is the whole grid in one tile, each level doubles the
+    # resolution up to the binned one; coarser levels pool 2 x 2 bins, so every pixel stays the
+    # exact mean of its matchups
+    levels = [(sums, counts)]
+    while levels[-1][0].shape[0] > TILE:
+        s, c = levels[-1]
+        if s.shape[0] % 2:
+            s = np.pad(s, ((0, 1), (0, 1)))
+            c = np.pad(c, ((0, 1), (0, 1)))
+        pool = lambda a: a.reshape(a.shape[0] // 2, 2, a.shape[1] // 2, 2).sum(axis=(1, 3))
+        levels.append((pool(s), pool(c)))
+    levels.reverse()
+
+    for level, (s, c) in enumerate(levels):
+        with np.errstate(invalid='ignore'):
+            image = np.where(c > 0, s / np.maximum(c, 1), np.nan)
+        for y0 in range(0, image.shape[0], TILE):
+            for x0 in range(0, image.shape[1], TILE):
+                path = os.path.join(tiles_dir, str(level), str(y0 // TILE))
+                os.makedirs(path, exist_ok=True)
+                tile = np.ma.masked_invalid(image[y0:y0 + TILE, x0:x0 + TILE])
+                plt.imsave(os.path.join(path, f"{x0 // TILE}.png"), tile, cmap=cmap, vmin=0, vmax=1)
+    return len(levels)
+
+
+def render(image: np.ndarray, n: int, order: str, output_image: str, total_battles=None):
+    # create heatmap
+    fig_size = 14
+    fig = plt.figure(figsize=(fig_size, fig_size), facecolor='white')
+    ax = plt.gca()
+    ax.set_facecolor('white')
+
+    # teams per pixel set the axis scale, ticks are in positions along the chosen order
+    shown = ax.imshow(np.ma.masked_invalid(image), cmap=cmap, vmin=0, vmax=1, interpolation='nearest',
+                      extent=(0, n, n, 0))
+    fig.colorbar(shown, ax=ax, shrink=0.8, label='Team 1 Points Share (Wins=2, Draws=1, Losses=0)')
+
+    axis_label = 'Team ID' if order == 'id' else f'Team (ordered by {ORDER_NAMES[order]})'
+    battles = f' × {total_battles} Battles per Matchup' if total_battles else ''
+    plt.title(f'Tournament Heatmap: Team Performance\n{n} Teams{battles}', fontsize=14, pad=20)
+    plt.xlabel(f'Opponent {axis_label}', fontsize=12)
+    plt.ylabel(axis_label, fontsize=12)
+
+    plt.tight_layout()
+
+    # save heatmap
+    plt.savefig(output_image, dpi=200, bbox_inches='tight')
+    plt.close(fig)
+
+
+ORDER_NAMES = {'id': 'ID', 'bt': 'Bradley-Terry strength', 'ne': 'NE probability', 'cluster': 'clustering'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Binned head to head heatmap')
+    parser.add_argument('results', nargs='?', default='tr_clean.csv', help='tournament CSV or result grid directory')
+    parser.add_argument('--order', choices=list(ORDER_NAMES), default='id')
+    parser.add_argument('--rankings', default=None,
+                        help='bradley_terry_rankings.csv for --order bt (fitted from the results otherwise)')
+    parser.add_argument('--strategy', default=os.path.join(tools_dir, '..', 'ne', 'nash_results_full_strategy.csv'),
+                        help='nash_results_full_strategy.csv for --order ne')
+    parser.add_argument('--size', type=int, default=2048, help='pixels per side of the binned matrix')
+    parser.add_argument('--tiles', default=None, help='also write a zoomable tile pyramid to this directory')
+    parser.add_argument('--output', default=None, help='image file')
+    args = parser.parse_args()
+
+    n = team_count(args.results)
+    print(f"teams: {n}")
+
+    if args.order == 'bt':
+        positions = bt_order(args.results, n, args.rankings)
+    elif args.order == 'ne':
+        positions = ne_order(n, args.strategy)
+    elif args.order == 'cluster':
+        positions = cluster_order(args.results, n)
+    else:
+        positions = np.arange(n)
+
+    image, sums, counts = binned_heatmap(args.results, positions, args.size)
+    print(f"binned to {image.shape[0]} x {image.shape[1]} pixels")
+
+    total_battles = None
+    if not os.path.isdir(args.results):
+        total_battles = pd.read_csv(args.results, usecols=['Total_Battles'], nrows=1)['Total_Battles'].iloc[0]
+        print(f"battles per matchup: {total_battles}")
+
+    stem = os.path.splitext(os.path.basename(os.path.normpath(args.results)))[0]
+    output_image = args.output or f"{stem}_heatmap_{'unsorted' if args.order == 'id' else args.order}.png"
+    render(image, n, args.order, output_image, total_battles)
+    print(f"saved {output_image}")
+
+    if args.tiles:
+        levels = write_tiles(sums, counts, args.tiles)
+        print(f"saved {levels} tile levels to {args.tiles}")
+
+
+if __name__ == '__main__':
+    main()